@@ -0,0 +1,130 @@
+import json
+import os
+import time
+
+from ocr_cache import hash_file
+from metrics import timed
+from config import ARCHIVE_ENABLED, ARCHIVE_DIR
+
+TEXTE = "texte.txt"
+DOC = "doc.spacy"
+META = "meta.json"
+
+
+def ner_text(doc_type, text):
+    """
+    Texte que l'extracteur passe réellement à spaCy (le Doc archivé doit lui correspondre).
+    """
+    if doc_type == "carte_identite":
+        from extract_id import prepare_text
+        return prepare_text(text)[1]
+    from ocr_utils import clean_text
+    return clean_text(text)
+
+
+def entry_dir(cle, dossier=ARCHIVE_DIR):
+    return os.path.join(dossier, cle[:2], cle)
+
+
+@timed("archive")
+def archive_document(filepath, doc_type, text, info, sortie=None, dossier=ARCHIVE_DIR, doc=None):
+    """
+    Archive ce qu'il faut pour ré-extraire sans OCR : le texte tel que reçu par
+    l'extracteur, le Doc spaCy (DocBin) quand l'extraction est passée par le NLP,
+    et les métadonnées (fichier source, type, sortie XML, fiche extraite).
+    `doc` est le Doc de l'extraction par lot ; sans lui, il est relu dans le cache de ner_doc.
+    Une entrée par contenu de fichier : un document retraité remplace la précédente.
+    """
+    if not ARCHIVE_ENABLED or not doc_type:
+        return None
+    cle = hash_file(filepath)
+    cible = entry_dir(cle, dossier)
+    os.makedirs(cible, exist_ok=True)
+
+    with open(os.path.join(cible, TEXTE), "w", encoding="utf-8") as f:
+        f.write(text)
+
+    chemin_doc = os.path.join(cible, DOC)
+    if "methode" not in info:
+        # Extraction NLP : le Doc vient d'être calculé, ner_doc le renvoie depuis son cache
+        from spacy.tokens import DocBin
+        from nlp_model import ner_doc
+        docbin = DocBin(store_user_data=False)
+        docbin.add(doc if doc is not None else ner_doc(ner_text(doc_type, text)))
+        docbin.to_disk(chemin_doc)
+    elif os.path.exists(chemin_doc):
+        os.remove(chemin_doc)
+
+    meta = {
+        "fichier": os.path.abspath(filepath),
+        "type": doc_type,
+        "sortie": sortie,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "info": info,
+    }
+    tmp = os.path.join(cible, META + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, os.path.join(cible, META))
+    return cible
+
+
+def iter_entries(dossier=ARCHIVE_DIR):
+    """
+    Chemins des entrées de l'archive (ordre stable).
+    """
+    if not os.path.isdir(dossier):
+        return
+    for prefixe in sorted(os.listdir(dossier)):
+        chemin_prefixe = os.path.join(dossier, prefixe)
+        if not os.path.isdir(chemin_prefixe):
+            continue
+        for cle in sorted(os.listdir(chemin_prefixe)):
+            entree = os.path.join(chemin_prefixe, cle)
+            if os.path.exists(os.path.join(entree, META)):
+                yield entree
+
+
+_vocab = None
+
+def _load_vocab():
+    # Un Doc archivé embarque ses chaînes : un vocabulaire vierge suffit pour
+    # le relire, inutile de charger le modèle
+    global _vocab
+    if _vocab is None:
+        import spacy
+        _vocab = spacy.blank("fr").vocab
+    return _vocab
+
+
+def load_entry(entree):
+    """
+    Retourne (meta, texte, doc) ; doc vaut None si l'extraction n'était pas passée par spaCy.
+    """
+    with open(os.path.join(entree, META), encoding="utf-8") as f:
+        meta = json.load(f)
+    with open(os.path.join(entree, TEXTE), encoding="utf-8") as f:
+        texte = f.read()
+    doc = None
+    chemin_doc = os.path.join(entree, DOC)
+    if os.path.exists(chemin_doc):
+        from spacy.tokens import DocBin
+        doc = next(DocBin().from_disk(chemin_doc).get_docs(_load_vocab()))
+    return meta, texte, doc
+
+
+def update_entry(entree, info, sortie=None):
+    """
+    Met à jour la fiche archivée après une ré-extraction.
+    """
+    chemin = os.path.join(entree, META)
+    with open(chemin, encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["info"] = info
+    meta["reextrait"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    if sortie:
+        meta["sortie"] = sortie
+    tmp = chemin + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, chemin)
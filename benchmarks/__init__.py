@@ -0,0 +1,3 @@
+"""
+Scripts de mesure de performance (python -m benchmarks.<script>).
+"""
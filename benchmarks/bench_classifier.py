@@ -0,0 +1,131 @@
+"""
+Débit et justesse de la détection du type de document : ancienne détection
+(une recherche de sous-chaîne par mot-clé sur le texte mis en minuscules)
+contre le classifieur compilé (une passe, accents et confusions OCR tolérés),
+sur des textes OCR synthétiques de taille croissante, avec ou sans bruit.
+
+    python -m benchmarks.bench_classifier --documents 200 --pages 1 10 30 --bruit 0 0.2 0.4
+    python -m benchmarks.bench_classifier --types-en-plus 0 10 40     (montée en nombre de types)
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.corpus import NOMS, PRENOMS, VILLES, lignes_cv
+from classifier import Classifier, TYPES
+
+# Confusions simulées : accents perdus, 0/o, 1/l, apostrophes typographiques
+CONFUSIONS = {"é": "e", "è": "e", "o": "0", "l": "1", "'": "’", "ç": "c", "i": "l"}
+
+
+def ancien_detect(text):
+    """
+    Détection telle qu'elle était avant le classifieur (référence).
+    """
+    text_lower = text.lower()
+    keywords = ['république française', "carte d'identité", 'nationalité', 'nom', 'prénom', "date d'expiration", 'sexe']
+    if sum(1 for kw in keywords if kw in text_lower) >= 3:
+        return "carte_identite"
+    text_lower = text.lower()
+    keywords = ['curriculum vitae', 'expérience', 'formation', 'diplôme', 'stage', 'compétences', 'poste', 'profil']
+    if sum(1 for kw in keywords if kw in text_lower) >= 3:
+        return "cv"
+    return None
+
+
+def ancien_classement(text, types):
+    """
+    La même méthode étendue au classement de plusieurs types : chaque type
+    est scoré (une recherche de sous-chaîne par mot-clé), puis le meilleur retenu.
+    """
+    text_lower = text.lower()
+    scores = {nom: sum(1 for kw in keywords if kw in text_lower) / len(keywords)
+              for nom, (keywords, seuil) in types.items()
+              if sum(1 for kw in keywords if kw in text_lower) >= seuil}
+    return max(scores, key=scores.get) if scores else None
+
+
+def types_fictifs(rng, nombre):
+    """
+    Types supplémentaires de 8 mots-clés absents du corpus (pire cas : tout le texte est lu).
+    """
+    return [(f"type_{i}", ["".join(rng.choice("bcdfgjkvwxz") for _ in range(rng.randint(5, 9)))
+                           for _ in range(8)]) for i in range(nombre)]
+
+
+def texte_carte(rng, pages):
+    prenom, sexe = rng.choice(PRENOMS)
+    lignes = [
+        "RÉPUBLIQUE FRANÇAISE",
+        f"CARTE NATIONALE D'IDENTITÉ N° : {rng.randint(10 ** 11, 10 ** 12 - 1)}",
+        f"Nom : {rng.choice(NOMS)}", f"Prénom(s) : {prenom}",
+        f"Sexe : {sexe}    Nationalité : Française", f"à : {rng.choice(VILLES)}",
+    ]
+    # Gros dossiers : la carte suivie de pages de bruit OCR sans mot-clé
+    while len(lignes) < 45 * (pages - 1):
+        lignes.append(" ".join(rng.choice(NOMS + VILLES) for _ in range(6)) + f" {rng.randint(0, 99999)}")
+    return "\n".join(lignes)
+
+
+def bruiter(texte, taux, rng):
+    return "".join(CONFUSIONS[c] if c in CONFUSIONS and rng.random() < taux else c for c in texte)
+
+
+def corpus(rng, nb, pages, bruit):
+    documents = []
+    for i in range(nb):
+        if i % 2:
+            texte, attendu = "\n".join(lignes_cv(rng, pages)[0]), "cv"
+        else:
+            texte, attendu = texte_carte(rng, pages), "carte_identite"
+        documents.append((bruiter(texte, bruit, rng).replace("\n", " "), attendu))
+    return documents
+
+
+def mesurer(detecter, documents):
+    debut = time.perf_counter()
+    types = [detecter(texte) for texte, _ in documents]
+    duree = time.perf_counter() - debut
+    octets = sum(len(texte.encode("utf-8")) for texte, _ in documents)
+    justes = sum(1 for t, (_, attendu) in zip(types, documents) if t == attendu)
+    return types, {"docs_par_s": round(len(documents) / duree, 1), "mo_par_s": round(octets / duree / 1e6, 2),
+                   "justesse": round(justes / len(documents), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 30])
+    parser.add_argument("--bruit", type=float, nargs="+", default=[0.0, 0.2])
+    parser.add_argument("--types-en-plus", type=int, nargs="+", default=[0])
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    rapports = []
+    for nombre in args.types_en_plus:
+        classifier = Classifier()
+        types = dict(TYPES)
+        for nom, mots in types_fictifs(rng, nombre):
+            classifier.register(nom, mots, 3)
+            types[nom] = (mots, 3)
+        reference = ancien_detect if not nombre else (lambda texte: ancien_classement(texte, types))
+        classifier.classify("")    # compilation hors mesure
+        for bruit in args.bruit:
+            for pages in args.pages:
+                documents = corpus(rng, args.documents, pages, bruit)
+                anciens, ancien = mesurer(reference, documents)
+                nouveaux, nouveau = mesurer(classifier.classify, documents)
+                rapports.append({
+                    "types": 2 + nombre, "pages": pages, "bruit": bruit,
+                    "taille_moyenne_ko": round(sum(len(t) for t, _ in documents) / len(documents) / 1024, 1),
+                    "ancien": ancien, "classifieur": nouveau,
+                    "accord": round(sum(a == b for a, b in zip(anciens, nouveaux)) / len(documents), 3),
+                    "rapport_debit": round(nouveau["docs_par_s"] / ancien["docs_par_s"], 2),
+                })
+    print(json.dumps(rapports, ensure_ascii=False, indent=2))
+    return rapports
+
+
+if __name__ == "__main__":
+    main()
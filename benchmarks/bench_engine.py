@@ -0,0 +1,36 @@
+"""
+Coût par image des moteurs OCR sur beaucoup de petites images (cartes) :
+un processus tesseract par image contre un processus par lot.
+
+    python -m benchmarks.bench_engine --images 40 --lot 8
+"""
+import argparse
+import random
+import time
+
+from benchmarks.corpus import carte
+from ocr_utils import PytesseractEngine, BatchTesseractEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--lot", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    images = [carte(rng, 0.2)[0].convert("L") for _ in range(args.images)]
+
+    resultats = {}
+    for moteur in (PytesseractEngine(), BatchTesseractEngine()):
+        debut = time.perf_counter()
+        for i in range(0, len(images), args.lot):
+            moteur.ocr_batch(images[i:i + args.lot])
+        duree = time.perf_counter() - debut
+        resultats[moteur.name] = duree
+        print(f"{moteur.name:12s} {duree / len(images) * 1000:8.1f} ms/image")
+    print(f"Gain par image : x{resultats['pytesseract'] / resultats['lot']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
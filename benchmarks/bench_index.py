@@ -0,0 +1,96 @@
+"""
+Latence de l'index des fiches à grande échelle : import en masse de fiches
+synthétiques (cartes et CV), puis recherches exactes (numéro de carte, email,
+téléphone) et plein texte (compétences, expériences), p50 / p95 en millisecondes.
+Le vocabulaire synthétique est très réduit (chaque compétence est citée par la
+moitié des CV) : le plein texte classe des dizaines de milliers de
+correspondances par requête, c'est son pire cas.
+
+    python -m benchmarks.bench_index --documents 300000 --requetes 2000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.bench_pipeline import percentiles
+from benchmarks.corpus import NOMS, PRENOMS, VILLES, POSTES, ENTREPRISES, DIPLOMES, COMPETENCES
+from search_index import RecordIndex
+
+
+def fiche(rng, i):
+    nom = rng.choice(NOMS)
+    prenom, sexe = rng.choice(PRENOMS)
+    if i % 2:
+        return f"/boite/carte_{i:07d}.jpg", "carte_identite", {
+            "numero_carte": f"{i:012d}", "nom": nom, "prenom": prenom, "sexe": sexe,
+            "lieu_naissance": rng.choice(VILLES), "date_naissance": "01-01-1980"}
+    return f"/boite/cv_{i:07d}.pdf", "cv", {
+        "nom": nom, "prenom": prenom, "email": f"{prenom.lower()}.{nom.lower()}.{i}@mail.com",
+        "telephone": f"06 {i // 1000000 % 100:02d} {i // 10000 % 100:02d} {i // 100 % 100:02d} {i % 100:02d}",
+        "competences": rng.sample(COMPETENCES, 4),
+        "experiences": [f"{rng.choice(POSTES)} chez {rng.choice(ENTREPRISES)}" for _ in range(3)],
+        "formations": [rng.choice(DIPLOMES)]}
+
+
+def chronometrer(requetes, fonction):
+    durees = []
+    resultats = 0
+    for requete in requetes:
+        debut = time.perf_counter()
+        resultats += len(fonction(requete))
+        durees.append(time.perf_counter() - debut)
+    return dict(percentiles(durees), resultats=resultats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=300000)
+    parser.add_argument("--requetes", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as dossier:
+        index = RecordIndex(os.path.join(dossier, "index.sqlite"))
+        debut = time.perf_counter()
+        lot = []
+        cartes, emails, telephones = [], [], []
+        taux = min(1.0, 3 * args.requetes / args.documents)
+        for i in range(args.documents):
+            lot.append(fiche(rng, i) + (None,))
+            if rng.random() < taux:    # clés réellement indexées, tirées au fil de l'import
+                info = lot[-1][2]
+                if "numero_carte" in info:
+                    cartes.append(info["numero_carte"])
+                else:
+                    emails.append(info["email"].upper())    # casse indifférente
+                    telephones.append("+33 " + info["telephone"][1:])    # format international
+            if len(lot) >= 5000:
+                index.upsert_many(lot)
+                lot = []
+        if lot:
+            index.upsert_many(lot)
+        duree_import = time.perf_counter() - debut
+
+        n = args.documents
+        recherches = [rng.choice(COMPETENCES).split()[0] + " " + rng.choice(ENTREPRISES)
+                      for _ in range(args.requetes // 10)]
+
+        rapport = {
+            "documents": n,
+            "import_s": round(duree_import, 1),
+            "import_docs_par_s": round(n / duree_import),
+            "taille_mo": round(os.path.getsize(index.path) / 1e6, 1),
+            "carte": chronometrer(cartes, index.find_card),
+            "email": chronometrer(emails, index.find_email),
+            "telephone": chronometrer(telephones, index.find_phone),
+            "plein_texte": chronometrer(recherches, lambda q: index.search(q, 20)),
+        }
+    print(json.dumps(rapport, ensure_ascii=False, indent=2))
+    return rapport
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Débit spaCy : nlp(text) document par document sur le pipeline complet
+contre nlp.pipe par lot avec le pipeline réduit aux entités.
+
+    python -m benchmarks.bench_nlp --docs 500 --batch-size 64
+"""
+import argparse
+import glob
+import os
+import time
+
+from nlp_model import get_nlp, pipe_ner
+
+TEXTES_EXEMPLE = [
+    "RÉPUBLIQUE FRANÇAISE CARTE NATIONALE D'IDENTITÉ N° X4RTBPFW4 Nom : DUPONT "
+    "Prénom(s) : Jean Pierre Sexe : M Né(e) le : 12.05.1980 à : LYON",
+    "Curriculum vitae Marie Curie marie.curie@mail.com 06 12 34 56 78 Expérience "
+    "professionnelle Ingénieure chez Orange de 2015 à 2020 Formation Master "
+    "informatique Université de Lyon Compétences Python SQL Docker",
+]
+
+
+def charger_textes(dossier, nb_docs):
+    textes = []
+    if dossier:
+        for chemin in sorted(glob.glob(os.path.join(dossier, "*.txt"))):
+            with open(chemin, encoding="utf-8") as f:
+                textes.append(f.read())
+    if not textes:
+        textes = TEXTES_EXEMPLE
+    return [textes[i % len(textes)] for i in range(nb_docs)]
+
+
+def mesurer(fn):
+    debut = time.perf_counter()
+    fn()
+    return time.perf_counter() - debut
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--dossier", default=None, help="Dossier de textes OCR (.txt)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--n-process", type=int, default=1)
+    args = parser.parse_args()
+
+    textes = charger_textes(args.dossier, args.docs)
+    nlp = get_nlp()
+    nlp(textes[0])  # préchauffage
+
+    avant = mesurer(lambda: [nlp(t) for t in textes])
+    apres = mesurer(lambda: list(pipe_ner(textes, batch_size=args.batch_size, n_process=args.n_process)))
+
+    print(f"Pipeline complet, un par un : {len(textes) / avant:.1f} docs/s")
+    print(f"nlp.pipe réduit à NER       : {len(textes) / apres:.1f} docs/s "
+          f"(batch_size={args.batch_size}, n_process={args.n_process})")
+    print(f"Accélération : x{avant / apres:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Benchmark de bout en bout, étape par étape : ocr_file, detect_document_type,
+extract_info_id_file / extract_info_cv et write_xml. Produit un rapport JSON
+(p50/p95 par étape, docs/s, pic de RSS, précision des champs) comparable
+d'une exécution à l'autre.
+
+    python -m benchmarks.bench_pipeline --corpus bench_corpus --cartes 20 --cv 20 --sortie run.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import ocr_cache
+from benchmarks.corpus import generer_corpus
+from detect_type import detect_document_type
+from extract_cv import extract_info_cv
+from extract_id import extract_info_id_file
+from ocr_utils import ocr_file
+from xml_utils import write_xml
+from config import OCR_DPI
+
+CHAMPS_COMPARES = ("nom", "prenom", "numero_carte", "date_naissance", "sexe", "email", "telephone")
+
+
+def pic_rss_mo():
+    """
+    Pic de mémoire résidente du processus en Mo (None si indisponible, ex. Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Ko sous Linux, octets sous macOS
+    return round(pic / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentiles(durees):
+    if not durees:
+        return {"n": 0}
+    ordonnees = sorted(durees)
+    def p(q):
+        return ordonnees[min(len(ordonnees) - 1, int(round(q * (len(ordonnees) - 1))))]
+    return {"n": len(durees), "p50_ms": round(p(0.50) * 1000, 2), "p95_ms": round(p(0.95) * 1000, 2),
+            "moyenne_ms": round(statistics.mean(durees) * 1000, 2), "total_s": round(sum(durees), 3)}
+
+
+def normaliser(valeur):
+    return " ".join(str(valeur).upper().replace("-", " ").split())
+
+
+def precision(resultats, verite):
+    """
+    Part des documents bien classés et des champs exacts (casse et espaces ignorés).
+    """
+    types_ok = 0
+    champs_ok = champs_total = 0
+    for nom_fichier, (doc_type, info) in resultats.items():
+        attendu = verite.get(nom_fichier)
+        if attendu is None:
+            continue
+        types_ok += doc_type == attendu["type"]
+        for champ in CHAMPS_COMPARES:
+            if champ in attendu:
+                champs_total += 1
+                champs_ok += bool(info) and normaliser(info.get(champ, "")) == normaliser(attendu[champ])
+    return {"type": round(types_ok / max(len(resultats), 1), 3),
+            "champs": round(champs_ok / max(champs_total, 1), 3)}
+
+
+class Chrono:
+    def __init__(self):
+        self.durees = {}
+
+    def mesurer(self, etape, fn, *args):
+        debut = time.perf_counter()
+        resultat = fn(*args)
+        self.durees.setdefault(etape, []).append(time.perf_counter() - debut)
+        return resultat
+
+
+def executer(dossier, verite, dossier_xml):
+    chrono = Chrono()
+    resultats = {}
+    debut = time.perf_counter()
+    for nom_fichier in sorted(verite):
+        chemin = os.path.join(dossier, nom_fichier)
+        text = chrono.mesurer("ocr_file", ocr_file, chemin)
+        text_plat = text.replace('\n', ' ').replace('\r', ' ').strip()
+        doc_type = chrono.mesurer("detect_document_type", detect_document_type, text_plat)
+        info = None
+        if doc_type == "carte_identite":
+            info = chrono.mesurer("extract_info_id", extract_info_id_file, chemin, text)
+        elif doc_type == "cv":
+            info = chrono.mesurer("extract_info_cv", extract_info_cv, text_plat)
+        if info is not None:
+            sortie = os.path.join(dossier_xml, os.path.splitext(nom_fichier)[0] + ".xml")
+            chrono.mesurer("write_xml", write_xml, info, sortie, doc_type)
+        resultats[nom_fichier] = (doc_type, info)
+    duree = time.perf_counter() - debut
+    return chrono, resultats, duree
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", default="bench_corpus", help="Dossier du corpus (généré s'il n'existe pas)")
+    parser.add_argument("--cartes", type=int, default=10)
+    parser.add_argument("--cv", type=int, default=10)
+    parser.add_argument("--bruit", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--avec-cache", action="store_true", help="Laisse le cache OCR actif")
+    parser.add_argument("--etiquette", default="", help="Nom de l'exécution dans le rapport")
+    parser.add_argument("--sortie", default=None, help="Fichier JSON du rapport")
+    args = parser.parse_args(argv)
+
+    chemin_verite = os.path.join(args.corpus, "verite.json")
+    if os.path.exists(chemin_verite):
+        with open(chemin_verite, encoding="utf-8") as f:
+            verite = json.load(f)
+    else:
+        print(f"Génération du corpus dans {args.corpus}...")
+        verite = generer_corpus(args.corpus, args.cartes, args.cv, bruit=args.bruit, seed=args.seed)
+
+    if not args.avec_cache:
+        # On mesure l'OCR, pas le cache
+        ocr_cache.OCR_CACHE_ENABLED = False
+
+    with tempfile.TemporaryDirectory() as dossier_xml:
+        chrono, resultats, duree = executer(args.corpus, verite, dossier_xml)
+
+    rapport = {
+        "etiquette": args.etiquette,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "systeme": platform.platform(),
+                    "cpu": os.cpu_count()},
+        "parametres": {"corpus": args.corpus, "documents": len(verite), "ocr_dpi": OCR_DPI,
+                       "cache_ocr": args.avec_cache},
+        "docs_par_s": round(len(verite) / duree, 3) if duree else None,
+        "duree_s": round(duree, 3),
+        "pic_rss_mo": pic_rss_mo(),
+        "etapes": {etape: percentiles(d) for etape, d in chrono.durees.items()},
+        "precision": precision(resultats, verite),
+    }
+
+    texte = json.dumps(rapport, ensure_ascii=False, indent=2)
+    print(texte)
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            f.write(texte)
+    return rapport
+
+
+if __name__ == "__main__":
+    main()
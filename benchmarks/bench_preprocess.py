@@ -0,0 +1,76 @@
+"""
+Effet du prétraitement OpenCV : temps d'OCR et précision d'extraction avec
+et sans, sur le même corpus (de préférence bruité).
+
+    python -m benchmarks.bench_preprocess --corpus bench_corpus_bruit --bruit 0.6
+"""
+import argparse
+import json
+import os
+import tempfile
+
+import ocr_cache
+from benchmarks.bench_pipeline import executer, percentiles, precision
+from benchmarks.corpus import generer_corpus
+from metrics import METRICS
+from config import PREPROCESS
+
+
+def temps_etape(delta, stage):
+    """
+    Somme des durées d'une étape dans un relevé METRICS.drain().
+    """
+    _, histogrammes = delta
+    return round(sum(h[-2] for (nom, labels), h in histogrammes.items()
+                     if nom == "carteid_stage_seconds" and dict(labels).get("stage") == stage), 3)
+
+
+def mesurer(corpus, verite, actif):
+    PREPROCESS["actif"] = actif
+    METRICS.drain()
+    with tempfile.TemporaryDirectory() as dossier_xml:
+        chrono, resultats, duree = executer(corpus, verite, dossier_xml)
+    delta = METRICS.drain()
+    return {
+        "ocr_file": percentiles(chrono.durees.get("ocr_file", [])),
+        "tesseract_s": temps_etape(delta, "tesseract"),
+        "pretraitement_s": temps_etape(delta, "pretraitement"),
+        "duree_s": round(duree, 3),
+        "precision": precision(resultats, verite),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", default="bench_corpus_bruit")
+    parser.add_argument("--cartes", type=int, default=10)
+    parser.add_argument("--cv", type=int, default=10)
+    parser.add_argument("--bruit", type=float, default=0.6)
+    parser.add_argument("--sortie", default=None)
+    args = parser.parse_args()
+
+    chemin_verite = os.path.join(args.corpus, "verite.json")
+    if os.path.exists(chemin_verite):
+        with open(chemin_verite, encoding="utf-8") as f:
+            verite = json.load(f)
+    else:
+        # Uniquement des scans : les PDF natifs ne passent pas par tesseract
+        verite = generer_corpus(args.corpus, args.cartes, args.cv, bruit=args.bruit, part_natifs=0.0)
+
+    ocr_cache.OCR_CACHE_ENABLED = False
+    etat_initial = PREPROCESS["actif"]
+    try:
+        rapport = {"sans": mesurer(args.corpus, verite, False),
+                   "avec": mesurer(args.corpus, verite, True)}
+    finally:
+        PREPROCESS["actif"] = etat_initial
+
+    texte = json.dumps(rapport, ensure_ascii=False, indent=2)
+    print(texte)
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            f.write(texte)
+
+
+if __name__ == "__main__":
+    main()
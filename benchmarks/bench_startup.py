@@ -0,0 +1,71 @@
+"""
+Temps entre le lancement d'un processus et son premier résultat, pour main.py
+et watcher.py. Chaque mesure est faite dans un interpréteur neuf.
+
+    python -m benchmarks.bench_startup "CV/Lukas Mens.pdf" --repetitions 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Chaque script affiche le temps d'import puis celui du premier résultat (depuis le lancement)
+SCRIPTS = {
+    "main": """
+import sys, time
+t0 = time.perf_counter()
+import main
+t_import = time.perf_counter() - t0
+main.traiter_en_serie([sys.argv[1]])
+""",
+    "watcher": """
+import sys, time
+t0 = time.perf_counter()
+import watcher
+t_import = time.perf_counter() - t0
+watcher.process_file(sys.argv[1])
+""",
+}
+
+SUFFIXE = """
+import json
+print("BENCH " + json.dumps({"import": t_import}))
+"""
+
+
+def lancer(nom, fichier):
+    debut = time.perf_counter()
+    sortie = subprocess.run([sys.executable, "-c", SCRIPTS[nom] + SUFFIXE, fichier],
+                            cwd=RACINE, capture_output=True, text=True)
+    total = time.perf_counter() - debut
+    for ligne in sortie.stdout.splitlines():
+        if ligne.startswith("BENCH "):
+            return {"import_s": json.loads(ligne[6:])["import"], "premier_resultat_s": total}
+    raise RuntimeError(f"{nom} a échoué :\n{sortie.stderr}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("fichier", help="Document traité pour le premier résultat")
+    parser.add_argument("--repetitions", type=int, default=3)
+    args = parser.parse_args()
+
+    fichier = os.path.abspath(args.fichier)
+    resultats = {}
+    for nom in SCRIPTS:
+        mesures = [lancer(nom, fichier) for _ in range(args.repetitions)]
+        resultats[nom] = {
+            "import_s": round(min(m["import_s"] for m in mesures), 3),
+            "premier_resultat_s": round(min(m["premier_resultat_s"] for m in mesures), 3),
+        }
+        print(f"{nom:8s} import {resultats[nom]['import_s']:.3f} s, "
+              f"premier résultat {resultats[nom]['premier_resultat_s']:.3f} s")
+    print(json.dumps(resultats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
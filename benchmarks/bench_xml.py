@@ -0,0 +1,67 @@
+"""
+Débit d'écriture XML : create_xml (arbre ElementTree + minidom) contre
+write_xml (flux lxml) et les sorties par lot XML / JSON Lines.
+
+    python -m benchmarks.bench_xml --records 2000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from xml_utils import create_xml, write_xml, XmlBatchSink, JsonlBatchSink
+
+CARTE = {
+    "numero_carte": "880693202043", "nom": "DUPONT", "prenom": "Jean Pierre",
+    "date_naissance": "01-01-1980", "lieu_naissance": "Lyon", "sexe": "Masculin",
+    "adresse": "12 rue de la Paix 75002 Paris", "date_expiration": "Inconnu",
+}
+CV = {
+    "type": "cv", "prenom": "Marie", "nom": "Curie", "email": "marie.curie@mail.com",
+    "telephone": "06 12 34 56 78", "adresse": "Inconnu",
+    "experiences": [{"poste": "Ingénieure", "entreprise": "Orange", "debut": "2015", "fin": "2020",
+                     "description": "Développement de services de données"}] * 3,
+    "formations": [{"diplome": "Master informatique", "etablissement": "Lyon 1", "annee": "2014"}] * 2,
+    "competences": ["Python", "SQL", "Docker", "spaCy", "OCR"],
+}
+RECORDS = [("carte_identite", CARTE), ("cv", CV)]
+
+
+def mesurer(nom, n, fn):
+    debut = time.perf_counter()
+    fn()
+    duree = time.perf_counter() - debut
+    print(f"{nom:28s} {n / duree:10.0f} enregistrements/s")
+    return duree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=1000)
+    args = parser.parse_args()
+    n = args.records
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def fichiers_individuels(fn):
+            for i in range(n):
+                doc_type, info = RECORDS[i % 2]
+                fn(info, os.path.join(tmp, f"{i}.xml"), doc_type)
+
+        def lot(classe):
+            with classe(os.path.join(tmp, classe.__name__)) as sink:
+                for i in range(n):
+                    doc_type, info = RECORDS[i % 2]
+                    sink.append(info, doc_type, f"doc_{i}.pdf")
+
+        ref = mesurer("create_xml (actuel)", n, lambda: fichiers_individuels(lambda d, f, t: create_xml(d, f)))
+        for nom, fn in [
+            ("write_xml (flux lxml)", lambda: fichiers_individuels(write_xml)),
+            ("XmlBatchSink", lambda: lot(XmlBatchSink)),
+            ("JsonlBatchSink", lambda: lot(JsonlBatchSink)),
+        ]:
+            duree = mesurer(nom, n, fn)
+            print(f"{'':28s} x{ref / duree:.2f} par rapport à create_xml")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Générateur de corpus synthétique reproductible : cartes d'identité façon CNI
+(avec MRZ valide), CV d'une ou plusieurs pages, PDF scannés (images) et PDF
+natifs (couche texte), bruit configurable. La vérité terrain est écrite dans
+verite.json pour mesurer la précision de l'extraction.
+
+    python -m benchmarks.corpus bench_corpus --cartes 20 --cv 20 --bruit 0.3
+"""
+import argparse
+import json
+import os
+import random
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from mrz import check_digit
+
+NOMS = ["MARTIN", "BERNARD", "DUBOIS", "THOMAS", "ROBERT", "RICHARD", "PETIT", "DURAND",
+        "LEROY", "MOREAU", "SIMON", "LAURENT", "LEFEBVRE", "MICHEL", "GARCIA", "ROUSSEAU"]
+PRENOMS = [("Jean", "M"), ("Pierre", "M"), ("Louis", "M"), ("Hugo", "M"), ("Lucas", "M"),
+           ("Marie", "F"), ("Camille", "F"), ("Léa", "F"), ("Chloé", "F"), ("Emma", "F")]
+VILLES = ["PARIS", "LYON", "MARSEILLE", "TOULOUSE", "NANTES", "LILLE", "RENNES", "BORDEAUX"]
+POSTES = ["Développeur Python", "Chef de projet", "Data analyst", "Technicien support",
+          "Ingénieur systèmes", "Comptable", "Assistant commercial"]
+ENTREPRISES = ["Orange", "Capgemini", "Airbus", "Decathlon", "SNCF", "Thales", "Michelin"]
+DIPLOMES = ["Master informatique", "Licence économie", "BTS SIO", "DUT GEA", "Diplôme d'ingénieur"]
+COMPETENCES = ["Python", "SQL", "Excel", "Docker", "Java", "Gestion de projet", "Anglais", "Linux"]
+
+CARTE_TAILLE = (1012, 638)    # format ID-1 à 300 DPI
+PAGE_TAILLE = (1240, 1754)    # A4 à 150 DPI
+PAGE_DPI = 150
+
+
+def _police(taille):
+    for chemin in ("DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+                   "C:\\Windows\\Fonts\\arial.ttf"):
+        try:
+            return ImageFont.truetype(chemin, taille)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=taille)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+def _bruit(image, niveau, rng):
+    """
+    Dégradations d'un scan : rotation légère, flou et points parasites.
+    """
+    if niveau <= 0:
+        return image
+    image = image.rotate(rng.uniform(-3, 3) * niveau, expand=False, fillcolor="white")
+    image = image.filter(ImageFilter.GaussianBlur(radius=0.8 * niveau))
+    draw = ImageDraw.Draw(image)
+    largeur, hauteur = image.size
+    for _ in range(int(largeur * hauteur * 0.002 * niveau)):
+        x, y = rng.randrange(largeur), rng.randrange(hauteur)
+        draw.point((x, y), fill=(rng.randrange(80), ) * 3)
+    return image
+
+
+def _date(rng, debut, fin):
+    return f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(debut, fin)}"
+
+
+def mrz_cni(nom, prenom, sexe, naissance, numero):
+    """
+    MRZ de l'ancienne CNI (2 × 36 caractères) avec des chiffres de contrôle valides.
+    """
+    l1 = ("IDFRA" + nom.replace(" ", "<"))[:30].ljust(30, "<") + "693016"
+    jj, mm, aaaa = naissance.split(".")
+    dob = aaaa[2:] + mm + jj
+    prenom_mrz = prenom.upper().replace("É", "E").replace("È", "E")[:14].ljust(14, "<")
+    l2 = numero + check_digit(numero) + prenom_mrz + dob + check_digit(dob) + sexe
+    l2 += check_digit(l1 + l2)
+    return l1, l2
+
+
+def carte(rng, niveau_bruit):
+    nom = rng.choice(NOMS)
+    prenom, sexe = rng.choice(PRENOMS)
+    naissance = _date(rng, 1950, 2005)
+    lieu = rng.choice(VILLES)
+    numero = f"{rng.randint(10, 99)}{rng.randint(1, 12):02d}693{rng.randint(10000, 99999)}"   # 12 caractères
+
+    image = Image.new("RGB", CARTE_TAILLE, (235, 240, 248))
+    draw = ImageDraw.Draw(image)
+    grand, moyen, mrz_police = _police(30), _police(26), _police(30)
+    draw.text((40, 25), "RÉPUBLIQUE FRANÇAISE", font=grand, fill="black")
+    draw.text((40, 65), f"CARTE NATIONALE D'IDENTITÉ N° : {numero}", font=moyen, fill="black")
+    draw.text((360, 130), f"Nom : {nom}", font=moyen, fill="black")
+    draw.text((360, 175), f"Prénom(s) : {prenom}", font=moyen, fill="black")
+    draw.text((360, 220), f"Sexe : {sexe}    Nationalité : Française", font=moyen, fill="black")
+    draw.text((360, 265), f"Né(e) le : {naissance}", font=moyen, fill="black")
+    draw.text((360, 310), f"à : {lieu}", font=moyen, fill="black")
+    draw.rectangle((40, 130, 320, 440), outline="black", width=2)   # emplacement photo
+    l1, l2 = mrz_cni(nom, prenom, sexe, naissance, numero)
+    draw.text((30, 520), l1, font=mrz_police, fill="black")
+    draw.text((30, 570), l2, font=mrz_police, fill="black")
+
+    verite = {"type": "carte_identite", "nom": nom, "prenom": prenom,
+              "numero_carte": numero, "date_naissance": naissance.replace(".", "-"),
+              "sexe": "Masculin" if sexe == "M" else "Féminin"}
+    return _bruit(image, niveau_bruit, rng), verite
+
+
+def lignes_cv(rng, nb_pages):
+    nom = rng.choice(NOMS)
+    prenom, _ = rng.choice(PRENOMS)
+    email = f"{prenom.lower().replace('é', 'e')}.{nom.lower()}@mail.com"
+    telephone = f"06 {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)}"
+    lignes = ["Curriculum vitae", f"{prenom} {nom}", email, telephone, "",
+              "Profil", "Professionnel motivé à la recherche d'un nouveau poste.", ""]
+    # ~45 lignes par page
+    while len(lignes) < 45 * nb_pages - 12:
+        lignes += ["Expérience professionnelle",
+                   f"{rng.choice(POSTES)} chez {rng.choice(ENTREPRISES)} de {rng.randint(2005, 2015)} "
+                   f"à {rng.randint(2016, 2024)}",
+                   "Missions : analyse des besoins, développement et suivi des livrables.", ""]
+    lignes += ["Formation", f"{rng.choice(DIPLOMES)} - {rng.randint(2000, 2020)}", "",
+               "Compétences", ", ".join(rng.sample(COMPETENCES, 4)), ""]
+    verite = {"type": "cv", "nom": nom, "prenom": prenom, "email": email, "telephone": telephone}
+    return lignes, verite
+
+
+def _pages(lignes, par_page=45):
+    return [lignes[i:i + par_page] for i in range(0, len(lignes), par_page)]
+
+
+def pages_cv_images(lignes, rng, niveau_bruit):
+    police = _police(22)
+    images = []
+    for page in _pages(lignes):
+        image = Image.new("RGB", PAGE_TAILLE, "white")
+        draw = ImageDraw.Draw(image)
+        for i, ligne in enumerate(page):
+            draw.text((110, 110 + i * 34), ligne, font=police, fill="black")
+        images.append(_bruit(image, niveau_bruit, rng))
+    return images
+
+
+def _pdf_texte(s):
+    s = s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return s.encode("cp1252", errors="replace")
+
+
+def ecrire_pdf_natif(chemin, lignes):
+    """
+    PDF minimal avec une vraie couche texte (Helvetica, WinAnsiEncoding),
+    comme un export Word : pdftotext le lit sans OCR.
+    """
+    pages = _pages(lignes)
+    objets = []   # contenu de chaque objet, numéroté à partir de 1
+    n_pages = len(pages)
+    # 1 catalogue, 2 arbre des pages, 3 police, puis (page, contenu) par page
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(n_pages))
+    objets.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objets.append(f"<< /Type /Pages /Kids [{kids}] /Count {n_pages} >>".encode())
+    objets.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    for i, page in enumerate(pages):
+        flux = b"BT /F1 11 Tf 14 TL 56 790 Td " + b" ".join(b"(" + _pdf_texte(l) + b") '" for l in page) + b" ET"
+        objets.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                      f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode())
+        objets.append(b"<< /Length " + str(len(flux)).encode() + b" >>\nstream\n" + flux + b"\nendstream")
+
+    sortie = bytearray(b"%PDF-1.4\n")
+    positions = []
+    for numero, contenu in enumerate(objets, start=1):
+        positions.append(len(sortie))
+        sortie += f"{numero} 0 obj\n".encode() + contenu + b"\nendobj\n"
+    xref = len(sortie)
+    sortie += f"xref\n0 {len(objets) + 1}\n0000000000 65535 f \n".encode()
+    for position in positions:
+        sortie += f"{position:010d} 00000 n \n".encode()
+    sortie += f"trailer\n<< /Size {len(objets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(chemin, "wb") as f:
+        f.write(sortie)
+
+
+def generer_corpus(dossier, nb_cartes=10, nb_cv=10, max_pages_cv=3, bruit=0.0,
+                   part_natifs=0.5, seed=42):
+    """
+    Écrit le corpus dans `dossier` et retourne la vérité terrain {nom_fichier: champs}.
+    Même seed = mêmes fichiers.
+    """
+    rng = random.Random(seed)
+    os.makedirs(dossier, exist_ok=True)
+    verite = {}
+
+    for i in range(nb_cartes):
+        image, champs = carte(rng, bruit)
+        if i % 2 == 0:
+            nom_fichier = f"carte_{i:04d}.png"
+            image.save(os.path.join(dossier, nom_fichier))
+        else:
+            nom_fichier = f"carte_{i:04d}.pdf"
+            image.save(os.path.join(dossier, nom_fichier), resolution=300)
+        verite[nom_fichier] = champs
+
+    for i in range(nb_cv):
+        nb_pages = rng.randint(1, max_pages_cv)
+        lignes, champs = lignes_cv(rng, nb_pages)
+        natif = rng.random() < part_natifs
+        nom_fichier = f"cv_{i:04d}_{'natif' if natif else 'scan'}_{nb_pages}p.pdf"
+        chemin = os.path.join(dossier, nom_fichier)
+        if natif:
+            ecrire_pdf_natif(chemin, lignes)
+        else:
+            images = pages_cv_images(lignes, rng, bruit)
+            images[0].save(chemin, save_all=True, append_images=images[1:], resolution=PAGE_DPI)
+        champs["pages"] = len(_pages(lignes))
+        champs["natif"] = natif
+        verite[nom_fichier] = champs
+
+    with open(os.path.join(dossier, "verite.json"), "w", encoding="utf-8") as f:
+        json.dump(verite, f, ensure_ascii=False, indent=2)
+    return verite
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("dossier")
+    parser.add_argument("--cartes", type=int, default=10)
+    parser.add_argument("--cv", type=int, default=10)
+    parser.add_argument("--max-pages", type=int, default=3)
+    parser.add_argument("--bruit", type=float, default=0.0, help="0 = propre, 1 = très dégradé")
+    parser.add_argument("--natifs", type=float, default=0.5, help="Part de CV en PDF natif")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    verite = generer_corpus(args.dossier, args.cartes, args.cv, args.max_pages,
+                            args.bruit, args.natifs, args.seed)
+    print(f"{len(verite)} documents générés dans {args.dossier}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Démonstration de la réservation des fichiers avec plusieurs processus locaux
+sur une même boîte de dépôt (le traitement est simulé par une attente).
+Un des workers « plante » au milieu d'un fichier : ses fichiers doivent être
+récupérés par les autres après expiration du battement. Vérifie que chaque
+fichier est traité exactement une fois et mesure le débit selon le nombre de workers.
+
+    python -m benchmarks.demo_claims --fichiers 60 --workers 1 2 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from claims import ClaimManager, EN_COURS, BATTEMENT
+from config import CLAIM_ROOT
+
+
+def reste_du_travail(boite):
+    if any(e.is_file() for e in os.scandir(boite)):
+        return True
+    # Fichiers encore réservés (par un worker vivant ou planté) ?
+    en_cours = os.path.join(boite, CLAIM_ROOT, EN_COURS)
+    if not os.path.isdir(en_cours):
+        return False
+    return any(nom != BATTEMENT for travail in os.scandir(en_cours) for nom in os.listdir(travail.path))
+
+
+def worker(boite, journal, duree, ttl, plantage):
+    claims = ClaimManager(heartbeat=ttl / 4, ttl=ttl)
+    claims.start()
+    while reste_du_travail(boite):
+        claims.recover_stale(boite)
+        noms = sorted(e.name for e in os.scandir(boite) if e.is_file())
+        for nom in noms:
+            reserve = claims.claim(os.path.join(boite, nom))
+            if reserve is None:
+                continue
+            if plantage:
+                time.sleep(duree)
+                os._exit(1)    # arrêt brutal : ni rangement ni battement
+            time.sleep(duree)
+            with open(journal, "a", encoding="utf-8") as f:
+                f.write(f"{nom}\t{claims.worker_id}\n")
+            claims.release(reserve, "traite")
+        time.sleep(0.05)
+    claims.stop()
+
+
+def executer(nb_fichiers, nb_workers, duree, ttl, avec_plantage):
+    with tempfile.TemporaryDirectory() as dossier:
+        boite = os.path.join(dossier, "boite")
+        os.makedirs(boite)
+        for i in range(nb_fichiers):
+            with open(os.path.join(boite, f"doc_{i:04d}.pdf"), "wb") as f:
+                f.write(b"%PDF-1.4\n")
+        journal = os.path.join(dossier, "traites.tsv")
+
+        debut = time.perf_counter()
+        processus = [multiprocessing.Process(target=worker, args=(boite, journal, duree, ttl, False))
+                     for _ in range(nb_workers)]
+        if avec_plantage:
+            processus.append(multiprocessing.Process(target=worker, args=(boite, journal, duree, ttl, True)))
+        for p in processus:
+            p.start()
+        for p in processus:
+            p.join()
+        ecoule = time.perf_counter() - debut
+
+        with open(journal, encoding="utf-8") as f:
+            traites = [ligne.split("\t")[0] for ligne in f]
+        ranges = os.listdir(os.path.join(boite, CLAIM_ROOT, "traites"))
+    return {
+        "workers": nb_workers,
+        "plantage_simule": avec_plantage,
+        "fichiers": nb_fichiers,
+        "traites": len(set(traites)),
+        "doublons": len(traites) - len(set(traites)),
+        "manquants": nb_fichiers - len(set(traites)),
+        "ranges": len(ranges),
+        "duree_s": round(ecoule, 2),
+        "fichiers_par_s": round(nb_fichiers / ecoule, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fichiers", type=int, default=60)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duree", type=float, default=0.05, help="Traitement simulé par fichier (s)")
+    parser.add_argument("--ttl", type=float, default=1.0, help="Expiration des réservations (s)")
+    parser.add_argument("--sans-plantage", action="store_true")
+    args = parser.parse_args(argv)
+
+    rapports = [executer(args.fichiers, n, args.duree, args.ttl, not args.sans_plantage)
+                for n in args.workers]
+    print(json.dumps(rapports, ensure_ascii=False, indent=2))
+    ok = all(r["doublons"] == 0 and r["manquants"] == 0 for r in rapports)
+    print("✅ Chaque fichier traité exactement une fois" if ok else "❌ Doublons ou fichiers manquants")
+    return rapports
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Test de charge du service HTTP (service.py) : N clients simultanés envoient les
+documents d'un dossier en boucle. Rapporte les statuts reçus, les latences
+(p50/p95) et le débit. Client en asyncio pur, sans dépendance.
+
+    python service.py --workers 2 &
+    python -m benchmarks.load_test --corpus bench_corpus --clients 8 --requetes 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import Counter
+
+from benchmarks.bench_pipeline import percentiles
+from main import lister_fichiers
+from config import SERVICE_HOST, SERVICE_PORT
+
+
+async def envoyer(host, port, chemin, contenu, format_sortie):
+    debut = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    nom = os.path.basename(chemin)
+    requete = (f"POST /extraire?format={format_sortie}&nom={nom} HTTP/1.1\r\n"
+               f"Host: {host}:{port}\r\nContent-Length: {len(contenu)}\r\n"
+               "Connection: close\r\n\r\n").encode("latin-1")
+    writer.write(requete + contenu)
+    await writer.drain()
+    reponse = await reader.read()
+    writer.close()
+    statut = int(reponse.split(b" ", 2)[1]) if reponse else 0
+    return statut, time.perf_counter() - debut
+
+
+async def client(file_requetes, host, port, documents, format_sortie, statuts, latences):
+    while True:
+        try:
+            i = file_requetes.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        chemin, contenu = documents[i % len(documents)]
+        try:
+            statut, duree = await envoyer(host, port, chemin, contenu, format_sortie)
+        except OSError:
+            statut, duree = 0, None
+        statuts[statut] += 1
+        if statut == 200:
+            latences.append(duree)
+
+
+async def charge(host, port, documents, nb_clients, nb_requetes, format_sortie):
+    file_requetes = asyncio.Queue()
+    for i in range(nb_requetes):
+        file_requetes.put_nowait(i)
+    statuts = Counter()
+    latences = []
+    debut = time.perf_counter()
+    await asyncio.gather(*(client(file_requetes, host, port, documents, format_sortie, statuts, latences)
+                           for _ in range(nb_clients)))
+    return statuts, latences, time.perf_counter() - debut
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", default="bench_corpus", help="Dossier de documents à envoyer")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--clients", type=int, default=8, help="Connexions simultanées")
+    parser.add_argument("--requetes", type=int, default=100)
+    parser.add_argument("--format", choices=["json", "xml"], default="json")
+    args = parser.parse_args(argv)
+
+    documents = []
+    for chemin in lister_fichiers(args.corpus):
+        with open(chemin, "rb") as f:
+            documents.append((chemin, f.read()))
+    if not documents:
+        parser.error(f"aucun document dans {args.corpus}")
+
+    statuts, latences, duree = asyncio.run(
+        charge(args.host, args.port, documents, args.clients, args.requetes, args.format))
+    rapport = {
+        "clients": args.clients,
+        "requetes": args.requetes,
+        "duree_s": round(duree, 3),
+        "reussies_par_s": round(statuts[200] / duree, 3) if duree else None,
+        "statuts": {str(k): v for k, v in sorted(statuts.items())},
+        "latence_reussies": percentiles(latences),
+    }
+    print(json.dumps(rapport, ensure_ascii=False, indent=2))
+    return rapport
+
+
+if __name__ == "__main__":
+    main()
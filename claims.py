@@ -0,0 +1,208 @@
+import os
+import socket
+import threading
+import time
+
+from config import CLAIM_ROOT, CLAIM_HEARTBEAT, CLAIM_LEASE_TTL
+
+EN_COURS = "en_cours"
+BATTEMENT = ".battement"
+
+# Dossier de rangement selon le statut final du traitement
+RANGEMENT = {"traite": "traites", "ignore": "ignores", "erreur": "erreurs"}
+
+
+def is_claim_path(path):
+    """
+    Vrai pour les chemins internes au mécanisme de réservation (à ignorer par les scans).
+    """
+    return CLAIM_ROOT in os.path.normpath(path).split(os.sep)
+
+
+class ClaimManager:
+    """
+    Réservation des fichiers d'un dossier partagé entre plusieurs workers
+    (processus ou machines) :
+    - réserver = renommer le fichier dans <dossier>/.carteid/en_cours/<worker>/ ;
+      le renommage est atomique, un seul worker gagne, les autres reçoivent
+      FileNotFoundError ;
+    - un thread met à jour un fichier de battement dans chaque dossier du worker ;
+    - un worker dont le battement a plus de `ttl` secondes est considéré mort :
+      ses fichiers sont remis dans la boîte de dépôt par le premier qui le voit ;
+    - en fin de traitement, le fichier est rangé dans traites/, ignores/ ou erreurs/.
+    Les sous-dossiers sont dans la boîte elle-même pour rester sur le même volume.
+    """
+
+    def __init__(self, worker_id=None, heartbeat=CLAIM_HEARTBEAT, ttl=CLAIM_LEASE_TTL):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.heartbeat = heartbeat
+        self.ttl = ttl
+        self._dossiers = set()     # dossiers de travail de ce worker
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _racine(dossier):
+        return os.path.join(dossier, CLAIM_ROOT)
+
+    def _dossier_travail(self, dossier):
+        travail = os.path.join(self._racine(dossier), EN_COURS, self.worker_id)
+        with self._lock:
+            if travail not in self._dossiers:
+                # Dossier d'un processus précédent de même identifiant (même
+                # machine, pid réutilisé) : ses fichiers sont remis dans la boîte
+                self._remettre(travail, dossier, "Reprise d'un worker redémarré")
+                os.makedirs(travail, exist_ok=True)
+                self._battre(travail)
+                self._dossiers.add(travail)
+        return travail
+
+    @staticmethod
+    def _battre(travail):
+        with open(os.path.join(travail, BATTEMENT), "w", encoding="utf-8") as f:
+            f.write(f"{time.time()}\n")
+
+    def claim(self, filepath):
+        """
+        Réserve le fichier. Retourne son nouveau chemin, ou None si un autre
+        worker l'a pris (ou s'il a disparu).
+        """
+        dossier, nom = os.path.split(os.path.abspath(filepath))
+        cible = os.path.join(self._dossier_travail(dossier), nom)
+        try:
+            os.rename(filepath, cible)
+        except (FileNotFoundError, PermissionError):
+            return None
+        return cible
+
+    def release(self, claimed_path, statut="traite"):
+        """
+        Range un fichier réservé selon son statut ("traite", "ignore", "erreur").
+        """
+        travail, nom = os.path.split(claimed_path)
+        racine = os.path.dirname(os.path.dirname(travail))
+        rangement = os.path.join(racine, RANGEMENT.get(statut, "erreurs"))
+        os.makedirs(rangement, exist_ok=True)
+        os.replace(claimed_path, os.path.join(rangement, nom))
+
+    def recover_stale(self, dossier):
+        """
+        Remet dans la boîte de dépôt les fichiers des workers dont le battement
+        a expiré. Retourne le nombre de fichiers récupérés.
+        """
+        dossier = os.path.abspath(dossier)    # chemins comparés à ceux de claim()
+        en_cours = os.path.join(self._racine(dossier), EN_COURS)
+        try:
+            workers = os.listdir(en_cours)
+        except FileNotFoundError:
+            return 0
+        recuperes = 0
+        maintenant = time.time()
+        for worker in workers:
+            travail = os.path.join(en_cours, worker)
+            if worker == self.worker_id:
+                # Notre identifiant, mais un dossier que ce processus n'a pas encore
+                # ouvert : laissé par un processus mort au même pid. Sous le verrou,
+                # pour ne pas croiser une réservation en cours de ce processus.
+                with self._lock:
+                    if travail not in self._dossiers:
+                        recuperes += self._remettre(travail, dossier, "Reprise d'un worker redémarré")
+                continue
+            try:
+                dernier = os.stat(os.path.join(travail, BATTEMENT)).st_mtime
+            except FileNotFoundError:
+                try:
+                    dernier = os.stat(travail).st_mtime
+                except FileNotFoundError:
+                    continue
+            if maintenant - dernier <= self.ttl:
+                continue
+            recuperes += self._remettre(travail, dossier, f"Réservation expirée ({worker})")
+        return recuperes
+
+    def _remettre(self, travail, boite, motif):
+        """
+        Remet dans la boîte tous les fichiers d'un dossier de travail, un par
+        un : un échec ne bloque pas les suivants. Retourne le nombre remis.
+        """
+        remis = 0
+        try:
+            noms = os.listdir(travail)
+        except FileNotFoundError:
+            return 0
+        for nom in noms:
+            if nom == BATTEMENT:
+                continue
+            try:
+                self._restaurer(os.path.join(travail, nom), os.path.join(boite, nom))
+            except FileExistsError:
+                continue    # nom repris entre-temps dans la boîte : on réessaiera
+            except FileNotFoundError:
+                continue    # récupéré au même moment par un autre worker
+            except OSError as e:
+                print(f"[claims] Remise impossible de {nom} dans {boite} : {e}")
+                continue
+            remis += 1
+            print(f"🔁 {motif} : {nom} remis dans {boite}")
+        self._supprimer(travail)
+        return remis
+
+    @staticmethod
+    def _restaurer(source, destination):
+        """
+        Remet un fichier dans la boîte sans jamais écraser un dépôt du même nom
+        (os.rename écrase la destination sous POSIX) : lien physique, qui échoue
+        si la destination existe, puis suppression de la source.
+        """
+        try:
+            os.link(source, destination)
+        except (FileExistsError, FileNotFoundError):
+            raise
+        except OSError:
+            if os.name != "nt":
+                raise
+            # Volume sans liens physiques : sous Windows, rename refuse lui aussi une destination existante
+            os.rename(source, destination)
+            return
+        os.unlink(source)
+
+    @staticmethod
+    def _supprimer(travail):
+        try:
+            os.remove(os.path.join(travail, BATTEMENT))
+        except FileNotFoundError:
+            pass
+        try:
+            os.rmdir(travail)
+        except OSError:
+            pass    # encore des fichiers (nom déjà présent dans la boîte) : on réessaiera
+
+    def _boucle(self):
+        while not self._stop.wait(self.heartbeat):
+            with self._lock:
+                dossiers = list(self._dossiers)
+            for travail in dossiers:
+                try:
+                    self._battre(travail)
+                except OSError as e:
+                    print(f"💓 Battement impossible dans {travail} : {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._boucle, name="claims-heartbeat", daemon=True)
+        self._thread.start()
+        print(f"🔒 Réservation des fichiers active (worker {self.worker_id})")
+
+    def stop(self):
+        """
+        Arrêt propre : les fichiers encore réservés sont remis dans leur boîte.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.heartbeat + 1)
+        with self._lock:
+            dossiers = list(self._dossiers)
+            self._dossiers.clear()
+        for travail in dossiers:
+            boite = os.path.dirname(os.path.dirname(os.path.dirname(travail)))
+            self._remettre(travail, boite, "Arrêt du worker")
@@ -0,0 +1,174 @@
+import re
+import unicodedata
+from collections import namedtuple
+
+# Forme canonique, octet par octet (latin-1) : minuscules sans accents, et les
+# caractères que l'OCR confond ramenés à un seul (0/o, 1/i/l/|/!, 5/s, @/a).
+# Les caractères hors latin-1 (’, œ...) deviennent « ? », traité comme une apostrophe.
+def _table_canonique():
+    confusions = {}
+    for confondus, canonique in (("0", "o"), ("1i|!", "l"), ("5$", "s"), ("@", "a"),
+                                 ("`\xb4?", "'"), ("\n\r\t\f\v\xa0", " ")):
+        for caractere in confondus:
+            confusions[caractere] = canonique
+    table = bytearray(range(256))
+    for code in range(256):
+        base = unicodedata.normalize("NFKD", chr(code)).encode("ascii", "ignore").decode("ascii").lower()
+        if len(base) != 1:
+            base = chr(code)
+        table[code] = ord(confusions.get(base, base))
+    return bytes(table)
+
+_TABLE = _table_canonique()
+
+
+def canonical(text):
+    """
+    Forme canonique (bytes) sur laquelle les mots-clés sont cherchés.
+    """
+    return text.encode("latin-1", "replace").translate(_TABLE)
+
+
+# Mots-clés par type de document et nombre minimal de mots-clés présents
+TYPES = {
+    "carte_identite": (['république française', "carte d'identité", 'nationalité', 'nom', 'prénom',
+                        "date d'expiration", 'sexe'], 3),
+    "cv": (['curriculum vitae', 'expérience', 'formation', 'diplôme', 'stage', 'compétences',
+            'poste', 'profil'], 3),
+}
+
+# type, score (mots-clés trouvés), confiance (part du vocabulaire du type), mots-clés trouvés
+Classement = namedtuple("Classement", ["type", "score", "confiance", "mots"])
+
+
+def _motif(caractere):
+    if caractere == b" ":
+        return rb" +"
+    if caractere == b"'":
+        return rb"'? *"    # apostrophe gardée, espacée ou perdue par l'OCR
+    return re.escape(caractere)
+
+
+def _trie(mots):
+    """
+    Arbre des préfixes communs : {octet: sous-arbre}, la clé None porte le
+    groupe du mot-clé qui se termine à ce nœud.
+    """
+    racine = {}
+    for groupe, mot in mots:
+        noeud = racine
+        for code in b" ".join(mot.split()):
+            noeud = noeud.setdefault(bytes([code]), {})
+        noeud[None] = groupe
+    return racine
+
+
+def _trie_regex(noeud):
+    fin = f"(?P<{noeud[None]}>)".encode() if None in noeud else b""
+    branches = [_motif(caractere) + _trie_regex(enfant)
+                for caractere, enfant in noeud.items() if caractere is not None]
+    if not branches:
+        return fin
+    suite = branches[0] if len(branches) == 1 else b"(?:" + b"|".join(branches) + b")"
+    # Un mot-clé qui se prolonge en un autre (« nom », « nombre ») : le plus long
+    # l'emporte (son groupe est le dernier fermé), le plus court est compté par
+    # la table des inclusions
+    return fin + b"(?:" + suite + b")?" if fin else suite
+
+
+class Classifier:
+    """
+    Classement des documents par mots-clés en une seule passe sur le texte :
+    - le texte est ramené à sa forme canonique (une table de traduction
+      d'octets : casse, accents et confusions courantes de l'OCR) ;
+    - les mots-clés de tous les types sont compilés en une seule expression
+      régulière, factorisée en arbre de préfixes : à chaque position, un seul
+      parcours quel que soit le nombre de mots-clés ou de types ;
+    - un mot-clé trouvé crédite aussi ceux qu'il contient (« prénom » compte
+      pour « nom »), comme le faisait la recherche de sous-chaînes.
+    De nouveaux types s'ajoutent par register().
+    """
+
+    def __init__(self, types=TYPES):
+        self._types = {}
+        self._regex = None
+        for nom, (mots, seuil) in types.items():
+            self.register(nom, mots, seuil)
+
+    def register(self, nom, mots, seuil=1):
+        """
+        Ajoute (ou remplace) un type de document : présent si au moins `seuil` de ses mots-clés le sont.
+        """
+        self._types[nom] = (list(mots), seuil)
+        self._regex = None    # recompilée au prochain classement
+
+    def _compile(self):
+        formes = {}    # forme canonique -> [(type, mot-clé)]
+        for nom, (mots, _) in self._types.items():
+            for mot in mots:
+                formes.setdefault(b" ".join(canonical(mot).split()), []).append((nom, mot))
+        # groupe -> mots-clés crédités : le sien et ceux qu'il contient
+        self._credits = {}
+        groupes = []
+        for i, forme in enumerate(formes):
+            groupe = f"k{i}"
+            self._credits[groupe] = [paire for autre, paires in formes.items() if autre in forme
+                                     for paire in paires]
+            groupes.append((groupe, forme))
+        self._nb_mots = sum(len(paires) for paires in formes.values())
+        self._regex = re.compile(_trie_regex(_trie(groupes)))
+
+    def keywords_found(self, text):
+        """
+        {type: ensemble des mots-clés présents dans le texte}.
+        """
+        if self._regex is None:
+            self._compile()
+        vus = set()
+        trouves = set()
+        for correspondance in self._regex.finditer(canonical(text)):
+            groupe = correspondance.lastgroup
+            if groupe not in vus:
+                vus.add(groupe)
+                trouves.update(self._credits[groupe])
+                if len(trouves) == self._nb_mots:
+                    break    # tout est trouvé : inutile de lire la suite
+        par_type = {nom: set() for nom in self._types}
+        for nom, mot in trouves:
+            par_type[nom].add(mot)
+        return par_type
+
+    def scores(self, text):
+        """
+        Classement de chaque type déclaré, qu'il atteigne son seuil ou non.
+        """
+        return {nom: Classement(nom, len(mots), len(mots) / len(self._types[nom][0]), sorted(mots))
+                for nom, mots in self.keywords_found(text).items()}
+
+    def rank(self, text):
+        """
+        Types dont le seuil est atteint, du plus au moins sûr (à égalité,
+        l'ordre de déclaration départage).
+        """
+        ordre = {nom: i for i, nom in enumerate(self._types)}
+        retenus = [c for c in self.scores(text).values() if c.score >= self._types[c.type][1]]
+        return sorted(retenus, key=lambda c: (-c.confiance, ordre[c.type]))
+
+    def classify(self, text):
+        """
+        Type le plus probable, ou None.
+        """
+        classement = self.rank(text)
+        return classement[0].type if classement else None
+
+
+_classifier = None
+
+def get_classifier():
+    """
+    Classifieur partagé des types de documents, compilé au premier appel.
+    """
+    global _classifier
+    if _classifier is None:
+        _classifier = Classifier()
+    return _classifier
@@ -1,10 +1,136 @@
 import os
-import pytesseract
 
-pytesseract.pytesseract.tesseract_cmd = r'C:\tesseract\tesseract.exe'
+# pytesseract n'est importé qu'au premier OCR (voir ocr_utils.get_tesseract)
+TESSERACT_CMD = r'C:\tesseract\tesseract.exe'
 os.environ["TESSDATA_PREFIX"] = r"C:\tesseract\tessdata"
 POPPLER_PATH = r'C:\poppler\poppler-24.08.0\Library\bin'
 
 INPUT_FOLDER = r'D:\carteid_cv'
 OUTPUT_FOLDER = os.path.join(INPUT_FOLDER, 'xml')
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+
+# 🖨️ Rendu des PDF pour l'OCR
+OCR_DPI = 200          # résolution de rasterisation des pages
+OCR_MAX_PAGES = None   # None = toutes les pages
+
+# 🗄️ Cache OCR persistant (clé = contenu du fichier + paramètres OCR)
+OCR_CACHE_ENABLED = True
+OCR_CACHE_PATH = os.path.join(INPUT_FOLDER, 'ocr_cache.sqlite')
+OCR_CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+# ♻️ Quasi-doublons : un document rescanné réutilise l'extraction précédente, si ses champs
+# d'identité (numéro, nom, email...) se lisent aussi dans le texte du tri rapide
+DEDUP_ENABLED = True
+DEDUP_PATH = os.path.join(INPUT_FOLDER, 'doublons.sqlite')
+DEDUP_HASH_SIZE = 32        # empreinte du rendu de tri de la 1re page, 32x32 = 1024 bits (taille² multiple de 32)
+DEDUP_MAX_DISTANCE = 10     # bits différents tolérés par page (exact jusqu'à 31)
+DEDUP_AUDIT_PATH = os.path.join(INPUT_FOLDER, 'doublons_audit.jsonl')
+
+# 📂 Dossiers surveillés par surveillance.py
+INPUT_DIR_ID = os.path.join(INPUT_FOLDER, 'carte identité')
+INPUT_DIR_CV = os.path.join(INPUT_FOLDER, 'CV')
+OUTPUT_DIR = OUTPUT_FOLDER
+
+# 📝 Couche texte des PDF natifs (Word, LaTeX...) : pas d'OCR si elle est exploitable
+TEXT_LAYER_ENABLED = True
+TEXT_LAYER_MIN_CHARS = 50   # caractères alphanumériques minimum par page
+
+# 🔎 Tri rapide sur la première page avant l'OCR complet
+TRIAGE_ENABLED = True
+TRIAGE_DPI = 100            # rendu basse résolution de la première page des PDF
+TRIAGE_MAX_SIDE = 1200      # taille max (px) des images pour le tri
+TRIAGE_TYPES = ("carte_identite", "cv")   # types qui justifient un OCR complet
+
+# 🧠 spaCy : traitement par lot (nlp.pipe)
+NLP_BATCH_SIZE = 32
+NLP_N_PROCESS = 1
+
+# 🛂 Lecture de la bande MRZ des cartes d'identité
+MRZ_ENABLED = True
+MRZ_BAND = 0.3        # fraction basse de la page OCRisée pour chercher la MRZ
+MRZ_MAX_PAGES = 2     # recto / verso
+MRZ_LANG = 'eng'      # 'ocrb' si le traineddata OCR-B est installé
+
+# 🪪 Mode gabarit : OCR zone par zone de la carte redressée
+ID_TEMPLATE_ENABLED = True
+ID_TEMPLATE_MIN_FIELDS = 3    # en dessous, repli sur l'OCR de la carte entière
+ID_TEMPLATE_WORKERS = 6       # zones OCRisées en parallèle
+
+# 👀 watcher.py : file de travail
+WATCHER_WORKERS = 2
+WATCHER_QUEUE_SIZE = 100
+WATCHER_DEBOUNCE = 1.0        # secondes sans évènement avant de traiter un fichier
+WATCHER_STATS_INTERVAL = 30   # secondes entre deux affichages de l'état de la file
+
+# 🚦 Ordonnancement des fichiers à traiter (lot, watcher.py, surveillance.py)
+SCHEDULER_ENABLED = True
+SCHEDULER_CLASSES = {
+    # poids : part des pages traitées quand plusieurs classes attendent ; slo : latence visée (s)
+    "carte_identite": {"poids": 4, "slo": 30},
+    "cv": {"poids": 1, "slo": 600},
+    "inconnu": {"poids": 1, "slo": 600},
+}
+SCHEDULER_FOLDERS = {"carte identite": "carte_identite", "cni": "carte_identite", "cv": "cv"}
+SCHEDULER_PROBE = False                    # tri rapide de la 1re page si le dossier ne donne pas la classe
+SCHEDULER_MAX_WAIT = 300                   # s : au-delà, un fichier de la file du watcher passe devant tous les autres
+SCHEDULER_BYTES_PER_PAGE = 200 * 1024      # estimation du coût quand le nombre de pages est illisible
+
+# 📒 surveillance.py : journal persistant des fichiers traités
+JOURNAL_PATH = os.path.join(INPUT_FOLDER, 'journal.sqlite')
+JOURNAL_HASH = False              # True : compare aussi le contenu (SHA-256)
+JOURNAL_MAX_ATTEMPTS = 3          # essais d'un fichier en erreur inchangé (verrouillé, copie en cours...)
+JOURNAL_RETRY_DELAY = 30          # secondes minimum entre deux essais d'un fichier en erreur
+SURVEILLANCE_INTERVAL = 5         # secondes entre deux passages
+SURVEILLANCE_FULL_SCAN_EVERY = 60 # relister tous les dossiers tous les N passages
+
+# 🔒 Réservation des fichiers : plusieurs workers (processus ou machines) sur une même boîte
+CLAIMS_ENABLED = False
+CLAIM_ROOT = '.carteid'    # sous-dossier de chaque boîte : en_cours/, traites/, ignores/, erreurs/
+CLAIM_HEARTBEAT = 10       # secondes entre deux battements
+CLAIM_LEASE_TTL = 60       # sans battement depuis ce délai, les fichiers du worker sont récupérés
+
+# 🧾 Sorties XML par lot (fichiers tournants)
+XML_BATCH_MAX_RECORDS = 10000
+XML_BATCH_FSYNC_EVERY = 100
+
+# 📈 Métriques (format Prometheus)
+METRICS_PORT = None             # ex. 9108 : http://127.0.0.1:9108/metrics
+METRICS_FILE = None             # ex. os.path.join(INPUT_FOLDER, 'metrics.prom')
+METRICS_FILE_INTERVAL = 15      # secondes
+METRICS_TRACE_PATH = None       # JSON Lines, un enregistrement par document
+
+# 🧽 Prétraitement OpenCV avant tesseract (chaque étape est désactivable)
+PREPROCESS = {
+    "actif": True,
+    "dpi_cible": 300,          # réduction des images plus résolues que nécessaire
+    "cote_max": 3000,          # px, pour les photos sans DPI connu
+    "niveaux_de_gris": True,
+    "recadrage": True,         # suppression des marges et bordures uniformes
+    "redressement": True,      # deskew
+    "binarisation": True,      # seuillage adaptatif
+}
+
+# 🔧 Moteur OCR : "lot" = un processus tesseract par lot d'images, "pytesseract" = un par image
+OCR_ENGINE = "lot"
+OCR_BATCH_SIZE = 8     # pages ou images par lot (borne aussi la mémoire)
+
+# 🎯 OCR adaptatif : passage rapide pour toutes les pages, reprise des seules pages peu sûres
+OCR_ADAPTIVE = True
+OCR_MIN_CONFIDENCE = 70                        # confiance moyenne des mots (0-100) en dessous de laquelle on reprend
+OCR_TIERS = [(150, 3), (300, 3), (300, 6)]     # paliers (DPI, psm tesseract), du plus rapide au plus coûteux
+
+# 🌐 service.py : service HTTP local d'ingestion
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8750
+SERVICE_WORKERS = 2
+SERVICE_MAX_PENDING = 8                  # documents en cours au-delà desquels on répond 429
+SERVICE_TIMEOUT = 120                    # secondes par requête (504 au-delà)
+SERVICE_MAX_BYTES = 20 * 1024 * 1024     # taille maximale d'un envoi
+
+# 🗄️ Archive pour ré-extraction sans OCR (texte + Doc spaCy par document)
+ARCHIVE_ENABLED = False
+ARCHIVE_DIR = os.path.join(INPUT_FOLDER, 'archive')
+
+# 🔍 Index de recherche des fiches extraites (SQLite FTS5), mis à jour à chaque document
+INDEX_ENABLED = True
+INDEX_PATH = os.path.join(INPUT_FOLDER, 'index.sqlite')
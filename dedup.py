@@ -0,0 +1,265 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from PIL import Image, ImageOps
+
+from ocr_utils import count_pages
+from classifier import canonical
+from metrics import inc
+from config import DEDUP_ENABLED, DEDUP_PATH, DEDUP_HASH_SIZE, DEDUP_MAX_DISTANCE, DEDUP_AUDIT_PATH
+
+# Empreinte découpée en bandes indexées : deux empreintes à distance de Hamming d
+# ont au moins une bande identique tant que d < NB_BANDES (principe des tiroirs).
+# Avec 32 bandes, tout seuil jusqu'à 31 bits est donc exact.
+NB_BANDES = 32
+
+# Écart de luminosité en dessous duquel deux cases voisines sont jugées égales :
+# sans cette marge, les grandes zones blanches basculent au moindre bruit de scan
+ECART_MIN = 6
+
+# Champs qui identifient la personne : la fiche d'un document proche n'est
+# reprise que s'ils se lisent aussi sur le nouveau (deux cartes d'un même
+# modèle, ou une carte perdue dans une page A4 blanche, ont des empreintes voisines)
+CHAMPS_IDENTITE = {"carte_identite": ("numero_carte", "nom"), "cv": ("nom", "email", "telephone")}
+
+# Empreinte d'un document : nombre de pages et dHash de la première page (rendu du tri rapide)
+Empreintes = namedtuple("Empreintes", ["nb_pages", "hashes"])
+
+
+def dhash(image, taille=DEDUP_HASH_SIZE):
+    """
+    Empreinte perceptuelle par différence (dHash) : image en niveaux de gris,
+    contraste normalisé, réduite à (taille+1) x taille, un bit par comparaison
+    de cases voisines. Insensible à la résolution, à la compression et aux
+    variations de luminosité d'un nouveau scan. Retourne un entier de taille² bits.
+    """
+    image.draft('L', (taille * 8, taille * 8))  # JPEG : décodage réduit, bien plus rapide
+    gris = ImageOps.autocontrast(image.convert('L'), cutoff=1)
+    pixels = gris.resize((taille + 1, taille), Image.BOX).tobytes()
+    valeur = 0
+    for ligne in range(taille):
+        debut = ligne * (taille + 1)
+        for col in range(taille):
+            valeur = (valeur << 1) | (pixels[debut + col] > pixels[debut + col + 1] + ECART_MIN)
+    return valeur
+
+
+def distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def _alphanumerique(texte):
+    # Forme canonique (casse, accents, confusions OCR) sans espaces ni ponctuation
+    return re.sub(rb"[^a-z0-9]", b"", canonical(texte))
+
+
+def confirm_content(texte, doc_type, info):
+    """
+    Vrai si tous les champs d'identité connus de la fiche (au moins un) se
+    retrouvent dans le texte lu sur le nouveau document.
+    """
+    if not texte:
+        return False
+    valeurs = [_alphanumerique(str(info.get(champ))) for champ in CHAMPS_IDENTITE.get(doc_type, ())
+               if info.get(champ) not in (None, "", "Inconnu")]
+    valeurs = [valeur for valeur in valeurs if len(valeur) >= 2]
+    if not valeurs:
+        return False
+    lu = _alphanumerique(texte)
+    return all(valeur in lu for valeur in valeurs)
+
+
+def _bandes(valeur, nb_bits):
+    largeur = nb_bits // NB_BANDES
+    masque = (1 << largeur) - 1
+    return [(valeur >> (i * largeur)) & masque for i in range(NB_BANDES)]
+
+
+class DedupIndex:
+    """
+    Index persistant (SQLite) des empreintes de pages des documents déjà
+    extraits, avec le résultat de leur extraction. La recherche passe par les
+    bandes indexées puis vérifie la distance exacte page par page.
+    """
+
+    def __init__(self, path=DEDUP_PATH, hash_size=DEDUP_HASH_SIZE):
+        self.path = path
+        self.nb_bits = hash_size * hash_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                fichier TEXT NOT NULL,
+                nb_pages INTEGER NOT NULL,
+                empreintes TEXT NOT NULL,
+                doc_type TEXT NOT NULL,
+                info TEXT NOT NULL,
+                date REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS bandes (
+                bande INTEGER NOT NULL,
+                valeur INTEGER NOT NULL,
+                doc_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_bandes ON bandes (bande, valeur);
+        """)
+        self._conn.commit()
+
+    def find(self, empreintes, max_distance=DEDUP_MAX_DISTANCE):
+        """
+        Document déjà extrait, de même nombre de pages, dont les pages
+        empreintées sont à au plus max_distance bits des pages données.
+        Retourne (doc_id, fichier, doc_type, info, distance max) ou None.
+        """
+        nb_pages, hashes = empreintes
+        if not hashes:
+            return None
+        conditions = " OR ".join(["(bande = ? AND valeur = ?)"] * NB_BANDES)
+        params = [x for i, v in enumerate(_bandes(hashes[0], self.nb_bits)) for x in (i, v)]
+        with self._lock:
+            candidats = self._conn.execute(
+                f"SELECT id, fichier, empreintes, doc_type, info FROM documents WHERE nb_pages = ? "
+                f"AND id IN (SELECT doc_id FROM bandes WHERE {conditions})",
+                [nb_pages] + params).fetchall()
+
+        meilleur = None
+        for doc_id, fichier, empreintes, doc_type, info in candidats:
+            ecarts = [distance(a, int(b, 16)) for a, b in zip(hashes, json.loads(empreintes))]
+            pire = max(ecarts)
+            if pire <= max_distance and (meilleur is None or pire < meilleur[-1]):
+                meilleur = (doc_id, fichier, doc_type, json.loads(info), pire)
+        return meilleur
+
+    def add(self, filepath, empreintes, doc_type, info):
+        # Seule la première page est indexée par bandes : la correspondance
+        # des pages suivantes est vérifiée sur les candidats
+        nb_pages, hashes = empreintes
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO documents (fichier, nb_pages, empreintes, doc_type, info, date) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (filepath, nb_pages, json.dumps([format(h, 'x') for h in hashes]),
+                 doc_type, json.dumps(info, ensure_ascii=False), time.time()))
+            self._conn.executemany(
+                "INSERT INTO bandes (bande, valeur, doc_id) VALUES (?, ?, ?)",
+                [(i, v, cur.lastrowid) for i, v in enumerate(_bandes(hashes[0], self.nb_bits))])
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM bandes")
+            self._conn.execute("DELETE FROM documents")
+
+    def stats(self):
+        with self._lock:
+            nb = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            par_type = dict(self._conn.execute(
+                "SELECT doc_type, COUNT(*) FROM documents GROUP BY doc_type").fetchall())
+        return {"documents": nb, **par_type}
+
+
+_index = None
+_desactive = False
+
+def disable():
+    """
+    Désactive la déduplication pour la suite du processus (mesures de débit).
+    """
+    global _desactive
+    _desactive = True
+
+
+def get_index():
+    """
+    Index partagé du processus (None si la déduplication est désactivée).
+    """
+    global _index
+    if not DEDUP_ENABLED or _desactive:
+        return None
+    if _index is None:
+        os.makedirs(os.path.dirname(DEDUP_PATH) or '.', exist_ok=True)
+        _index = DedupIndex()
+    return _index
+
+
+_audit_lock = threading.Lock()
+
+def _audit(**record):
+    if not DEDUP_AUDIT_PATH:
+        return
+    record["horodatage"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    with _audit_lock:
+        with open(DEDUP_AUDIT_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def find_duplicate(filepath, doc_type=None, apercu=None):
+    """
+    Étape de déduplication, entre le tri rapide et l'OCR complet. Retourne
+    (empreintes, doublon) : doublon vaut (doc_type, info) d'un document quasi
+    identique déjà extrait, ou None. Si doc_type est imposé, seul un document
+    de ce type est réutilisé.
+    L'empreinte est celle du rendu du tri (apercu) : un document lu par sa
+    couche texte, déjà en cache, ou sans tri rapide, n'est pas dédupliqué
+    (aucun rendu supplémentaire). La fiche n'est reprise que si ses champs
+    d'identité se lisent dans le texte du tri.
+    Les empreintes servent ensuite à remember().
+    """
+    index = get_index()
+    if index is None or apercu is None or apercu.empreinte is None:
+        return None, None
+    try:
+        hashes = Empreintes(count_pages(filepath), [apercu.empreinte])
+        trouve = index.find(hashes)
+    except Exception as e:
+        print(f"[dedup] Empreinte impossible pour {filepath} : {e}")
+        return None, None
+    if trouve is not None and doc_type and trouve[2] != doc_type:
+        trouve = None
+    if trouve is None:
+        inc("carteid_doublons_total", resultat="nouveau")
+        return hashes, None
+
+    doc_id, origine, doc_type, info, ecart = trouve
+    if not confirm_content(apercu.texte, doc_type, info):
+        inc("carteid_doublons_total", resultat="rejete")
+        print(f"[dedup] Empreinte proche de {origine} (écart {ecart} bits) mais contenu différent : "
+              f"extraction complète")
+        _audit(fichier=filepath, origine=origine, document=doc_id, type=doc_type,
+               distance=ecart, seuil=DEDUP_MAX_DISTANCE, rejete=True)
+        return hashes, None
+    inc("carteid_doublons_total", resultat="reutilise")
+    print(f"♻️ Quasi-doublon de {origine} (écart {ecart} bits) : extraction réutilisée")
+    _audit(fichier=filepath, origine=origine, document=doc_id, type=doc_type,
+           distance=ecart, seuil=DEDUP_MAX_DISTANCE)
+    return hashes, (doc_type, info)
+
+
+def remember(filepath, hashes, doc_type, info):
+    """
+    Enregistre l'extraction d'un nouveau document (les documents non reconnus
+    ne sont pas indexés).
+    """
+    index = get_index()
+    if index is None or not hashes or not doc_type:
+        return
+    index.add(filepath, hashes, doc_type, info)
+
+
+if __name__ == "__main__":
+    import sys
+    index = get_index()
+    if index is None:
+        print("Déduplication désactivée.")
+    elif "--vider" in sys.argv:
+        index.clear()
+        print("Index des doublons vidé.")
+    else:
+        for nom, valeur in sorted(index.stats().items()):
+            print(f"{nom} : {valeur}")
@@ -1,17 +1,16 @@
+from classifier import get_classifier
+
 def is_carte_identite(text):
-    text_lower = text.lower()
-    keywords = ['république française', "carte d'identité", 'nationalité', 'nom', 'prénom', "date d'expiration", 'sexe']
-    return sum(1 for kw in keywords if kw in text_lower) >= 3
+    return any(c.type == "carte_identite" for c in get_classifier().rank(text))
 
 def is_cv(text):
-    text_lower = text.lower()
-    keywords = ['curriculum vitae', 'expérience', 'formation', 'diplôme', 'stage', 'compétences', 'poste', 'profil']
-    return sum(1 for kw in keywords if kw in text_lower) >= 3
+    return any(c.type == "cv" for c in get_classifier().rank(text))
+
+def rank_document_types(text):
+    """
+    Types reconnus avec leur score et leur confiance, du plus au moins probable.
+    """
+    return get_classifier().rank(text)
 
 def detect_document_type(text):
-    if is_carte_identite(text):
-        return "carte_identite"
-    elif is_cv(text):
-        return "cv"
-    else:
-        return None  
+    return get_classifier().classify(text)
@@ -1,13 +1,15 @@
 import re
-import spacy
 from ocr_utils import clean_text
 from xml_utils import create_xml
-from nlp_model import nlp  # Utilisation du modèle centralisé
+from nlp_model import ner_doc, fill_docs  # Utilisation du modèle centralisé
+from metrics import timed
+from config import NLP_BATCH_SIZE, NLP_N_PROCESS
 
 
-def extract_info_cv(text):
+def extract_info_cv(text, doc=None):
     text = clean_text(text)
-    doc = nlp(text)
+    if doc is None:
+        doc = ner_doc(text)
 
     prenom = nom = email = phone = adresse = "Inconnu"
     experiences = []
@@ -148,6 +150,18 @@ def extract_info_cv(text):
     }
 
 
+@timed("spacy_lot")
+def extract_info_cv_batch(texts, docs=None, batch_size=NLP_BATCH_SIZE, n_process=NLP_N_PROCESS):
+    """
+    Version par lot de extract_info_cv : un seul nlp.pipe pour tous les CV.
+    `docs` fournit les Doc déjà connus (None pour ceux à calculer).
+    Retourne [(fiche, Doc), ...] : le Doc est archivé sans être recalculé.
+    """
+    texts = list(texts)
+    docs = fill_docs([clean_text(text) for text in texts], docs, batch_size, n_process)
+    return [(extract_info_cv(text, doc=doc), doc) for text, doc in zip(texts, docs)]
+
+
 def process_cv(file_path, text):
     info = extract_info_cv(text)
     xml_path = file_path.replace(".png", ".xml").replace(".jpg", ".xml").replace(".jpeg", ".xml").replace(".pdf", ".xml")
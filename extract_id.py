@@ -1,21 +1,27 @@
 import re
-from typing import Dict
-
-from nlp_model import get_nlp, clean_text
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from nlp_model import ner_doc, fill_docs, clean_text
+from mrz import parse_mrz, read_mrz
+from id_template import read_id_template
+from classifier import Classifier
+from metrics import timed
+from config import NLP_BATCH_SIZE, NLP_N_PROCESS, MRZ_ENABLED, ID_TEMPLATE_ENABLED
+
+# Mentions imprimées sur la carte : une seule suffit
+_ENTETE_CARTE = Classifier({"carte_identite": ([
+    "RÉPUBLIQUE FRANÇAISE",
+    "CARTE NATIONALE D'IDENTITÉ",
+    "IDENTITÉ",
+    "N° DOCUMENT",
+    "AUTORITÉ"
+], 1)})
 
 def detect_carte_identite(text: str) -> bool:
     """
     Détecte si le texte correspond à une carte d'identité française.
     """
-    text_upper = text.upper()
-    keywords = [
-        "RÉPUBLIQUE FRANÇAISE",
-        "CARTE NATIONALE D'IDENTITÉ",
-        "IDENTITÉ",
-        "N° DOCUMENT",
-        "AUTORITÉ"
-    ]
-    return any(kw in text_upper for kw in keywords)
+    return _ENTETE_CARTE.classify(text) == "carte_identite"
 
 def extract_sexe(lines) -> str:
     """
@@ -32,20 +38,28 @@ def extract_sexe(lines) -> str:
                 return sex
     return "Inconnu"
 
-def extract_info_id(text: str) -> Dict[str, str]:
+def prepare_text(text: str):
+    """
+    Nettoie le texte OCR et retourne (lignes, texte complet) ;
+    le texte complet est celui passé à spaCy.
+    """
+    text_clean = clean_text(text)
+    lines = [line.strip() for line in text_clean.split('\n') if line.strip()]
+    return lines, " ".join(lines)
+
+def extract_info_id(text: str, doc=None) -> Dict[str, str]:
     """
     Extrait les informations clés d'une carte d'identité française à partir du texte OCR.
+    `doc` permet de fournir un Doc spaCy déjà calculé (voir extract_info_id_batch).
     Retourne un dictionnaire avec les champs standardisés.
     """
     try:
         # Nettoyage du texte
-        text_clean = clean_text(text)
-        lines = [line.strip() for line in text_clean.split('\n') if line.strip()]
-        full_text = " ".join(lines)
+        lines, full_text = prepare_text(text)
 
-        # Chargement du pipeline NLP
-        nlp = get_nlp()
-        doc = nlp(full_text)
+        # Entités via le pipeline NLP réduit
+        if doc is None:
+            doc = ner_doc(full_text)
 
         result = {
             "numero_carte": "Inconnu",
@@ -133,3 +147,48 @@ def extract_info_id(text: str) -> Dict[str, str]:
             "adresse": "Inconnu",
             "date_expiration": "Inconnu"
         }
+
+
+@timed("spacy_lot")
+def extract_info_id_batch(texts: Iterable[str], docs: Optional[list] = None, batch_size: int = NLP_BATCH_SIZE,
+                          n_process: int = NLP_N_PROCESS) -> List[Tuple[Dict[str, str], object]]:
+    """
+    Version par lot de extract_info_id : un seul nlp.pipe pour tous les textes.
+    `docs` fournit les Doc déjà connus (None pour ceux à calculer).
+    Retourne [(fiche, Doc), ...] : le Doc est archivé sans être recalculé.
+    """
+    texts = list(texts)
+    docs = fill_docs([prepare_text(text)[1] for text in texts], docs, batch_size, n_process)
+    return [(extract_info_id(text, doc=doc), doc) for text, doc in zip(texts, docs)]
+
+
+def extract_info_id_image(filepath: str, text: str) -> Optional[Dict[str, str]]:
+    """
+    Chemin rapide MRZ : d'abord dans le texte OCR déjà disponible, puis par OCR
+    de la bande MRZ. Si aucune MRZ ne passe les chiffres de contrôle, mode
+    gabarit (OCR des zones de la carte redressée). None si aucun ne conclut :
+    le texte passe alors par extract_info_id (seul ou par lot).
+    """
+    if MRZ_ENABLED:
+        try:
+            result = parse_mrz(text) or read_mrz(filepath)
+            if result:
+                return result
+        except Exception as e:
+            print(f"[extract_info_id_image] MRZ illisible, repli OCR complet : {e}")
+    if ID_TEMPLATE_ENABLED:
+        try:
+            result = read_id_template(filepath)
+            if result:
+                return result
+        except Exception as e:
+            print(f"[extract_info_id_image] Gabarit non aligné, repli OCR complet : {e}")
+    return None
+
+
+def extract_info_id_file(filepath: str, text: str) -> Dict[str, str]:
+    """
+    MRZ, puis gabarit (extract_info_id_image), puis en dernier recours
+    extract_info_id (regex + spaCy sur le texte complet).
+    """
+    return extract_info_id_image(filepath, text) or extract_info_id(text)
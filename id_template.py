@@ -0,0 +1,217 @@
+import re
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from PIL import Image
+
+from ocr_utils import get_tesseract, iter_page_images
+from metrics import timed
+from config import ID_TEMPLATE_MIN_FIELDS, ID_TEMPLATE_WORKERS
+
+# Carte normalisée : format ID-1 (85,6 × 54 mm) à 300 DPI
+CARTE_LARGEUR, CARTE_HAUTEUR = 1012, 638
+RATIO_ID1 = CARTE_LARGEUR / CARTE_HAUTEUR
+
+CHIFFRES = "0123456789"
+MAJUSCULES = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# Zones des champs en fraction de la carte (x0, y0, x1, y1), mode de segmentation
+# tesseract (7 = une ligne) et liste blanche éventuelle.
+LAYOUTS = {
+    "cni_1994": {
+        "numero_carte": ((0.45, 0.09, 0.99, 0.17), 7, MAJUSCULES + CHIFFRES),
+        "nom": ((0.34, 0.19, 0.99, 0.27), 7, None),
+        "prenom": ((0.34, 0.26, 0.99, 0.34), 7, None),
+        "sexe": ((0.34, 0.33, 0.48, 0.41), 7, None),
+        "date_naissance": ((0.34, 0.40, 0.99, 0.48), 7, None),
+        "lieu_naissance": ((0.34, 0.47, 0.99, 0.55), 7, None),
+    },
+    "cni_2021": {
+        "numero_carte": ((0.62, 0.12, 0.99, 0.21), 7, MAJUSCULES + CHIFFRES),
+        "nom": ((0.33, 0.24, 0.99, 0.34), 7, None),
+        "prenom": ((0.33, 0.35, 0.99, 0.45), 7, None),
+        "sexe": ((0.33, 0.47, 0.46, 0.56), 7, None),
+        "date_naissance": ((0.62, 0.47, 0.99, 0.56), 7, None),
+        "lieu_naissance": ((0.33, 0.57, 0.99, 0.66), 7, None),
+    },
+}
+
+# Formats attendus : un champ qui ne les respecte pas est considéré comme non lu.
+# CNI 1994 : année et mois d'émission, département (2A/2B en Corse), bureau et
+# numéro d'ordre sur 6 chiffres.
+NUMERO_FORMATS = {"cni_1994": r"\b\d{2}(?:0[1-9]|1[0-2])(?:\d{2}|2[AB])\d{6}\b", "cni_2021": r"\b[A-Z0-9]{9}\b"}
+# Numéros dont la clé de contrôle n'est imprimée que dans la MRZ : faits de
+# chiffres, ils ne suffisent pas à valider la lecture sans date de naissance
+NUMERO_SANS_CLE = {"cni_1994"}
+
+
+def _as_cv(image):
+    import numpy as np
+    return np.asarray(image.convert("L"))
+
+
+def find_card(image) -> Optional[Image.Image]:
+    """
+    Détecte le rectangle de la carte (plus grand quadrilatère au bon ratio),
+    le redresse et le ramène au format normalisé. Une image déjà recadrée sur
+    la carte est simplement redimensionnée. Retourne None si l'alignement échoue.
+    """
+    import cv2
+    import numpy as np
+
+    gris = _as_cv(image)
+    hauteur, largeur = gris.shape[:2]
+    flou = cv2.GaussianBlur(gris, (5, 5), 0)
+    bords = cv2.dilate(cv2.Canny(flou, 50, 150), None, iterations=2)
+    contours, _ = cv2.findContours(bords, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        if cv2.contourArea(contour) < 0.2 * largeur * hauteur:
+            break
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(approx) != 4:
+            continue
+        coins = _order_corners(approx.reshape(4, 2).astype("float32"))
+        l_haut = np.linalg.norm(coins[1] - coins[0])
+        l_gauche = np.linalg.norm(coins[3] - coins[0])
+        if l_gauche == 0:
+            continue
+        ratio = l_haut / l_gauche
+        if ratio < 1:
+            # carte photographiée en portrait : on fait tourner les coins
+            coins = np.roll(coins, -1, axis=0)
+            ratio = 1 / ratio
+        if abs(ratio - RATIO_ID1) / RATIO_ID1 > 0.15:
+            continue
+        cible = np.array([[0, 0], [CARTE_LARGEUR - 1, 0], [CARTE_LARGEUR - 1, CARTE_HAUTEUR - 1],
+                          [0, CARTE_HAUTEUR - 1]], dtype="float32")
+        matrice = cv2.getPerspectiveTransform(coins, cible)
+        return Image.fromarray(cv2.warpPerspective(gris, matrice, (CARTE_LARGEUR, CARTE_HAUTEUR)))
+
+    # Pas de contour : l'image est peut-être déjà la carte seule (scan recadré)
+    if abs(largeur / hauteur - RATIO_ID1) / RATIO_ID1 <= 0.08:
+        return Image.fromarray(gris).resize((CARTE_LARGEUR, CARTE_HAUTEUR))
+    return None
+
+
+def _order_corners(points):
+    """
+    Ordonne 4 points : haut-gauche, haut-droit, bas-droit, bas-gauche.
+    """
+    import numpy as np
+    somme = points.sum(axis=1)
+    diff = np.diff(points, axis=1).ravel()
+    return np.array([points[np.argmin(somme)], points[np.argmin(diff)],
+                     points[np.argmax(somme)], points[np.argmax(diff)]], dtype="float32")
+
+
+def _ocr_zone(carte, zone):
+    (x0, y0, x1, y1), psm, whitelist = zone
+    crop = carte.crop((int(x0 * CARTE_LARGEUR), int(y0 * CARTE_HAUTEUR),
+                       int(x1 * CARTE_LARGEUR), int(y1 * CARTE_HAUTEUR)))
+    config = f"--psm {psm}"
+    if whitelist:
+        config += f" -c tessedit_char_whitelist={whitelist}"
+    return get_tesseract().image_to_string(crop, lang='fra', config=config).strip()
+
+
+def _sans_libelle(texte):
+    # "Nom : DUPONT" -> "DUPONT"
+    return texte.split(":", 1)[1].strip() if ":" in texte else texte.strip()
+
+
+def _date_plausible(jour, mois, annee):
+    try:
+        naissance = date(int(annee), int(mois), int(jour))
+    except ValueError:
+        return False
+    return date(1900, 1, 1) <= naissance <= date.today()
+
+
+def _verifiable(layout, champs):
+    """
+    Au moins un champ au format contrôlable (numéro, date de naissance) :
+    nom, prénom et lieu se contentent de deux lettres, que le bruit d'OCR
+    d'une carte mal redressée suffit à produire. Le numéro d'une maquette de
+    NUMERO_SANS_CLE ne compte pas : la date de naissance plausible est exigée.
+    """
+    if "date_naissance" in champs:
+        return True
+    return "numero_carte" in champs and layout not in NUMERO_SANS_CLE
+
+
+def _clean_fields(layout, bruts) -> Dict[str, str]:
+    """
+    Nettoie et valide chaque champ lu ; seuls les champs conformes sont gardés.
+    """
+    champs = {}
+    # La zone peut mordre sur le libellé : le numéro est le dernier mot au bon format
+    numeros = re.findall(NUMERO_FORMATS[layout], bruts.get("numero_carte", ""))
+    if numeros:
+        champs["numero_carte"] = numeros[-1]
+
+    nom = re.sub(r"[^A-ZÀ-ÖØ-Þ\- ]", "", _sans_libelle(bruts.get("nom", "")).upper()).strip()
+    if len(nom) >= 2:
+        champs["nom"] = nom
+
+    prenom = re.sub(r"[^A-Za-zÀ-ÖØ-öø-ÿ\-, ]", "", _sans_libelle(bruts.get("prenom", ""))).strip(" ,")
+    if len(prenom) >= 2:
+        champs["prenom"] = " ".join(p.capitalize() for p in re.split(r"[,\s]+", prenom) if p)
+
+    sexe = _sans_libelle(bruts.get("sexe", "")).upper()[:1]
+    if sexe in ("M", "F"):
+        champs["sexe"] = "Masculin" if sexe == "M" else "Féminin"
+
+    lue = re.search(r"(\d{2})[.\s/-]?(\d{2})[.\s/-]?(\d{4})", bruts.get("date_naissance", ""))
+    if lue and _date_plausible(*lue.groups()):
+        champs["date_naissance"] = "-".join(lue.groups())
+
+    lieu = re.sub(r"[^A-Za-zÀ-ÖØ-öø-ÿ0-9\-() ]", "", _sans_libelle(bruts.get("lieu_naissance", ""))).strip()
+    if len(lieu) >= 2:
+        champs["lieu_naissance"] = lieu
+    return champs
+
+
+@timed("gabarit_cni")
+def read_id_template(filepath: str) -> Optional[Dict[str, str]]:
+    """
+    Mode gabarit : carte détectée et normalisée, puis OCR de chaque zone de champ
+    (en parallèle, tesseract tournant dans ses propres processus). Les deux
+    maquettes de CNI sont essayées, la mieux lue est retenue.
+    Retourne None si l'alignement échoue, si trop peu de champs sont valides
+    ou si aucun n'est vérifiable (l'appelant repasse alors par l'OCR de la
+    carte entière).
+    """
+    _, image = next(iter_page_images(filepath, max_pages=1))
+    carte = find_card(image)
+    image.close()
+    if carte is None:
+        return None
+
+    meilleur, meilleur_layout = {}, None
+    with ThreadPoolExecutor(max_workers=ID_TEMPLATE_WORKERS) as pool:
+        for layout, zones in LAYOUTS.items():
+            noms = list(zones)
+            textes = pool.map(lambda nom: _ocr_zone(carte, zones[nom]), noms)
+            champs = _clean_fields(layout, dict(zip(noms, textes)))
+            if (_verifiable(layout, champs), len(champs)) > (_verifiable(meilleur_layout, meilleur), len(meilleur)):
+                meilleur, meilleur_layout = champs, layout
+            if len(champs) == len(zones):
+                break
+
+    if len(meilleur) < ID_TEMPLATE_MIN_FIELDS or not _verifiable(meilleur_layout, meilleur):
+        return None
+    result = {
+        "numero_carte": "Inconnu",
+        "nom": "Inconnu",
+        "prenom": "Inconnu",
+        "date_naissance": "Inconnu",
+        "lieu_naissance": "Inconnu",
+        "sexe": "Inconnu",
+        "adresse": "Inconnu",
+        "date_expiration": "Inconnu",
+        "methode": "gabarit",
+    }
+    result.update(meilleur)
+    return result
@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import threading
+import time
+
+from ocr_cache import hash_file
+from config import JOURNAL_PATH, JOURNAL_HASH, JOURNAL_MAX_ATTEMPTS, JOURNAL_RETRY_DELAY
+
+
+class ProcessedJournal:
+    """
+    Journal persistant (SQLite) des fichiers traités, indexé par chemin.
+    Un fichier est à (re)traiter s'il est nouveau, si sa taille ou sa date de
+    modification a changé, ou si son traitement a été interrompu ("en_cours") ou
+    a échoué ("erreur") moins de max_attempts fois : l'erreur peut être
+    passagère (fichier verrouillé, copie en cours), mais un fichier qui fait
+    tomber le processus (plantage de poppler, mémoire) n'est pas repris sans fin.
+    Un fichier en erreur inchangé attend retry_delay secondes entre deux essais.
+    Avec use_hash, un fichier touché mais au contenu identique n'est pas retraité.
+    """
+
+    def __init__(self, path=JOURNAL_PATH, use_hash=JOURNAL_HASH, max_attempts=JOURNAL_MAX_ATTEMPTS,
+                 retry_delay=JOURNAL_RETRY_DELAY):
+        self.use_hash = use_hash
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS fichiers (
+                chemin TEXT PRIMARY KEY,
+                taille INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256 TEXT,
+                statut TEXT NOT NULL,
+                maj REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS dossiers (
+                chemin TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL
+            );
+        """)
+        colonnes = [row[1] for row in self._conn.execute("PRAGMA table_info(fichiers)")]
+        if "essais" not in colonnes:
+            self._conn.execute("ALTER TABLE fichiers ADD COLUMN essais INTEGER NOT NULL DEFAULT 0")
+        self._conn.commit()
+
+    def needs_processing(self, chemin, taille, mtime_ns):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT taille, mtime_ns, sha256, statut, essais, maj FROM fichiers WHERE chemin = ?",
+                (chemin,)).fetchone()
+        if row is None:
+            return True
+        if (row[0], row[1]) == (taille, mtime_ns):
+            if row[3] == "erreur" and time.time() - row[5] < self.retry_delay:
+                return False    # trop tôt : reessayé à un passage suivant
+            return row[3] in ("en_cours", "erreur") and row[4] < self.max_attempts
+        if self.use_hash and row[2] and row[0] == taille and hash_file(chemin) == row[2]:
+            # Date modifiée mais contenu identique : on met seulement le journal à jour
+            with self._lock, self._conn:
+                self._conn.execute("UPDATE fichiers SET mtime_ns = ?, maj = ? WHERE chemin = ?",
+                                   (mtime_ns, time.time(), chemin))
+            return False
+        return True
+
+    def mark(self, chemin, taille, mtime_ns, statut):
+        sha256 = hash_file(chemin) if self.use_hash and statut not in ("en_cours", "erreur") else None
+        with self._lock, self._conn:
+            # Essais comptés au démarrage ("en_cours"), ou à l'erreur s'il n'y a pas
+            # eu de démarrage (mode réservation), tant que le fichier ne change pas
+            row = self._conn.execute("SELECT taille, mtime_ns, essais, statut FROM fichiers WHERE chemin = ?",
+                                     (chemin,)).fetchone()
+            meme_version = row is not None and (row[0], row[1]) == (taille, mtime_ns)
+            essais = row[2] if meme_version else 0
+            if statut == "en_cours" or (statut == "erreur" and not (meme_version and row[3] == "en_cours")):
+                essais += 1
+            elif statut != "erreur":
+                essais = 0
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fichiers (chemin, taille, mtime_ns, sha256, statut, maj, essais) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (chemin, taille, mtime_ns, sha256, statut, time.time(), essais))
+
+    def has_retryable(self, dossier):
+        """
+        Vrai si des fichiers du dossier restent à reessayer : le dossier est alors
+        relisté à chaque passage, même si sa date de modification n'a pas changé
+        (un échec ne la modifie pas).
+        """
+        prefixe = os.path.join(dossier, '')
+        with self._lock:
+            chemins = [row[0] for row in self._conn.execute(
+                "SELECT chemin FROM fichiers WHERE statut IN ('en_cours', 'erreur') AND essais < ? "
+                "AND substr(chemin, 1, ?) = ?", (self.max_attempts, len(prefixe), prefixe))]
+        return any(os.path.dirname(c) == dossier for c in chemins)
+
+    def interrupted(self):
+        """
+        Fichiers dont le traitement a été interrompu (arrêt brutal, plantage).
+        """
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT chemin FROM fichiers WHERE statut = 'en_cours' ORDER BY maj")]
+
+    def folder_changed(self, dossier, mtime_ns):
+        """
+        La date de modification d'un dossier change à chaque ajout, suppression
+        ou renommage d'une entrée : inutile de le relister sinon.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT mtime_ns FROM dossiers WHERE chemin = ?",
+                                     (dossier,)).fetchone()
+        return row is None or row[0] != mtime_ns
+
+    def set_folder(self, dossier, mtime_ns):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO dossiers (chemin, mtime_ns) VALUES (?, ?)",
+                               (dossier, mtime_ns))
+
+    def prune(self, dossier, presents):
+        """
+        Oublie les fichiers du dossier qui n'existent plus : le journal reste borné.
+        """
+        prefixe = os.path.join(dossier, '')
+        with self._lock, self._conn:
+            connus = [row[0] for row in self._conn.execute(
+                "SELECT chemin FROM fichiers WHERE substr(chemin, 1, ?) = ?", (len(prefixe), prefixe))]
+            disparus = [(c,) for c in connus if c not in presents and os.path.dirname(c) == dossier]
+            self._conn.executemany("DELETE FROM fichiers WHERE chemin = ?", disparus)
+        return len(disparus)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def scan_folder(dossier, extensions):
+    """
+    Parcours os.scandir d'un dossier : retourne {chemin: (taille, mtime_ns)}.
+    Les informations de stat viennent du scandir (pas d'appel os.stat par fichier sous Windows).
+    """
+    entrees = {}
+    with os.scandir(dossier) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.lower().endswith(extensions):
+                st = entry.stat()
+                entrees[entry.path] = (st.st_size, st.st_mtime_ns)
+    return entrees
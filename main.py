@@ -1,39 +1,508 @@
 import os
-from extract_cv import extract_info_cv
-from extract_id import extract_info_id
-from xml_utils import create_xml
-from detect_type import detect_document_type 
-from ocr_utils import ocr_file 
-from config import INPUT_FOLDER, OUTPUT_FOLDER  
+import time
+import argparse
+from functools import partial
+from multiprocessing import Pool
+from extract_cv import extract_info_cv_batch
+from extract_id import extract_info_id_image, extract_info_id_batch
+from xml_utils import write_xml, open_batch_sink
+from detect_type import detect_document_type
+from ocr_utils import (ocr_pages, ocr_page, ocr_image_files, count_pages, cached_pages, store_pages, join_pages,
+                       summarize_sources, summarize_confidence)
+from triage import preview_document, Apercu
+from dedup import find_duplicate, remember
+from archive import archive_document
+from scheduler import Scheduler
+from search_index import index_record
+import ocr_cache
+import dedup
+import metrics
+from metrics import METRICS
+from config import (INPUT_FOLDER, OUTPUT_FOLDER, TRIAGE_ENABLED, METRICS_FILE, OCR_BATCH_SIZE, OCR_MIN_CONFIDENCE,
+                    SCHEDULER_ENABLED, NLP_BATCH_SIZE, NLP_N_PROCESS)
 
 valid_extensions = ('.jpg', '.jpeg', '.png', '.pdf')
 
-for root_dir, dirs, files in os.walk(INPUT_FOLDER):
-    for filename in files:
-        if filename.lower().endswith(valid_extensions):
-            filepath = os.path.join(root_dir, filename)
-            print(f"📄 Traitement du fichier : {filepath}")
 
-            # OCR
-            text = ocr_file(filepath)
+def lister_fichiers(dossier):
+    """
+    Liste les fichiers à traiter dans un ordre stable (tri alphabétique).
+    """
+    fichiers = []
+    for root_dir, dirs, files in os.walk(dossier):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.lower().endswith(valid_extensions):
+                fichiers.append(os.path.join(root_dir, filename))
+    return fichiers
 
-            # Nettoyage basique du texte
-            text = text.replace('\n', ' ').replace('\r', ' ').strip()
 
-            # Détection du type
-            doc_type = detect_document_type(text)
+def analyser_texte(filepath, text, type_force=None, type_triage=None, ecrire_xml=True):
+    """
+    Détection du type, extraction et écriture du XML pour un texte OCR.
+    type_force impose le type ; sinon le type du tri sert de repli si le
+    texte complet n'est pas reconnu. Avec ecrire_xml=False, aucun fichier
+    n'est écrit (sortie par lot gérée par le processus principal).
+    Retourne (filepath, doc_type, chemin_xml, info).
+    """
+    return analyser_lot([(filepath, text, type_triage)], type_force, ecrire_xml, n_process=1)[0]
 
-            if doc_type == "carte_identite":
-                info = extract_info_id(text)
-                out_xml = os.path.join(OUTPUT_FOLDER, os.path.splitext(filename)[0] + '_carte.xml')
-                create_xml(info, out_xml)
-                print(f"✅ Carte d'identité analysée et enregistrée : {out_xml}")
 
-            elif doc_type == "cv":
-                info = extract_info_cv(text)
-                out_xml = os.path.join(OUTPUT_FOLDER, os.path.splitext(filename)[0] + '_cv.xml')
-                create_xml(info, out_xml)
-                print(f"✅ CV analysé et enregistré : {out_xml}")
+def analyser_lot(elements, type_force=None, ecrire_xml=True, n_process=NLP_N_PROCESS):
+    """
+    analyser_texte pour plusieurs documents [(filepath, texte, type_triage), ...] :
+    les textes qui passent par spaCy (CV, cartes sans MRZ ni gabarit lisibles)
+    sont analysés en un seul nlp.pipe par type. Un résultat par élément, dans l'ordre.
+    """
+    resultats = [None] * len(elements)
+    a_analyser = {"carte_identite": [], "cv": []}    # [(indice, filepath, texte d'extraction)]
+    for i, (filepath, text, type_triage) in enumerate(elements):
+        # Nettoyage basique du texte (le texte brut garde les lignes de la MRZ)
+        raw_text = text
+        text = text.replace('\n', ' ').replace('\r', ' ').strip()
 
+        # Détection du type
+        doc_type = type_force or detect_document_type(text) or type_triage
+
+        if doc_type == "carte_identite":
+            info = extract_info_id_image(filepath, raw_text)
+            if info:
+                resultats[i] = terminer(filepath, doc_type, raw_text, info, ecrire_xml)
             else:
-                print(f"❌ Type de document non reconnu pour : {filename}")
+                a_analyser[doc_type].append((i, filepath, raw_text))
+        elif doc_type == "cv":
+            a_analyser[doc_type].append((i, filepath, text))
+        else:
+            resultats[i] = (filepath, None, None, None)
+
+    for doc_type, extraction in (("carte_identite", extract_info_id_batch), ("cv", extract_info_cv_batch)):
+        lot = a_analyser[doc_type]
+        if not lot:
+            continue
+        fiches = extraction([texte for _, _, texte in lot], n_process=n_process)
+        for (i, filepath, texte), (info, doc) in zip(lot, fiches):
+            resultats[i] = terminer(filepath, doc_type, texte, info, ecrire_xml, doc)
+    return resultats
+
+
+def terminer(filepath, doc_type, texte_extraction, info, ecrire_xml=True, doc=None):
+    """
+    Écrit le XML et archive le document (avec le Doc spaCy de l'extraction par lot).
+    """
+    resultat = produire_resultat(filepath, doc_type, info, ecrire_xml)
+    archive_document(filepath, doc_type, texte_extraction, info, resultat[2], doc=doc)
+    return resultat
+
+
+def produire_resultat(filepath, doc_type, info, ecrire_xml=True):
+    """
+    Écrit le XML d'une extraction (sauf sortie par lot) et retourne
+    (filepath, doc_type, chemin_xml, info).
+    """
+    if not ecrire_xml:
+        return filepath, doc_type, None, info
+    suffixe = '_carte.xml' if doc_type == "carte_identite" else '_cv.xml'
+    out_xml = os.path.join(OUTPUT_FOLDER, os.path.splitext(os.path.basename(filepath))[0] + suffixe)
+    write_xml(info, out_xml, doc_type)
+    return filepath, doc_type, out_xml, info
+
+
+def afficher_resultat(resultat, sortie_lot=None):
+    filepath, doc_type, out_xml, info = resultat
+    if sortie_lot is not None and doc_type:
+        sortie_lot.append(info, doc_type, filepath)
+        out_xml = sortie_lot.fichiers[-1]
+    if doc_type:
+        # Sortie par lot : la fiche est identifiée par son fichier source
+        index_record(filepath, doc_type, info, out_xml if sortie_lot is None else None)
+    metrics.inc("carteid_documents_total", type=doc_type or "inconnu")
+    metrics.trace(fichier=filepath, type=doc_type, sortie=out_xml,
+                  methode=(info or {}).get("methode", "nlp") if doc_type else None)
+    if doc_type == "carte_identite":
+        print(f"✅ Carte d'identité analysée et enregistrée : {out_xml}")
+    elif doc_type == "cv":
+        print(f"✅ CV analysé et enregistré : {out_xml}")
+    else:
+        print(f"❌ Type de document non reconnu pour : {os.path.basename(filepath)}")
+
+
+def trier(filepath, type_force=None):
+    """
+    Apercu du tri. Son type est celui à utiliser pour la suite : le type imposé,
+    le type détecté par le tri rapide, "" si le tri est désactivé, ou None si
+    le document est écarté. Son texte (None sans tri rapide) confirme les
+    quasi-doublons.
+    """
+    if type_force:
+        return Apercu(type_force, None)
+    if not TRIAGE_ENABLED:
+        return Apercu("", None)
+    return preview_document(filepath)
+
+
+def signaler_erreur(etape, filepath, erreur):
+    """
+    Un fichier en échec (PDF corrompu, tesseract ou pdfinfo en erreur) est
+    compté et journalisé ; le reste du lot continue.
+    """
+    metrics.inc("carteid_erreurs_total", etape=etape)
+    print(f"❌ Échec ({etape}) pour {filepath} : {erreur}")
+
+
+def ocriser_fichier(filepath, type_force=None, ecrire_xml=True):
+    """
+    Tri, recherche de doublon puis OCR d'un fichier. Retourne (resultat, attente) :
+    resultat si le fichier est terminé sans extraction (écarté ou doublon),
+    sinon attente = (texte, type_triage, empreintes) pour l'extraction par lot.
+    """
+    apercu = trier(filepath, type_force)
+    if apercu.type is None:
+        return (filepath, None, None, None), None
+    empreintes, doublon = find_duplicate(filepath, type_force, apercu)
+    if doublon:
+        return produire_resultat(filepath, *doublon, ecrire_xml), None
+    pages = ocr_pages(filepath)
+    print(f"📝 Pages par source : {summarize_sources(pages)}")
+    confiances = summarize_confidence(pages)
+    if confiances:
+        print(f"🎯 Confiance OCR par page : {confiances}")
+    return None, (join_pages(filepath, pages), apercu.type or None, empreintes)
+
+
+def traiter_en_serie(fichiers, type_force=None, sortie_lot=None, planning=None, taille_lot=NLP_BATCH_SIZE):
+    """
+    Tri, doublons et OCR fichier par fichier ; l'extraction est faite par lots
+    de taille_lot textes, puis les résultats du lot sont affichés dans l'ordre.
+    """
+    resultats = []
+    en_cours = []    # [(filepath, resultat ou None si extraction en attente)]
+    attente = {}     # filepath -> (texte, type_triage, empreintes)
+
+    def vider():
+        lot = [(filepath, texte, type_triage) for filepath, (texte, type_triage, _) in attente.items()]
+        extraits = {resultat[0]: resultat
+                    for resultat in extraire_lot(lot, type_force, sortie_lot is None, NLP_N_PROCESS)}
+        for filepath, (_, _, empreintes) in attente.items():
+            remember(filepath, empreintes, extraits[filepath][1], extraits[filepath][3])
+        for filepath, resultat in en_cours:
+            resultat = resultat or extraits[filepath]
+            afficher_resultat(resultat, sortie_lot)
+            resultats.append(resultat)
+            if planning:
+                planning.done(filepath)
+        en_cours.clear()
+        attente.clear()
+
+    for filepath in fichiers:
+        print(f"📄 Traitement du fichier : {filepath}")
+        try:
+            resultat, a_extraire = ocriser_fichier(filepath, type_force, sortie_lot is None)
+        except Exception as e:
+            signaler_erreur("fichier", filepath, e)
+            resultat, a_extraire = (filepath, None, None, None), None
+        en_cours.append((filepath, resultat))
+        if a_extraire:
+            attente[filepath] = a_extraire
+            if len(attente) >= taille_lot:
+                vider()
+    vider()
+    return resultats
+
+
+# 📏 Mode comparaison : sans cache, la seconde exécution relirait la première
+_caches_actifs = True
+
+def desactiver_caches():
+    global _caches_actifs
+    _caches_actifs = False
+    ocr_cache.disable()
+    dedup.disable()    # sinon chaque fichier de la référence serait un doublon au second passage
+
+
+# ⚙️ Mode parallèle : chaque processus charge spaCy et tesseract une seule fois
+def init_worker(caches_actifs=True):
+    import ocr_utils
+    import nlp_model
+    if not caches_actifs:
+        desactiver_caches()
+    ocr_utils.warm_up()
+    nlp_model.warm_up()
+
+
+def executer_mesure(fn, *args):
+    """
+    Exécute fn dans un processus du pool et renvoie aussi ses métriques,
+    fusionnées ensuite dans le registre du processus principal.
+    """
+    return fn(*args), METRICS.drain()
+
+
+def recuperer(resultat_mesure):
+    resultat, delta = resultat_mesure
+    METRICS.merge(delta)
+    return resultat
+
+
+def preparer(filepath, type_force=None):
+    """
+    Tri rapide puis recherche de quasi-doublon (rendu basse résolution),
+    avant tout OCR complet. Retourne (type_triage, empreintes, doublon).
+    """
+    try:
+        apercu = trier(filepath, type_force)
+        if apercu.type is None:
+            return None, None, None
+        return (apercu.type,) + find_duplicate(filepath, type_force, apercu)
+    except Exception as e:
+        signaler_erreur("tri", filepath, e)
+        return None, None, None
+
+
+def extraire(filepath, text, type_force=None, type_triage=None, ecrire_xml=True):
+    """
+    analyser_texte dans un processus du pool : une erreur d'extraction ne
+    remonte pas jusqu'au lot, le fichier est compté comme non traité.
+    """
+    try:
+        return analyser_texte(filepath, text, type_force, type_triage, ecrire_xml)
+    except Exception as e:
+        signaler_erreur("extraction", filepath, e)
+        return filepath, None, None, None
+
+
+def extraire_lot(elements, type_force=None, ecrire_xml=True, n_process=1):
+    """
+    analyser_lot (dans un processus du pool, d'où n_process=1 par défaut). Si le
+    lot échoue, chaque document est repris seul : l'erreur reste celle d'un fichier.
+    """
+    try:
+        return analyser_lot(elements, type_force, ecrire_xml, n_process)
+    except Exception:
+        return [extraire(filepath, text, type_force, type_triage, ecrire_xml)
+                for filepath, text, type_triage in elements]
+
+
+def ocr_unite(unite):
+    """
+    Une unité de travail = une page de PDF, ou un lot de petites images OCRisées
+    par un seul appel tesseract. Retourne [(filepath, PageOCR), ...], avec
+    None à la place de la page si son OCR a échoué.
+    """
+    if len(unite) == 1:
+        filepath, page_number = unite[0]
+        try:
+            return [(filepath, ocr_page(filepath, page_number))]
+        except Exception as e:
+            signaler_erreur("ocr", filepath, e)
+            return [(filepath, None)]
+    filepaths = [filepath for filepath, _ in unite]
+    try:
+        return list(zip(filepaths, ocr_image_files(filepaths)))
+    except Exception:
+        # Une image illisible fait échouer tout le lot : chacune est reprise seule
+        return [paire for filepath in filepaths for paire in ocr_unite([(filepath, 1)])]
+
+
+def decouper_en_unites(fichiers, taille_lot=OCR_BATCH_SIZE):
+    unites = []
+    lot_images = []
+    for filepath in fichiers:
+        if filepath.lower().endswith('.pdf'):
+            try:
+                nb_pages = count_pages(filepath)
+            except Exception as e:
+                signaler_erreur("pages", filepath, e)
+                continue
+            for page_number in range(1, nb_pages + 1):
+                unites.append([(filepath, page_number)])
+        else:
+            lot_images.append((filepath, 1))
+            if len(lot_images) >= taille_lot:
+                unites.append(lot_images)
+                lot_images = []
+    if lot_images:
+        unites.append(lot_images)
+    return unites
+
+
+def fin_de_traitement(planning, filepaths):
+    """
+    Rappel de fin d'extraction d'un lot (thread de résultats du pool) : la latence
+    est mesurée dès que les documents sont prêts, pas au moment de l'affichage.
+    """
+    if planning is None:
+        return None
+
+    def rappel(_):
+        for filepath in filepaths:
+            planning.done(filepath)
+    return rappel
+
+
+def traiter_en_parallele(fichiers, workers, type_force=None, sortie_lot=None, planning=None):
+    with Pool(processes=workers, initializer=init_worker, initargs=(_caches_actifs,)) as pool:
+        # Tri rapide et recherche de doublons répartis sur les processus : les
+        # documents écartés ou déjà vus ne sont pas OCRisés
+        preparations = dict(zip(fichiers, map(recuperer, pool.starmap(
+            executer_mesure, [(preparer, f, type_force) for f in fichiers]))))
+        types = {f: p[0] for f, p in preparations.items()}
+        doublons = {f: p[2] for f, p in preparations.items() if p[2]}
+        retenus = [f for f in fichiers if types[f] is not None and f not in doublons]
+
+        # Les fichiers déjà présents dans le cache OCR ne sont pas redécoupés
+        textes_caches = {}
+        a_ocriser = []
+        sources = {}
+        for filepath in retenus:
+            try:
+                pages = cached_pages(filepath)
+            except OSError as e:
+                signaler_erreur("cache", filepath, e)
+                continue
+            if pages is None:
+                a_ocriser.append(filepath)
+            else:
+                textes_caches[filepath] = join_pages(filepath, pages)
+
+        unites = decouper_en_unites(a_ocriser)
+        print(f"🧵 {len(retenus)}/{len(fichiers)} fichiers retenus au tri ({len(doublons)} doublons, "
+              f"{len(textes_caches)} en cache) "
+              f"découpés en {len(unites)} unités OCR sur {workers} processus")
+
+        # Extraction par lots (un nlp.pipe par lot), assez petits pour occuper tous les processus
+        taille_lot = min(NLP_BATCH_SIZE, max(1, -(-len(retenus) // workers)))
+        extractions = {}    # filepath -> tâche de son lot
+        attente = []
+
+        def soumettre():
+            if not attente:
+                return
+            lot = list(attente)
+            attente.clear()
+            filepaths = [filepath for filepath, _, _ in lot]
+            tache = pool.apply_async(executer_mesure, (extraire_lot, lot, type_force, sortie_lot is None),
+                                     callback=fin_de_traitement(planning, filepaths))
+            for filepath in filepaths:
+                extractions[filepath] = tache
+
+        def a_extraire(filepath, text):
+            attente.append((filepath, text, types[filepath] or None))
+            if len(attente) >= taille_lot:
+                soumettre()
+
+        for filepath, text in textes_caches.items():
+            a_extraire(filepath, text)
+
+        # imap conserve l'ordre des unités : les pages d'un fichier arrivent groupées
+        pages = {}
+        echecs = set()
+        restantes = {}
+        for unite in unites:
+            for filepath, _ in unite:
+                restantes[filepath] = restantes.get(filepath, 0) + 1
+
+        termines = (paire for resultat in pool.imap(partial(executer_mesure, ocr_unite), unites)
+                    for paire in recuperer(resultat))
+        for filepath, page in termines:
+            if page is None:
+                echecs.add(filepath)
+            else:
+                pages.setdefault(filepath, []).append(page)
+            restantes[filepath] -= 1
+            if restantes[filepath] == 0:
+                pages_fichier = pages.pop(filepath, [])
+                if filepath in echecs:
+                    continue    # une page en échec : ni cache ni extraction d'un texte incomplet
+                # Toutes les pages sont là : cache puis extraction dans le pool
+                for source, nb in summarize_sources(pages_fichier).items():
+                    sources[source] = sources.get(source, 0) + nb
+                faibles = {n: c for n, c in summarize_confidence(pages_fichier).items() if c < OCR_MIN_CONFIDENCE}
+                if faibles:
+                    print(f"🎯 {filepath} : pages peu sûres malgré les reprises {faibles}")
+                store_pages(filepath, pages_fichier)
+                a_extraire(filepath, join_pages(filepath, pages_fichier))
+        soumettre()
+
+        resultats = []
+        lots = {}    # tâche -> {filepath: résultat}, métriques fusionnées une fois par lot
+        for filepath in fichiers:
+            if filepath in doublons:
+                resultat = produire_resultat(filepath, *doublons[filepath], sortie_lot is None)
+            elif filepath in extractions:
+                tache = extractions[filepath]
+                if tache not in lots:
+                    lots[tache] = {r[0]: r for r in recuperer(tache.get())}
+                resultat = lots[tache][filepath]
+                remember(filepath, preparations[filepath][1], resultat[1], resultat[3])
+            else:
+                resultat = (filepath, None, None, None)
+            afficher_resultat(resultat, sortie_lot)
+            resultats.append(resultat)
+            if planning:
+                planning.done(filepath)   # sans effet si déjà compté à la fin de l'extraction
+    print(f"📝 Pages OCRisées par source : {sources}")
+    return resultats
+
+
+def executer(fichiers, workers, type_force=None, sortie_lot=None, racine=None):
+    debut = time.perf_counter()
+    planning = None
+    if SCHEDULER_ENABLED:
+        # Les cartes d'identité ne patientent pas derrière les longs CV
+        planning = Scheduler()
+        fichiers = planning.plan(fichiers, type_force, racine)
+    if workers <= 1:
+        resultats = traiter_en_serie(fichiers, type_force, sortie_lot, planning)
+    else:
+        resultats = traiter_en_parallele(fichiers, workers, type_force, sortie_lot, planning)
+    if planning:
+        planning.print_report()
+    duree = time.perf_counter() - debut
+    debit = len(fichiers) / duree if duree > 0 else 0.0
+    print(f"⏱️ {len(fichiers)} fichiers en {duree:.1f} s ({debit:.2f} fichiers/s, {max(workers, 1)} worker(s))")
+    return resultats, debit
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Traitement par lot des cartes d'identité et CV.")
+    parser.add_argument("--input", default=INPUT_FOLDER, help="Dossier à parcourir")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Nombre de processus (1 = traitement en série)")
+    parser.add_argument("--comparer", action="store_true",
+                        help="Exécute aussi le chemin série et affiche le gain")
+    parser.add_argument("--type", choices=["carte_identite", "cv"], default=None,
+                        help="Impose le type de document (pas de tri ni de détection)")
+    parser.add_argument("--sortie-lot", choices=["xml", "jsonl"], default=None,
+                        help="Regroupe les enregistrements dans des fichiers tournants au lieu d'un XML par document")
+    args = parser.parse_args()
+    if args.comparer and args.sortie_lot:
+        # Les deux exécutions écriraient chaque enregistrement deux fois dans les fichiers tournants
+        parser.error("--sortie-lot ne peut pas être combiné avec --comparer")
+
+    metrics.start_exporters()
+    fichiers = lister_fichiers(args.input)
+    sortie_lot = open_batch_sink(args.sortie_lot, OUTPUT_FOLDER) if args.sortie_lot else None
+
+    if args.comparer and args.workers > 1:
+        # Les deux exécutions partent à froid : la référence série ne doit pas
+        # remplir le cache OCR ni l'index des doublons relus ensuite par le
+        # traitement parallèle
+        desactiver_caches()
+        print("📏 Référence : traitement en série")
+        _, debit_serie = executer(fichiers, 1, args.type, sortie_lot, args.input)
+        print(f"📏 Traitement parallèle ({args.workers} workers)")
+        _, debit_parallele = executer(fichiers, args.workers, args.type, sortie_lot, args.input)
+        if debit_serie > 0:
+            print(f"🚀 Accélération : x{debit_parallele / debit_serie:.2f}")
+    else:
+        executer(fichiers, args.workers, args.type, sortie_lot, args.input)
+
+    if sortie_lot is not None:
+        sortie_lot.close()
+        print(f"🧾 Sorties par lot : {', '.join(sortie_lot.fichiers)}")
+    if METRICS_FILE:
+        metrics.write_metrics_file(METRICS_FILE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import METRICS_PORT, METRICS_FILE, METRICS_FILE_INTERVAL, METRICS_TRACE_PATH
+
+# Bornes des histogrammes de durée (secondes)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+DESCRIPTIONS = {
+    "carteid_stage_seconds": "Durée de chaque étape du pipeline",
+    "carteid_pages_total": "Pages traitées par source (texte, ocr)",
+    "carteid_cache_ocr_total": "Consultations du cache OCR",
+    "carteid_ocr_reprises_total": "Pages reprises par l'OCR adaptatif, par palier",
+    "carteid_documents_total": "Documents traités par type",
+    "carteid_erreurs_total": "Erreurs par étape",
+    "carteid_doublons_total": "Recherches de quasi-doublons (nouveau, reutilise)",
+    "carteid_http_requetes_total": "Requêtes du service HTTP par statut",
+    "carteid_latence_seconds": "Latence de bout en bout par classe de document (ordonnanceur)",
+    "carteid_slo_depassements_total": "Documents traités au-delà de l'objectif de latence de leur classe",
+}
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Metrics:
+    """
+    Registre de métriques en mémoire : compteurs et histogrammes étiquetés.
+    Un verrou et quelques opérations de dictionnaire par mesure : le coût
+    reste de l'ordre de la microseconde, on peut le laisser actif en permanence.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}     # (nom, labels) -> valeur
+        self._histograms = {}   # (nom, labels) -> [compte par borne..., somme, total]
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * (len(BUCKETS) + 2)
+            for i, borne in enumerate(BUCKETS):
+                if value <= borne:
+                    hist[i] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        debut = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("carteid_stage_seconds", time.perf_counter() - debut, stage=stage, **labels)
+
+    def drain(self):
+        """
+        Retourne le contenu du registre puis le vide (remontée depuis un processus fils).
+        """
+        with self._lock:
+            delta = (self._counters, self._histograms)
+            self._counters, self._histograms = {}, {}
+        return delta
+
+    def merge(self, delta):
+        counters, histograms = delta
+        with self._lock:
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, values in histograms.items():
+                hist = self._histograms.setdefault(key, [0] * (len(BUCKETS) + 2))
+                for i, value in enumerate(values):
+                    hist[i] += value
+
+    def render_prometheus(self):
+        """
+        Format texte d'exposition Prometheus.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+
+        lignes = []
+        for name in sorted({n for n, _ in counters}):
+            lignes.append(f"# HELP {name} {DESCRIPTIONS.get(name, name)}")
+            lignes.append(f"# TYPE {name} counter")
+            for (n, key), value in sorted(counters.items()):
+                if n == name:
+                    lignes.append(f"{name}{_format_labels(key)} {value}")
+        for name in sorted({n for n, _ in histograms}):
+            lignes.append(f"# HELP {name} {DESCRIPTIONS.get(name, name)}")
+            lignes.append(f"# TYPE {name} histogram")
+            for (n, key), hist in sorted(histograms.items()):
+                if n != name:
+                    continue
+                for i, borne in enumerate(BUCKETS):
+                    lignes.append(f"{name}_bucket{_format_labels(key, [('le', borne)])} {hist[i]}")
+                lignes.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {hist[-1]}")
+                lignes.append(f"{name}_sum{_format_labels(key)} {round(hist[-2], 6)}")
+                lignes.append(f"{name}_count{_format_labels(key)} {hist[-1]}")
+        return "\n".join(lignes) + "\n"
+
+
+# Registre partagé par tout le processus
+METRICS = Metrics()
+
+inc = METRICS.inc
+observe = METRICS.observe
+timer = METRICS.timer
+
+
+def timed(stage):
+    """
+    Décorateur : mesure la durée de la fonction dans carteid_stage_seconds{stage=...}.
+    """
+    def decorateur(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with METRICS.timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorateur
+
+
+_trace_lock = threading.Lock()
+
+def trace(**record):
+    """
+    Enregistrement par document (JSON Lines) si METRICS_TRACE_PATH est configuré.
+    """
+    if not METRICS_TRACE_PATH:
+        return
+    record.setdefault("horodatage", time.strftime("%Y-%m-%dT%H:%M:%S"))
+    ligne = json.dumps(record, ensure_ascii=False) + "\n"
+    with _trace_lock:
+        with open(METRICS_TRACE_PATH, "a", encoding="utf-8") as f:
+            f.write(ligne)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        corps = METRICS.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def log_message(self, *args):
+        pass  # pas de log par requête de scraping
+
+
+def start_http_server(port, host="127.0.0.1"):
+    serveur = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=serveur.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"📈 Métriques exposées sur http://{host}:{port}/metrics")
+    return serveur
+
+
+def write_metrics_file(path):
+    # Écriture atomique : un lecteur ne voit jamais un fichier à moitié écrit
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(METRICS.render_prometheus())
+    os.replace(tmp, path)
+
+
+def start_file_writer(path, interval=METRICS_FILE_INTERVAL):
+    def boucle():
+        while True:
+            time.sleep(interval)
+            try:
+                write_metrics_file(path)
+            except OSError as e:
+                print(f"📈 Écriture des métriques impossible : {e}")
+    threading.Thread(target=boucle, name="metrics-file", daemon=True).start()
+    print(f"📈 Métriques écrites toutes les {interval} s dans {path}")
+
+
+def start_exporters():
+    """
+    Démarre les exports configurés (port HTTP local et/ou fichier périodique).
+    """
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+    if METRICS_FILE:
+        start_file_writer(METRICS_FILE)
@@ -0,0 +1,173 @@
+import re
+from datetime import date
+from typing import Dict, List, Optional
+
+from ocr_utils import get_tesseract, iter_page_images
+from metrics import timed
+from config import MRZ_BAND, MRZ_MAX_PAGES, MRZ_LANG
+
+MRZ_WHITELIST = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<"
+MRZ_TESSERACT_CONFIG = f"--psm 6 -c tessedit_char_whitelist={MRZ_WHITELIST}"
+
+# Confusions OCR classiques dans les champs numériques de la MRZ
+DIGIT_FIXES = str.maketrans({"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1",
+                             "Z": "2", "S": "5", "B": "8", "G": "6"})
+
+
+def check_digit(data: str) -> str:
+    """
+    Chiffre de contrôle ICAO 9303 (pondération 7-3-1).
+    """
+    total = 0
+    for i, c in enumerate(data):
+        if c.isdigit():
+            value = int(c)
+        elif c.isalpha():
+            value = ord(c) - ord('A') + 10
+        else:  # '<'
+            value = 0
+        total += value * (7, 3, 1)[i % 3]
+    return str(total % 10)
+
+
+def _digits(field: str) -> str:
+    return field.translate(DIGIT_FIXES)
+
+
+def _format_date(yymmdd: str, futur: bool = False) -> str:
+    """
+    AAMMJJ -> JJ-MM-AAAA (même format que extract_info_id).
+    Le siècle est déduit : une date de naissance n'est jamais dans le futur.
+    """
+    yy, mm, dd = int(yymmdd[:2]), yymmdd[2:4], yymmdd[4:6]
+    siecle = 2000 if futur or yy <= date.today().year % 100 else 1900
+    return f"{dd}-{mm}-{siecle + yy}"
+
+
+def _names(field: str) -> str:
+    return " ".join(part for part in field.replace("<<", "<").split("<") if part)
+
+
+def _sexe(c: str) -> str:
+    return {"M": "Masculin", "F": "Féminin"}.get(c, "Inconnu")
+
+
+def _result(**fields) -> Dict[str, str]:
+    result = {
+        "numero_carte": "Inconnu",
+        "nom": "Inconnu",
+        "prenom": "Inconnu",
+        "date_naissance": "Inconnu",
+        "lieu_naissance": "Inconnu",
+        "sexe": "Inconnu",
+        "adresse": "Inconnu",
+        "date_expiration": "Inconnu",
+        "methode": "mrz",
+    }
+    result.update({k: v for k, v in fields.items() if v})
+    return result
+
+
+def parse_cni_1994(l1: str, l2: str) -> Optional[Dict[str, str]]:
+    """
+    Ancienne CNI française : 2 lignes de 36 caractères.
+    l1 = IDFRA + nom (25) + code département/bureau (6)
+    l2 = numéro (12) + contrôle + prénoms (14) + naissance (6) + contrôle + sexe + contrôle global
+    """
+    if len(l1) != 36 or len(l2) != 36 or not l1.startswith("IDFRA"):
+        return None
+    # Numéro alphanumérique (département 2A / 2B) : lu tel quel, seuls les
+    # chiffres de contrôle et la date sont corrigés
+    numero = l2[0:12]
+    naissance = _digits(l2[27:33])
+    l2 = numero + _digits(l2[12]) + l2[13:27] + naissance + _digits(l2[33]) + l2[34] + _digits(l2[35])
+    if check_digit(numero) != l2[12] or check_digit(naissance) != l2[33]:
+        return None
+    if check_digit(l1 + l2[:35]) != l2[35]:
+        return None
+    prenoms = [p for p in l2[13:27].split("<<") if p.strip("<")]
+    return _result(
+        numero_carte=numero,
+        nom=_names(l1[5:30]),
+        prenom=" ".join(p.replace("<", " ").strip().capitalize() for p in prenoms),
+        date_naissance=_format_date(naissance),
+        sexe=_sexe(l2[34]),
+    )
+
+
+def parse_td1(l1: str, l2: str, l3: str) -> Optional[Dict[str, str]]:
+    """
+    Nouvelle CNI (2021) au format ICAO TD1 : 3 lignes de 30 caractères.
+    """
+    if len(l1) != 30 or len(l2) != 30 or len(l3) != 30 or l1[0] != "I":
+        return None
+    numero = l1[5:14]
+    naissance = _digits(l2[0:6])
+    expiration = _digits(l2[8:14])
+    l2 = naissance + _digits(l2[6]) + l2[7] + expiration + _digits(l2[14]) + l2[15:29] + _digits(l2[29])
+    if check_digit(numero) != _digits(l1[14]):
+        return None
+    if check_digit(naissance) != l2[6] or check_digit(expiration) != l2[14]:
+        return None
+    composite = l1[5:30] + l2[0:7] + l2[8:15] + l2[18:29]
+    if check_digit(composite) != l2[29]:
+        return None
+    nom, _, prenoms = l3.partition("<<")
+    return _result(
+        numero_carte=numero.replace("<", ""),
+        nom=_names(nom),
+        prenom=" ".join(p.capitalize() for p in _names(prenoms).split()),
+        date_naissance=_format_date(naissance),
+        sexe=_sexe(l2[7]),
+        date_expiration=_format_date(expiration, futur=True),
+    )
+
+
+def candidate_lines(text: str) -> List[str]:
+    """
+    Lignes qui ressemblent à de la MRZ : majuscules, chiffres et '<' uniquement.
+    """
+    lines = []
+    for line in text.upper().splitlines():
+        line = re.sub(r"\s+", "", line).replace("«", "<")
+        if len(line) >= 28 and re.fullmatch(r"[A-Z0-9<]+", line) and "<" in line:
+            lines.append(line)
+    return lines
+
+
+def parse_mrz(text: str) -> Optional[Dict[str, str]]:
+    """
+    Cherche une MRZ valide (chiffres de contrôle corrects) dans un texte OCR.
+    Retourne le dictionnaire de extract_info_id, ou None.
+    """
+    if not text:
+        return None
+    lines = candidate_lines(text)
+    for i in range(len(lines)):
+        if i + 2 < len(lines):
+            result = parse_td1(*(line[:30].ljust(30, "<") for line in lines[i:i + 3]))
+            if result:
+                return result
+        if i + 1 < len(lines):
+            result = parse_cni_1994(*(line[:36].ljust(36, "<") for line in lines[i:i + 2]))
+            if result:
+                return result
+    return None
+
+
+@timed("mrz")
+def read_mrz(filepath: str) -> Optional[Dict[str, str]]:
+    """
+    OCR de la bande basse de chaque page (recto puis verso) avec un jeu de
+    caractères restreint, puis validation de la MRZ.
+    """
+    tesseract = get_tesseract()
+    for _, image in iter_page_images(filepath, max_pages=MRZ_MAX_PAGES):
+        largeur, hauteur = image.size
+        bande = image.crop((0, int(hauteur * (1 - MRZ_BAND)), largeur, hauteur)).convert("L")
+        image.close()
+        texte = tesseract.image_to_string(bande, lang=MRZ_LANG, config=MRZ_TESSERACT_CONFIG)
+        result = parse_mrz(texte)
+        if result:
+            return result
+    return None
@@ -1,6 +1,7 @@
-import spacy
-from spacy.pipeline import EntityRuler
 import re
+from functools import lru_cache
+from config import NLP_BATCH_SIZE, NLP_N_PROCESS
+from metrics import timed
 
 def clean_text(text: str) -> str:
     if not text:
@@ -34,8 +35,56 @@ _nlp = None
 def get_nlp():
     global _nlp
     if _nlp is None:
+        import spacy  # import paresseux : plusieurs secondes au premier appel
         _nlp = spacy.load("fr_core_news_md") 
         create_entity_ruler(_nlp)
     return _nlp
 
-nlp = get_nlp()
+def ner_components(nlp):
+    """
+    Composants nécessaires aux entités : ner, entity_ruler et le tok2vec
+    éventuellement partagé avec ner. Tout le reste peut être désactivé.
+    """
+    needed = {"ner", "entity_ruler"}
+    for name, proc in nlp.pipeline:
+        if "ner" in getattr(proc, "listening_components", []):
+            needed.add(name)
+    return needed
+
+def pipe_ner(texts, batch_size=NLP_BATCH_SIZE, n_process=NLP_N_PROCESS):
+    """
+    Analyse un lot de textes avec nlp.pipe en ne gardant que la reconnaissance
+    d'entités (parser, lemmatizer, morphologizer... désactivés).
+    Retourne un générateur de Doc dans l'ordre des textes.
+    """
+    nlp = get_nlp()
+    disable = [name for name in nlp.pipe_names if name not in ner_components(nlp)]
+    return nlp.pipe(texts, batch_size=batch_size, n_process=n_process, disable=disable)
+
+def fill_docs(texts, docs=None, batch_size=NLP_BATCH_SIZE, n_process=NLP_N_PROCESS):
+    """
+    Complète une liste de Doc alignée sur `texts` : les Doc déjà fournis (archive)
+    sont gardés, les manquants (None) sont calculés en un seul nlp.pipe.
+    """
+    docs = list(docs) if docs is not None else [None] * len(texts)
+    manquants = [i for i, doc in enumerate(docs) if doc is None]
+    if manquants:
+        calcules = pipe_ner((texts[i] for i in manquants), batch_size=batch_size, n_process=n_process)
+        for i, doc in zip(manquants, calcules):
+            docs[i] = doc
+    return docs
+
+@timed("spacy")
+@lru_cache(maxsize=4)
+def ner_doc(text):
+    """
+    Doc d'un seul texte avec le pipeline réduit aux entités. Les derniers Doc
+    sont gardés : l'archivage récupère celui de l'extraction sans recalcul.
+    """
+    return next(iter(pipe_ner([text], batch_size=1, n_process=1)))
+
+def warm_up():
+    """
+    Charge le modèle et exécute un premier passage (utile pour les watchers).
+    """
+    ner_doc("Jean Dupont habite à Paris.")
@@ -0,0 +1,182 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import inc
+from config import OCR_CACHE_PATH, OCR_CACHE_MAX_BYTES, OCR_CACHE_ENABLED
+
+
+# Empreintes déjà calculées, par (chemin, taille, date de modification) : le
+# tri, l'OCR, le cache et l'archive d'un même fichier ne le relisent qu'une fois
+_empreintes = OrderedDict()
+_empreintes_lock = threading.Lock()
+_EMPREINTES_MAX = 1024
+
+
+def hash_file(filepath, chunk_size=1024 * 1024):
+    """
+    Empreinte SHA-256 du contenu du fichier (lecture par blocs).
+    """
+    st = os.stat(filepath)
+    cle = (os.path.abspath(filepath), st.st_size, st.st_mtime_ns)
+    with _empreintes_lock:
+        if cle in _empreintes:
+            _empreintes.move_to_end(cle)
+            return _empreintes[cle]
+    h = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    with _empreintes_lock:
+        _empreintes[cle] = h.hexdigest()
+        if len(_empreintes) > _EMPREINTES_MAX:
+            _empreintes.popitem(last=False)
+    return h.hexdigest()
+
+
+class OCRCache:
+    """
+    Cache persistant (SQLite) des textes OCR page par page.
+    La clé combine le hash du contenu et les paramètres OCR (langue, DPI,
+    version de tesseract...) : un fichier renommé ou déplacé reste un hit.
+    Éviction LRU dès que la taille totale des textes dépasse max_bytes.
+    """
+
+    def __init__(self, path=OCR_CACHE_PATH, max_bytes=OCR_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                cle TEXT PRIMARY KEY,
+                taille INTEGER NOT NULL,
+                dernier_acces REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                cle TEXT NOT NULL,
+                numero INTEGER NOT NULL,
+                texte TEXT NOT NULL,
+                source TEXT NOT NULL DEFAULT 'ocr',
+                confiance REAL,
+                PRIMARY KEY (cle, numero)
+            );
+            CREATE TABLE IF NOT EXISTS stats (
+                nom TEXT PRIMARY KEY,
+                valeur INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_acces ON entries (dernier_acces);
+        """)
+        colonnes = [row[1] for row in self._conn.execute("PRAGMA table_info(pages)")]
+        if "source" not in colonnes:
+            self._conn.execute("ALTER TABLE pages ADD COLUMN source TEXT NOT NULL DEFAULT 'ocr'")
+        if "confiance" not in colonnes:
+            self._conn.execute("ALTER TABLE pages ADD COLUMN confiance REAL")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(filepath, **params):
+        parts = [hash_file(filepath)]
+        parts += [f"{k}={params[k]}" for k in sorted(params)]
+        return hashlib.sha256("|".join(parts).encode('utf-8')).hexdigest()
+
+    def _incr(self, nom):
+        self._conn.execute(
+            "INSERT INTO stats (nom, valeur) VALUES (?, 1) "
+            "ON CONFLICT(nom) DO UPDATE SET valeur = valeur + 1", (nom,))
+
+    def get(self, cle, compter=True):
+        """
+        Retourne la liste [(numero, texte, source, confiance), ...] ou None si absent.
+        Avec compter=False, la consultation n'entre pas dans les statistiques
+        (le même document est consulté de nouveau juste après).
+        """
+        with self._lock, self._conn:
+            found = self._conn.execute("SELECT 1 FROM entries WHERE cle = ?", (cle,)).fetchone()
+            if compter:
+                self._incr("hits" if found else "misses")
+                inc("carteid_cache_ocr_total", resultat="hit" if found else "miss")
+            if not found:
+                return None
+            self._conn.execute("UPDATE entries SET dernier_acces = ? WHERE cle = ?", (time.time(), cle))
+            return self._conn.execute(
+                "SELECT numero, texte, source, confiance FROM pages WHERE cle = ? ORDER BY numero", (cle,)).fetchall()
+
+    def put(self, cle, pages):
+        taille = sum(len(page[1].encode('utf-8')) for page in pages)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages WHERE cle = ?", (cle,))
+            self._conn.executemany(
+                "INSERT INTO pages (cle, numero, texte, source, confiance) VALUES (?, ?, ?, ?, ?)",
+                [(cle, numero, texte, source, confiance) for numero, texte, source, confiance in pages])
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (cle, taille, dernier_acces) VALUES (?, ?, ?)",
+                (cle, taille, time.time()))
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(taille), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for cle, taille in self._conn.execute(
+                "SELECT cle, taille FROM entries ORDER BY dernier_acces").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM pages WHERE cle = ?", (cle,))
+            self._conn.execute("DELETE FROM entries WHERE cle = ?", (cle,))
+            self._incr("evictions")
+            total -= taille
+
+    def stats(self):
+        with self._lock:
+            result = dict(self._conn.execute("SELECT nom, valeur FROM stats").fetchall())
+            nb, taille = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(taille), 0) FROM entries").fetchone()
+        result.setdefault("hits", 0)
+        result.setdefault("misses", 0)
+        result["documents"] = nb
+        result["octets"] = taille
+        total = result["hits"] + result["misses"]
+        result["taux_hit"] = round(result["hits"] / total, 3) if total else 0.0
+        return result
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_desactive = False
+
+def disable():
+    """
+    Désactive le cache pour la suite du processus (mesures de débit).
+    """
+    global _desactive
+    _desactive = True
+
+
+def get_cache():
+    """
+    Cache partagé du processus (None si désactivé dans config ou par disable()).
+    """
+    global _cache
+    if not OCR_CACHE_ENABLED or _desactive:
+        return None
+    if _cache is None:
+        os.makedirs(os.path.dirname(OCR_CACHE_PATH) or '.', exist_ok=True)
+        _cache = OCRCache()
+    return _cache
+
+
+if __name__ == "__main__":
+    cache = get_cache()
+    if cache is None:
+        print("Cache OCR désactivé.")
+    else:
+        for nom, valeur in sorted(cache.stats().items()):
+            print(f"{nom} : {valeur}")
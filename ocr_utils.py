@@ -1,20 +1,440 @@
 import os
+import subprocess
+import tempfile
+from collections import namedtuple
+from functools import lru_cache
 from PIL import Image
-from pdf2image import convert_from_path
-import pytesseract
-from config import POPPLER_PATH
+from config import (TESSERACT_CMD, POPPLER_PATH, OCR_DPI, OCR_MAX_PAGES, TEXT_LAYER_ENABLED,
+                    TEXT_LAYER_MIN_CHARS, OCR_ENGINE, OCR_BATCH_SIZE, OCR_ADAPTIVE,
+                    OCR_MIN_CONFIDENCE, OCR_TIERS, PREPROCESS)
+from ocr_cache import get_cache
+from metrics import timed, timer, inc
+from preprocess import preprocess, config_signature
 
-def ocr_file(filepath):
+_pytesseract = None
+
+def get_tesseract():
+    """
+    Import paresseux de pytesseract, configuré au premier appel.
+    """
+    global _pytesseract
+    if _pytesseract is None:
+        import pytesseract
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+        _pytesseract = pytesseract
+    return _pytesseract
+
+def warm_up():
+    """
+    Charge pytesseract, pdf2image et vérifie tesseract avant le premier fichier.
+    """
+    import pdf2image  # noqa: F401
+    tesseract_version()
+
+# Résultat d'une page (numérotée à partir de 1).
+# source : "texte" = couche texte du PDF, "ocr" = tesseract
+# confiance : moyenne des confiances des mots (0-100), None hors OCR adaptatif
+PageOCR = namedtuple("PageOCR", ["numero", "texte", "source", "confiance"], defaults=["ocr", None])
+
+def count_pages(filepath):
+    """
+    Retourne le nombre de pages d'un PDF (1 pour une image), sans rien rasteriser.
+    Un seul pdfinfo par version du fichier (déduplication, découpage, OCR).
+    """
+    if os.path.splitext(filepath)[1].lower() != '.pdf':
+        return 1
+    st = os.stat(filepath)
+    return _count_pages(os.path.abspath(filepath), st.st_size, st.st_mtime_ns)
+
+@lru_cache(maxsize=1024)
+def _count_pages(chemin, taille, mtime_ns):
+    from pdf2image import pdfinfo_from_path
+    return int(pdfinfo_from_path(chemin, poppler_path=POPPLER_PATH)["Pages"])
+
+@timed("rendu_pdf")
+def render_page(filepath, page_number, dpi=OCR_DPI):
+    """
+    Rend une seule page d'un PDF en image PIL (plage de pages poppler).
+    """
+    from pdf2image import convert_from_path
+    pages = convert_from_path(filepath, dpi=dpi, poppler_path=POPPLER_PATH,
+                              first_page=page_number, last_page=page_number)
+    return pages[0]
+
+def iter_page_images(filepath, dpi=OCR_DPI, max_pages=OCR_MAX_PAGES):
+    """
+    Générateur (numero, image) : une seule page est en mémoire à la fois.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext != '.pdf':
+        yield 1, Image.open(filepath)
+        return
+
+    nb_pages = count_pages(filepath)
+    if max_pages is not None:
+        nb_pages = min(nb_pages, max_pages)
+    for page_number in range(1, nb_pages + 1):
+        yield page_number, render_page(filepath, page_number, dpi=dpi)
+
+@timed("couche_texte")
+def extract_text_layer(filepath, first_page=1, last_page=None):
+    """
+    Texte embarqué du PDF via pdftotext (poppler), une entrée par page.
+    Retourne [] si pdftotext échoue (PDF protégé, binaire absent...).
+    """
+    exe = os.path.join(POPPLER_PATH, 'pdftotext') if POPPLER_PATH else 'pdftotext'
+    cmd = [exe, '-enc', 'UTF-8', '-f', str(first_page)]
+    if last_page is not None:
+        cmd += ['-l', str(last_page)]
+    cmd += [filepath, '-']
+    try:
+        out = subprocess.run(cmd, capture_output=True, check=True, timeout=60).stdout
+    except (OSError, subprocess.SubprocessError):
+        return []
+    # pdftotext termine chaque page par un saut de page (\f)
+    pages = out.decode('utf-8', errors='replace').split('\f')
+    if pages and pages[-1].strip() == "":
+        pages.pop()
+    return pages
+
+def has_usable_text(texte):
+    """
+    Une couche texte est exploitable si elle contient assez de caractères utiles
+    (les scans ne contiennent au mieux que quelques caractères parasites).
+    """
+    return sum(1 for c in texte if c.isalnum()) >= TEXT_LAYER_MIN_CHARS
+
+def parse_tsv(tsv):
+    """
+    Texte et confiance par page depuis la sortie TSV de tesseract (image_to_data).
+    Retourne {page_num: (texte, confiance)} ; la confiance est la moyenne de
+    celles des mots (0-100), None pour une page où aucun mot n'a été reconnu.
+    """
+    mots = {}
+    for ligne in tsv.splitlines():
+        champs = ligne.split('\t')
+        if len(champs) < 11 or not champs[0].isdigit():
+            continue   # en-tête
+        page = mots.setdefault(int(champs[1]), [])
+        texte = champs[11] if len(champs) > 11 else ''
+        if champs[0] == '5' and texte.strip():
+            # (bloc, paragraphe, ligne), mot, confiance
+            page.append(((champs[2], champs[3], champs[4]), texte, float(champs[10])))
+
+    pages = {}
+    for numero, mots_page in mots.items():
+        lignes = []
+        precedente = None
+        for position, texte, _ in mots_page:
+            if position == precedente:
+                lignes[-1] += " " + texte
+                continue
+            if precedente is not None and position[:2] != precedente[:2]:
+                lignes.append("")   # nouveau paragraphe, comme image_to_string
+            lignes.append(texte)
+            precedente = position
+        confiances = [c for _, _, c in mots_page if c >= 0]
+        confiance = sum(confiances) / len(confiances) if confiances else None
+        pages[numero] = ("\n".join(lignes) + "\n" if lignes else "", confiance)
+    return pages
+
+# 🔧 Moteurs OCR : même interface, ocr_batch(images) -> un texte par image, dans l'ordre,
+# ocr_batch_data(images) -> un (texte, confiance) par image
+
+class PytesseractEngine:
+    """
+    Un processus tesseract par image (chemin historique, toujours disponible).
+    """
+    name = "pytesseract"
+
+    def ocr_batch(self, images, lang='fra'):
+        return [get_tesseract().image_to_string(image, lang=lang) for image in images]
+
+    def ocr_batch_data(self, images, lang='fra', psm=None):
+        config = f"--psm {psm}" if psm else ""
+        return [parse_tsv(get_tesseract().image_to_data(image, lang=lang, config=config)).get(1, ("", None))
+                for image in images]
+
+
+class BatchTesseractEngine:
+    """
+    Un seul processus tesseract pour une liste d'images : le binaire et le
+    traineddata ne sont chargés qu'une fois par lot. tesseract termine chaque
+    page par un saut de page (form feed), ce qui permet de retrouver le texte de chaque image.
+    En cas d'écart ou d'erreur, repli sur PytesseractEngine.
+    """
+    name = "lot"
+
+    def __init__(self):
+        self._fallback = PytesseractEngine()
+
+    @staticmethod
+    def _executer(images, lang, options=()):
+        """
+        Lance tesseract sur la liste des images. Retourne la sortie décodée, ou None en cas d'échec.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            chemins = []
+            for i, image in enumerate(images):
+                chemin = os.path.join(tmp, f"{i:05d}.bmp")   # BMP : pas de compression à payer
+                image.save(chemin)
+                chemins.append(chemin)
+            liste = os.path.join(tmp, "liste.txt")
+            with open(liste, 'w', encoding='utf-8') as f:
+                f.write("\n".join(chemins) + "\n")
+            cmd = [get_tesseract().pytesseract.tesseract_cmd, liste, "stdout", "-l", lang, *options]
+            try:
+                sortie = subprocess.run(cmd, capture_output=True, check=True, timeout=60 * len(images)).stdout
+            except (OSError, subprocess.SubprocessError) as e:
+                print(f"[ocr] Lot tesseract en échec ({e}), repli image par image")
+                return None
+        return sortie.decode('utf-8', errors='replace')
+
+    def ocr_batch(self, images, lang='fra'):
+        if len(images) <= 1:
+            return self._fallback.ocr_batch(images, lang)
+        sortie = self._executer(images, lang)
+        if sortie is None:
+            return self._fallback.ocr_batch(images, lang)
+        textes = sortie.split('\f')
+        if textes and textes[-1].strip() == "":
+            textes.pop()
+        if len(textes) != len(images):
+            print(f"[ocr] {len(textes)} pages lues pour {len(images)} images, repli image par image")
+            return self._fallback.ocr_batch(images, lang)
+        return textes
+
+    def ocr_batch_data(self, images, lang='fra', psm=None):
+        if len(images) <= 1:
+            return self._fallback.ocr_batch_data(images, lang, psm)
+        options = ["--psm", str(psm)] if psm else []
+        sortie = self._executer(images, lang, options + ["tsv"])
+        if sortie is None:
+            return self._fallback.ocr_batch_data(images, lang, psm)
+        # En TSV, page_num est le rang de l'image dans la liste
+        pages = parse_tsv(sortie)
+        if set(pages) != set(range(1, len(images) + 1)):
+            print(f"[ocr] {len(pages)} pages lues pour {len(images)} images, repli image par image")
+            return self._fallback.ocr_batch_data(images, lang, psm)
+        return [pages[i] for i in range(1, len(images) + 1)]
+
+
+ENGINES = {"pytesseract": PytesseractEngine, "lot": BatchTesseractEngine}
+_engine = None
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = ENGINES[OCR_ENGINE]()
+    return _engine
+
+# Rendus : une fonction par page, dpi -> (image PIL, DPI source ou None pour une photo).
+# L'OCR adaptatif peut ainsi re-rendre une page à un autre DPI.
+
+def _rendu_image(filepath):
+    return lambda dpi: (Image.open(filepath), None)
+
+def _rendu_page(filepath, page_number):
+    return lambda dpi: (render_page(filepath, page_number, dpi=dpi), dpi)
+
+def _pretraitement_palier(dpi):
+    """
+    Prétraitement d'un palier : les photos (sans DPI connu) sont bornées
+    proportionnellement au DPI du palier.
+    """
+    return dict(PREPROCESS, dpi_cible=dpi,
+                cote_max=int(PREPROCESS["cote_max"] * dpi / PREPROCESS["dpi_cible"]))
+
+def _ocr_palier(rendus, dpi, psm=None, config=PREPROCESS, avec_confiance=True):
+    """
+    Rendu, prétraitement puis OCR d'un lot de pages (images fermées ensuite).
+    """
+    images = [rendre(dpi) for rendre in rendus]
+    pretes = [preprocess(image, source_dpi, config) for image, source_dpi in images]
+    with timer("tesseract"):
+        if avec_confiance:
+            resultats = get_engine().ocr_batch_data(pretes, psm=psm)
+        else:
+            resultats = [(texte, None) for texte in get_engine().ocr_batch(pretes)]
+    for image, _ in images:
+        image.close()
+    return resultats
+
+def _ocr_adaptatif(rendus):
+    """
+    OCR piloté par la confiance : toutes les pages passent au premier palier
+    (rapide, basse résolution), puis seules celles dont la confiance moyenne
+    reste sous OCR_MIN_CONFIDENCE passent au palier suivant (DPI plus élevé ou
+    autre segmentation). Chaque page garde sa lecture la plus sûre. Une page
+    sans aucun mot (blanche, intercalaire) n'est pas reprise.
+    """
+    resultats = [None] * len(rendus)
+    a_reprendre = list(range(len(rendus)))
+    for palier, (dpi, psm) in enumerate(OCR_TIERS):
+        if not a_reprendre:
+            break
+        if palier:
+            inc("carteid_ocr_reprises_total", len(a_reprendre), palier=str(palier))
+        lus = _ocr_palier([rendus[i] for i in a_reprendre], dpi, psm, _pretraitement_palier(dpi))
+        for i, lu in zip(a_reprendre, lus):
+            if resultats[i] is None or (lu[1] is not None and lu[1] > resultats[i][1]):
+                resultats[i] = lu
+        a_reprendre = [i for i in a_reprendre
+                       if resultats[i][1] is not None and resultats[i][1] < OCR_MIN_CONFIDENCE]
+    return resultats
+
+def _ocr_rendus(rendus, dpi=OCR_DPI):
+    """
+    [(texte, confiance)] pour un lot de pages, dans l'ordre.
+    """
+    if not rendus:
+        return []
+    if OCR_ADAPTIVE:
+        return _ocr_adaptatif(rendus)
+    return _ocr_palier(rendus, dpi, avec_confiance=False)
+
+def ocr_image_files(filepaths):
+    """
+    OCR de plusieurs fichiers image en un seul lot (beaucoup de petits fichiers).
+    Retourne un PageOCR par fichier, dans l'ordre.
+    """
+    lus = _ocr_rendus([_rendu_image(filepath) for filepath in filepaths])
+    inc("carteid_pages_total", len(filepaths), source="ocr")
+    return [PageOCR(1, texte, "ocr", confiance) for texte, confiance in lus]
+
+def iter_ocr_pages(filepath, dpi=OCR_DPI, max_pages=OCR_MAX_PAGES, batch_size=OCR_BATCH_SIZE):
+    """
+    Générateur de PageOCR : les pages sont rendues puis OCRisées par lots de
+    `batch_size`, la mémoire reste donc bornée quel que soit le nombre de pages.
+    La première page OCRisée part seule : son texte est disponible avant le
+    rendu des suivantes (tri rapide, détection du type). Les pages qui ont déjà
+    une couche texte ne sont ni rendues ni OCRisées.
+    """
     ext = os.path.splitext(filepath)[1].lower()
-    if ext == '.pdf':
-        pages = convert_from_path(filepath, poppler_path=POPPLER_PATH)
-        text = ""
-        for page in pages:
-            text += pytesseract.image_to_string(page, lang='fra') + "\n"
-        return text
-    else:
-        img = Image.open(filepath)
-        return pytesseract.image_to_string(img, lang='fra')
+    if ext != '.pdf':
+        inc("carteid_pages_total", source="ocr")
+        texte, confiance = _ocr_rendus([_rendu_image(filepath)], dpi)[0]
+        yield PageOCR(1, texte, "ocr", confiance)
+        return
+
+    nb_pages = count_pages(filepath)
+    if max_pages is not None:
+        nb_pages = min(nb_pages, max_pages)
+    couche_texte = extract_text_layer(filepath, 1, nb_pages) if TEXT_LAYER_ENABLED else []
+
+    en_attente = []   # (numero, texte ou None) dans l'ordre des pages
+    rendus = []
+    taille_lot = 1    # batch_size après la première page OCRisée
+
+    def vider():
+        lus = iter(_ocr_rendus(rendus, dpi))
+        pages = []
+        for numero, texte in en_attente:
+            if texte is not None:
+                pages.append(PageOCR(numero, texte, "texte"))
+            else:
+                texte_ocr, confiance = next(lus)
+                pages.append(PageOCR(numero, texte_ocr, "ocr", confiance))
+        en_attente.clear()
+        rendus.clear()
+        return pages
+
+    for page_number in range(1, nb_pages + 1):
+        if page_number <= len(couche_texte) and has_usable_text(couche_texte[page_number - 1]):
+            inc("carteid_pages_total", source="texte")
+            en_attente.append((page_number, couche_texte[page_number - 1]))
+            if not rendus:
+                yield from vider()
+        else:
+            inc("carteid_pages_total", source="ocr")
+            en_attente.append((page_number, None))
+            rendus.append(_rendu_page(filepath, page_number))
+            if len(rendus) >= taille_lot:
+                yield from vider()
+                taille_lot = batch_size
+    if en_attente:
+        yield from vider()
+
+def summarize_sources(pages):
+    """
+    Compte les pages par source, ex. {"texte": 3, "ocr": 1}.
+    """
+    resume = {}
+    for page in pages:
+        resume[page.source] = resume.get(page.source, 0) + 1
+    return resume
+
+def summarize_confidence(pages):
+    """
+    Confiance OCR par page, ex. {1: 91.4, 3: 62.0} (pages sans confiance omises).
+    """
+    return {page.numero: round(page.confiance, 1) for page in pages if page.confiance is not None}
+
+@lru_cache(maxsize=1)
+def tesseract_version():
+    return str(get_tesseract().get_tesseract_version())
+
+def _cache_key(cache, filepath, dpi, max_pages):
+    return cache.make_key(filepath, lang='fra', dpi=dpi, max_pages=max_pages,
+                          tesseract=tesseract_version(),
+                          text_layer=TEXT_LAYER_ENABLED and TEXT_LAYER_MIN_CHARS,
+                          pretraitement=config_signature(),
+                          adaptatif=OCR_ADAPTIVE and (OCR_MIN_CONFIDENCE, tuple(OCR_TIERS)))
+
+def cached_pages(filepath, dpi=OCR_DPI, max_pages=OCR_MAX_PAGES, compter=True):
+    """
+    Pages déjà OCRisées pour ce contenu et ces paramètres, ou None.
+    """
+    cache = get_cache()
+    if cache is None:
+        return None
+    rows = cache.get(_cache_key(cache, filepath, dpi, max_pages), compter)
+    if rows is None:
+        return None
+    return [PageOCR(*row) for row in rows]
+
+def store_pages(filepath, pages, dpi=OCR_DPI, max_pages=OCR_MAX_PAGES):
+    cache = get_cache()
+    if cache is not None:
+        cache.put(_cache_key(cache, filepath, dpi, max_pages), [tuple(page) for page in pages])
+
+def ocr_pages(filepath, dpi=OCR_DPI, max_pages=OCR_MAX_PAGES):
+    """
+    Liste des PageOCR du fichier, en passant par le cache OCR.
+    """
+    pages = cached_pages(filepath, dpi=dpi, max_pages=max_pages)
+    if pages is None:
+        pages = list(iter_ocr_pages(filepath, dpi=dpi, max_pages=max_pages))
+        store_pages(filepath, pages, dpi=dpi, max_pages=max_pages)
+    return pages
+
+def join_pages(filepath, pages):
+    """
+    Assemble le texte des pages comme le faisait ocr_file.
+    """
+    if os.path.splitext(filepath)[1].lower() != '.pdf':
+        return pages[0].texte if pages else ""
+    return "".join(page.texte + "\n" for page in pages)
+
+def ocr_file(filepath, dpi=OCR_DPI, max_pages=OCR_MAX_PAGES):
+    return join_pages(filepath, ocr_pages(filepath, dpi=dpi, max_pages=max_pages))
+
+def ocr_page(filepath, page_number, dpi=OCR_DPI):
+    """
+    PageOCR d'une seule page (numérotée à partir de 1) d'un PDF ou d'une image.
+    La couche texte est utilisée si elle existe, sinon seule cette page est rendue.
+    """
+    if os.path.splitext(filepath)[1].lower() != '.pdf':
+        return next(iter_ocr_pages(filepath))
+    if TEXT_LAYER_ENABLED:
+        couche_texte = extract_text_layer(filepath, page_number, page_number)
+        if couche_texte and has_usable_text(couche_texte[0]):
+            inc("carteid_pages_total", source="texte")
+            return PageOCR(page_number, couche_texte[0], "texte")
+    inc("carteid_pages_total", source="ocr")
+    texte, confiance = _ocr_rendus([_rendu_page(filepath, page_number)], dpi)[0]
+    return PageOCR(page_number, texte, "ocr", confiance)
+
 def clean_text(text):
     """
     Nettoie le texte OCR en supprimant les retours à la ligne et espaces superflus.
@@ -23,4 +443,4 @@ def clean_text(text):
         return ""
     text = text.replace('\n', ' ').replace('\r', ' ')
     text = ' '.join(text.split()) 
-    return text
\ No newline at end of file
+    return text
@@ -0,0 +1,108 @@
+from PIL import Image
+
+from metrics import timed
+from config import PREPROCESS
+
+
+def _scale_factor(image, source_dpi, config):
+    """
+    Facteur de réduction (<= 1) pour ramener l'image au DPI cible,
+    ou sous le côté maximal si le DPI n'est pas connu (photos).
+    """
+    if source_dpi is None:
+        dpi = image.info.get("dpi")
+        source_dpi = dpi[0] if dpi else None
+    if source_dpi and source_dpi > config["dpi_cible"]:
+        return config["dpi_cible"] / float(source_dpi)
+    cote = max(image.size)
+    if cote > config["cote_max"]:
+        return config["cote_max"] / float(cote)
+    return 1.0
+
+
+def crop_borders(gray, marge=10):
+    """
+    Recadre sur la zone qui contient de l'encre (fond clair, bordures de scan).
+    """
+    import cv2
+    _, encre = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    points = cv2.findNonZero(encre)
+    if points is None:
+        return gray
+    x, y, w, h = cv2.boundingRect(points)
+    hauteur, largeur = gray.shape[:2]
+    if w * h < 0.05 * largeur * hauteur:
+        return gray   # quasiment vide : on ne touche à rien
+    x0, y0 = max(x - marge, 0), max(y - marge, 0)
+    x1, y1 = min(x + w + marge, largeur), min(y + h + marge, hauteur)
+    return gray[y0:y1, x0:x1]
+
+
+def deskew(gray, angle_max=15.0):
+    """
+    Redresse une page légèrement tournée (angle estimé sur les pixels d'encre).
+    """
+    import cv2
+    _, encre = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    points = cv2.findNonZero(encre)
+    if points is None or len(points) < 100:
+        return gray
+    angle = cv2.minAreaRect(points)[-1]
+    # minAreaRect renvoie un angle dans [0, 90) (OpenCV >= 4.5) ou [-90, 0) (versions antérieures)
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+    if abs(angle) < 0.3 or abs(angle) > angle_max:
+        return gray
+    hauteur, largeur = gray.shape[:2]
+    rotation = cv2.getRotationMatrix2D((largeur / 2, hauteur / 2), angle, 1.0)
+    return cv2.warpAffine(gray, rotation, (largeur, hauteur), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+
+
+def binarize(gray):
+    import cv2
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15)
+
+
+@timed("pretraitement")
+def preprocess(image, source_dpi=None, config=PREPROCESS):
+    """
+    Prépare une image PIL pour tesseract : réduction au DPI cible, niveaux de gris,
+    recadrage, redressement puis binarisation, selon `config`.
+    Retourne une nouvelle image PIL (l'originale n'est pas modifiée).
+    """
+    if not config.get("actif"):
+        return image
+
+    import cv2
+    import numpy as np
+
+    facteur = _scale_factor(image, source_dpi, config)
+    if config.get("niveaux_de_gris") or config.get("recadrage") or config.get("redressement") \
+            or config.get("binarisation"):
+        # Les étapes suivantes travaillent en niveaux de gris
+        pixels = np.asarray(image.convert("L"))
+    else:
+        pixels = np.asarray(image.convert("RGB"))
+
+    if facteur < 1.0:
+        pixels = cv2.resize(pixels, None, fx=facteur, fy=facteur, interpolation=cv2.INTER_AREA)
+    if pixels.ndim == 2:
+        if config.get("recadrage"):
+            pixels = crop_borders(pixels)
+        if config.get("redressement"):
+            pixels = deskew(pixels)
+        if config.get("binarisation"):
+            pixels = binarize(pixels)
+    return Image.fromarray(pixels)
+
+
+def config_signature(config=PREPROCESS):
+    """
+    Résumé stable de la configuration (entre dans la clé du cache OCR).
+    """
+    if not config.get("actif"):
+        return "aucun"
+    return ",".join(f"{k}={config[k]}" for k in sorted(config) if k != "actif")
@@ -0,0 +1,188 @@
+"""
+Ré-extraction depuis l'archive (texte OCR + Doc spaCy), sans refaire l'OCR :
+relance extract_info_id / extract_info_cv puis l'écriture du XML sur tous les
+documents archivés, par lots répartis sur plusieurs processus, et signale les
+fiches modifiées. Dans un lot, les textes sans Doc archivé passent par un seul nlp.pipe.
+Les documents sortis par lot (--sortie-lot, sans XML propre) sont mis à jour
+dans l'archive et l'index et signalés, sans XML réécrit.
+
+    python reextract.py --workers 4 --rapport changements.jsonl
+    python reextract.py --simulation        (aucun XML réécrit)
+"""
+import argparse
+import json
+import os
+import time
+from multiprocessing import Pool
+
+from archive import iter_entries, load_entry, update_entry
+from extract_cv import extract_info_cv_batch
+from extract_id import extract_info_id_batch
+from mrz import parse_mrz
+from xml_utils import write_xml
+from search_index import index_record
+from config import ARCHIVE_DIR, MRZ_ENABLED, NLP_BATCH_SIZE
+
+# Méthodes qui ont lu l'image elle-même : le texte archivé ne suffit pas à les rejouer
+METHODES_IMAGE = ("mrz", "gabarit")
+
+
+def reextract_records(elements):
+    """
+    Rejoue l'extraction sur les textes archivés [(type, texte, doc, ancienne), ...].
+    Retourne [(fiche, rejouee), ...] ; rejouee vaut False si la fiche d'origine
+    venait d'une lecture de l'image (bande MRZ, gabarit) et a été conservée
+    telle quelle. Les Doc archivés sont réutilisés, les autres calculés par lot.
+    """
+    resultats = [None] * len(elements)
+    a_rejouer = {"carte_identite": [], "cv": []}    # [(indice, texte, doc)]
+    for i, (doc_type, texte, doc, ancienne) in enumerate(elements):
+        if doc_type != "cv":
+            result = parse_mrz(texte) if MRZ_ENABLED else None
+            if result:
+                resultats[i] = (result, True)
+                continue
+            if ancienne.get("methode") in METHODES_IMAGE:
+                resultats[i] = (ancienne, False)
+                continue
+        a_rejouer["cv" if doc_type == "cv" else "carte_identite"].append((i, texte, doc))
+
+    # Processus du pool (démon) : spaCy ne peut pas y lancer ses propres processus
+    for doc_type, extraction in (("carte_identite", extract_info_id_batch), ("cv", extract_info_cv_batch)):
+        lot = a_rejouer[doc_type]
+        if not lot:
+            continue
+        fiches = extraction([texte for _, texte, _ in lot], docs=[doc for _, _, doc in lot], n_process=1)
+        for (i, _, _), (fiche, _) in zip(lot, fiches):
+            resultats[i] = (fiche, True)
+    return resultats
+
+
+def champs_modifies(ancienne, nouvelle):
+    # Passage par JSON : listes et tuples, clés absentes... comparés à l'identique
+    ancienne = json.loads(json.dumps(ancienne, ensure_ascii=False))
+    nouvelle = json.loads(json.dumps(nouvelle, ensure_ascii=False))
+    return {cle: [ancienne.get(cle), nouvelle.get(cle)]
+            for cle in sorted(set(ancienne) | set(nouvelle))
+            if ancienne.get(cle) != nouvelle.get(cle)}
+
+
+def publier(entree, meta, doc, nouvelle, rejouee, ecrire=True):
+    """
+    Compare la fiche rejouée à l'ancienne, réécrit XML, archive et index si elle
+    a changé. Retourne un dict décrivant le résultat.
+    """
+    modifications = champs_modifies(meta["info"], nouvelle)
+    sortie = meta.get("sortie")
+    if modifications and ecrire:
+        # Sans sortie propre, le document n'existe que dans un fichier de lot :
+        # pas de XML isolé créé pour lui
+        if sortie:
+            write_xml(nouvelle, sortie, meta["type"])
+        update_entry(entree, nouvelle, sortie)
+        index_record(meta["fichier"], meta["type"], nouvelle, sortie)
+    return {"entree": entree, "fichier": meta["fichier"], "type": meta["type"],
+            "rejouee": rejouee, "avec_doc": doc is not None,
+            "modifications": modifications, "sortie": sortie, "lot": not sortie}
+
+
+def traiter_entree(entree, ecrire=True):
+    """
+    Une seule entrée. Retourne un dict décrivant le résultat.
+    """
+    try:
+        meta, texte, doc = load_entry(entree)
+        nouvelle, rejouee = reextract_records([(meta["type"], texte, doc, meta["info"])])[0]
+        return publier(entree, meta, doc, nouvelle, rejouee, ecrire)
+    except Exception as e:
+        return {"entree": entree, "erreur": str(e)}
+
+
+def traiter_lot(entrees, ecrire=True):
+    """
+    Exécuté dans un processus du pool : un lot d'entrées, extraction rejouée
+    par lot. Retourne un dict par entrée.
+    """
+    resultats = []
+    chargees = []
+    for entree in entrees:
+        try:
+            chargees.append((entree,) + tuple(load_entry(entree)))
+        except Exception as e:
+            resultats.append({"entree": entree, "erreur": str(e)})
+    try:
+        fiches = reextract_records([(meta["type"], texte, doc, meta["info"]) for _, meta, texte, doc in chargees])
+    except Exception:
+        # Un texte fait échouer le lot : chaque entrée est reprise seule
+        return resultats + [traiter_entree(entree, ecrire) for entree, _, _, _ in chargees]
+    for (entree, meta, _, doc), (nouvelle, rejouee) in zip(chargees, fiches):
+        try:
+            resultats.append(publier(entree, meta, doc, nouvelle, rejouee, ecrire))
+        except Exception as e:
+            resultats.append({"entree": entree, "erreur": str(e)})
+    return resultats
+
+
+def _traiter(args):
+    return traiter_lot(*args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive", default=ARCHIVE_DIR, help="Dossier de l'archive")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--simulation", action="store_true",
+                        help="Signale les changements sans réécrire XML ni archive")
+    parser.add_argument("--rapport", default=None, help="Fichier JSON Lines des fiches modifiées")
+    args = parser.parse_args()
+
+    entrees = list(iter_entries(args.archive))
+    print(f"🗄️ {len(entrees)} documents archivés, {args.workers} processus")
+    debut = time.perf_counter()
+
+    compteurs = {"modifiees": 0, "inchangees": 0, "conservees": 0, "lot": 0, "erreurs": 0}
+    par_champ = {}
+    rapport = open(args.rapport, "w", encoding="utf-8") if args.rapport else None
+    try:
+        with Pool(processes=max(args.workers, 1)) as pool:
+            taille_lot = min(NLP_BATCH_SIZE, max(1, len(entrees) // (max(args.workers, 1) * 8)))
+            lots = [(entrees[i:i + taille_lot], not args.simulation) for i in range(0, len(entrees), taille_lot)]
+            for resultat in (r for lot in pool.imap_unordered(_traiter, lots) for r in lot):
+                if "erreur" in resultat:
+                    compteurs["erreurs"] += 1
+                    print(f"❌ {resultat['entree']} : {resultat['erreur']}")
+                    continue
+                if not resultat["rejouee"]:
+                    compteurs["conservees"] += 1
+                if not resultat["modifications"]:
+                    compteurs["inchangees"] += 1
+                    continue
+                compteurs["modifiees"] += 1
+                if resultat["lot"]:
+                    compteurs["lot"] += 1
+                for champ in resultat["modifications"]:
+                    par_champ[champ] = par_champ.get(champ, 0) + 1
+                print(f"✏️ {resultat['fichier']} : {', '.join(resultat['modifications'])}"
+                      + (" (sortie par lot, XML non réécrit)" if resultat["lot"] else ""))
+                if rapport:
+                    rapport.write(json.dumps(resultat, ensure_ascii=False) + "\n")
+    finally:
+        if rapport:
+            rapport.close()
+
+    duree = time.perf_counter() - debut
+    debit = len(entrees) / duree if duree > 0 else 0.0
+    print(f"⏱️ {len(entrees)} documents en {duree:.1f} s ({debit:.1f} docs/s)")
+    print(f"📊 Modifiées : {compteurs['modifiees']} | inchangées : {compteurs['inchangees']} | "
+          f"lecture image conservée : {compteurs['conservees']} | erreurs : {compteurs['erreurs']}")
+    if compteurs["lot"]:
+        print(f"🧾 {compteurs['lot']} fiches modifiées issues d'une sortie par lot : archive et index "
+              f"mis à jour, fichiers de lot inchangés")
+    if par_champ:
+        print("📊 Champs modifiés : " + ", ".join(f"{c} ({n})" for c, n in sorted(par_champ.items())))
+    if args.simulation:
+        print("🧪 Simulation : aucun fichier réécrit")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import heapq
+import os
+import queue
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque, namedtuple
+
+import metrics
+from config import (SCHEDULER_CLASSES, SCHEDULER_FOLDERS, SCHEDULER_PROBE, SCHEDULER_MAX_WAIT,
+                    SCHEDULER_BYTES_PER_PAGE)
+
+# Fichier en attente : classe de document, coût estimé (pages), horodatage de soumission
+Tache = namedtuple("Tache", ["chemin", "classe", "cout", "soumis"])
+
+
+def _normaliser(nom):
+    sans_accents = unicodedata.normalize("NFKD", nom).encode("ascii", "ignore").decode("ascii")
+    return " ".join(sans_accents.lower().replace("_", " ").replace("-", " ").split())
+
+
+def classify(filepath, racine=None, dossiers=SCHEDULER_FOLDERS, sonde=SCHEDULER_PROBE):
+    """
+    Classe d'un fichier : d'après ses dossiers, du plus proche jusqu'à la boîte
+    de dépôt `racine` incluse (sans racine, ou hors de celle-ci, le dossier du
+    fichier seul), sinon d'après le tri rapide de la première page si la sonde
+    est activée, sinon "inconnu".
+    """
+    dossier = os.path.dirname(os.path.abspath(filepath))
+    fin = dossier
+    if racine:
+        racine = os.path.abspath(racine)
+        if os.path.commonpath([racine, dossier]) == racine:
+            fin = racine
+    while True:
+        parent, nom = os.path.split(dossier)
+        classe = dossiers.get(_normaliser(nom)) if nom else None
+        if classe:
+            return classe
+        if dossier == fin or parent == dossier:
+            break
+        dossier = parent
+    if sonde:
+        from triage import ocr_first_page_fast
+        from detect_type import detect_document_type
+        try:
+            texte = ocr_first_page_fast(filepath)
+        except Exception as e:
+            print(f"[ordonnanceur] Sonde impossible pour {filepath} : {e}")
+            return "inconnu"
+        return detect_document_type(texte.replace('\n', ' ').replace('\r', ' ')) or "inconnu"
+    return "inconnu"
+
+
+def _cout_taille(filepath):
+    try:
+        return max(1, os.path.getsize(filepath) // SCHEDULER_BYTES_PER_PAGE)
+    except OSError:
+        return 1
+
+
+def estimate_cost(filepath, exact=True):
+    """
+    Coût estimé en pages : nombre de pages du PDF (sans rendu), 1 pour une
+    image, ou d'après la taille du fichier si le PDF est illisible. Avec
+    exact=False, un PDF est estimé d'après sa taille seule, sans lancer pdfinfo.
+    """
+    if os.path.splitext(filepath)[1].lower() != '.pdf':
+        return 1
+    if not exact:
+        return _cout_taille(filepath)
+    from ocr_utils import count_pages
+    try:
+        return count_pages(filepath)
+    except Exception:
+        return _cout_taille(filepath)
+
+
+def _centile(valeurs, q):
+    ordonnees = sorted(valeurs)
+    return ordonnees[min(len(ordonnees) - 1, int(round(q * (len(ordonnees) - 1))))]
+
+
+class Scheduler:
+    """
+    Ordre de traitement des fichiers, plutôt que l'ordre du listage :
+    - chaque fichier a une classe (dossier source ou sonde) et un coût en pages ;
+    - partage équitable pondéré entre classes : chaque classe avance d'un temps
+      virtuel cout / poids par fichier servi ; passe la classe dont le prochain
+      fichier finirait le plus tôt en temps virtuel (à poids 4 contre 1, quatre
+      pages de cartes pour une page de CV) ;
+    - dans une classe, le fichier le moins coûteux d'abord, puis le plus ancien ;
+    - anti-famine : un fichier qui attend depuis plus de max_wait passe devant tout
+      (file put/get du watcher seulement : en mode lot, tout est soumis au même
+      instant, l'ordre est fixé d'avance et seul le partage pondéré s'applique) ;
+    - latence de chaque classe comparée à son objectif (SLO), dépassements dans les logs.
+    S'utilise en un coup (plan) pour un lot, ou comme file bornée (put/get) par
+    les threads du watcher ; done() clôt un fichier et mesure sa latence.
+    """
+
+    def __init__(self, classes=SCHEDULER_CLASSES, max_wait=SCHEDULER_MAX_WAIT, maxsize=0):
+        self.classes = classes
+        self.max_wait = max_wait
+        self.maxsize = maxsize
+        self._cond = threading.Condition()
+        self._files = {}              # classe -> tas de (cout, numero, tache)
+        self._attente = OrderedDict()  # numero -> tache, par ordre d'arrivée
+        self._passe = {}              # classe -> temps virtuel
+        self._virtuel = 0.0
+        self._numero = 0
+        self._en_cours = {}           # chemin -> tache
+        self._latences = {}           # classe -> dernières latences
+        self._compteurs = {}          # classe -> [traités, dépassements]
+
+    def _params(self, classe):
+        return self.classes.get(classe) or self.classes["inconnu"]
+
+    # ➕ Soumission
+
+    def _ajouter(self, tache):
+        if not self._files.get(tache.classe):
+            # Une classe qui se réveille repart du temps virtuel courant : pas de
+            # crédit accumulé pendant qu'elle était vide
+            self._passe[tache.classe] = max(self._passe.get(tache.classe, 0.0), self._virtuel)
+        self._numero += 1
+        heapq.heappush(self._files.setdefault(tache.classe, []), (tache.cout, self._numero, tache))
+        self._attente[self._numero] = tache
+
+    def make_task(self, filepath, classe=None, exact=True, racine=None):
+        # Estimations hors verrou : pdfinfo et la sonde lancent des processus
+        return Tache(filepath, classe or classify(filepath, racine), estimate_cost(filepath, exact), time.time())
+
+    def put(self, filepath, classe=None):
+        """
+        Ajoute un fichier ; bloque tant que la file est pleine (contre-pression).
+        """
+        tache = self.make_task(filepath, classe)
+        with self._cond:
+            self._cond.wait_for(lambda: not self.maxsize or len(self._attente) < self.maxsize)
+            self._ajouter(tache)
+            self._cond.notify_all()
+
+    # ➖ Choix du suivant
+
+    def _prendre(self):
+        maintenant = time.time()
+        numero, plus_ancien = next(iter(self._attente.items()))
+        if maintenant - plus_ancien.soumis >= self.max_wait:
+            print(f"⏳ Anti-famine : {plus_ancien.chemin} attend depuis "
+                  f"{maintenant - plus_ancien.soumis:.0f} s, traité en priorité")
+            file = self._files[plus_ancien.classe]
+            file.remove(next(e for e in file if e[1] == numero))
+            heapq.heapify(file)
+            classe = plus_ancien.classe
+        else:
+            # Temps virtuel de fin du prochain fichier de chaque classe : un long
+            # CV en tête de file ne passe pas avant plusieurs cartes d'une page
+            def fin_virtuelle(c):
+                poids = self._params(c)["poids"]
+                return self._passe[c] + self._files[c][0][0] / poids, -poids
+            classe = min((c for c, file in self._files.items() if file), key=fin_virtuelle)
+            _, numero, _ = heapq.heappop(self._files[classe])
+        tache = self._attente.pop(numero)
+        self._virtuel = self._passe[classe]
+        self._passe[classe] += tache.cout / self._params(classe)["poids"]
+        self._en_cours[tache.chemin] = tache
+        return tache
+
+    def get(self, timeout=None):
+        """
+        Chemin du prochain fichier à traiter ; lève queue.Empty après timeout.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._attente, timeout):
+                raise queue.Empty
+            tache = self._prendre()
+            self._cond.notify_all()
+        return tache.chemin
+
+    def plan(self, filepaths, classe=None, racine=None):
+        """
+        Mode lot : ordre de traitement de tous les fichiers, soumis au même instant.
+        Le coût vient de la taille des fichiers : un pdfinfo par fichier, en
+        série avant tout traitement, retarderait d'autant le lot entier.
+        max_wait ne joue pas ici : l'ordre est calculé d'un coup, avant que
+        quiconque ait attendu. racine est la boîte de dépôt (voir classify).
+        """
+        taches = [self.make_task(filepath, classe, exact=False, racine=racine) for filepath in filepaths]
+        with self._cond:
+            for tache in taches:
+                self._ajouter(tache)
+            ordre = [self._prendre().chemin for _ in taches]
+        comptes = {}
+        for tache in taches:
+            comptes[tache.classe] = comptes.get(tache.classe, 0) + 1
+        print(f"🚦 Ordre de traitement : {comptes}")
+        return ordre
+
+    def qsize(self):
+        with self._cond:
+            return len(self._attente)
+
+    # ✅ Fin de traitement et objectifs de latence
+
+    def done(self, filepath):
+        with self._cond:
+            tache = self._en_cours.pop(filepath, None)
+        if tache is None:
+            return None
+        latence = time.time() - tache.soumis
+        slo = self._params(tache.classe)["slo"]
+        metrics.observe("carteid_latence_seconds", latence, classe=tache.classe)
+        with self._cond:
+            self._latences.setdefault(tache.classe, deque(maxlen=1000)).append(latence)
+            compteurs = self._compteurs.setdefault(tache.classe, [0, 0])
+            compteurs[0] += 1
+            if latence > slo:
+                compteurs[1] += 1
+        if latence > slo:
+            metrics.inc("carteid_slo_depassements_total", classe=tache.classe)
+            print(f"⏰ Objectif de latence dépassé ({tache.classe}) : {tache.chemin} "
+                  f"en {latence:.1f} s pour {slo} s")
+        return latence
+
+    def report(self):
+        """
+        Par classe : traités, dépassements, latences p50 / p95 (s) et objectif.
+        """
+        with self._cond:
+            rapport = {}
+            for classe, (traites, depassements) in sorted(self._compteurs.items()):
+                latences = list(self._latences[classe])
+                rapport[classe] = {"traites": traites, "depassements": depassements,
+                                   "p50_s": round(_centile(latences, 0.50), 2),
+                                   "p95_s": round(_centile(latences, 0.95), 2),
+                                   "slo_s": self._params(classe)["slo"]}
+        return rapport
+
+    def print_report(self):
+        for classe, st in self.report().items():
+            print(f"🚦 {classe} : {st['traites']} traités | p50 {st['p50_s']} s | p95 {st['p95_s']} s | "
+                  f"objectif {st['slo_s']} s | dépassements : {st['depassements']}")
@@ -0,0 +1,425 @@
+"""
+Index des fiches extraites : recherche exacte (numéro de carte, email,
+téléphone) et plein texte (compétences, expériences) sans relire les XML.
+
+    python search_index.py --carte 880693202043
+    python search_index.py --email marie.curie@mail.com
+    python search_index.py --telephone "06 12 34 56 78"
+    python search_index.py --recherche "python docker"
+    python search_index.py --recherche 'competences:python NOT java' --limite 50
+    python search_index.py --importer            (XML et JSON Lines déjà produits)
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from config import INDEX_ENABLED, INDEX_PATH, OUTPUT_FOLDER
+
+INCONNU = "Inconnu"
+
+
+def _valeur(info, cle):
+    valeur = info.get(cle)
+    if valeur in (None, "", INCONNU):
+        return None
+    return str(valeur).strip()
+
+
+def normalize_card(numero):
+    return re.sub(r"\s+", "", numero).upper() if numero else None
+
+
+def normalize_email(email):
+    return email.strip().lower() if email else None
+
+
+def normalize_phone(telephone):
+    """
+    Chiffres seuls, indicatif +33 / 0033 ramené au 0 national.
+    """
+    if not telephone:
+        return None
+    chiffres = re.sub(r"\D", "", telephone)
+    if chiffres.startswith("0033"):
+        chiffres = "0" + chiffres[4:]
+    elif chiffres.startswith("33") and len(chiffres) == 11:
+        chiffres = "0" + chiffres[2:]
+    return chiffres or None
+
+
+def _texte(elements):
+    """
+    Texte plein d'une liste de compétences / expériences (chaînes ou dictionnaires).
+    """
+    morceaux = []
+    for element in elements or []:
+        if isinstance(element, dict):
+            morceaux.extend(str(v) for v in element.values() if v not in (None, "", INCONNU))
+        elif isinstance(element, (list, tuple)):
+            morceaux.extend(str(v) for v in element)
+        else:
+            morceaux.append(str(element))
+    return "\n".join(morceaux)
+
+
+class RecordIndex:
+    """
+    Index persistant (SQLite) des fiches : une table documents avec des index
+    B-tree sur les champs de recherche exacte (normalisés), et une table FTS5
+    (compétences, expériences) partageant le même rowid. Une fiche est
+    identifiée par son XML de sortie, ou par son fichier source pour les
+    sorties par lot : retraiter un document remplace sa fiche.
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                cle TEXT NOT NULL UNIQUE,
+                fichier TEXT,
+                sortie TEXT,
+                doc_type TEXT NOT NULL,
+                nom TEXT,
+                prenom TEXT,
+                numero_carte TEXT,
+                email TEXT,
+                telephone TEXT,
+                info TEXT NOT NULL,
+                date REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_numero_carte ON documents (numero_carte);
+            CREATE INDEX IF NOT EXISTS idx_email ON documents (email);
+            CREATE INDEX IF NOT EXISTS idx_telephone ON documents (telephone);
+            CREATE VIRTUAL TABLE IF NOT EXISTS recherche USING fts5 (
+                competences, experiences, tokenize = 'unicode61 remove_diacritics 2'
+            );
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def _ligne(fichier, doc_type, info, sortie):
+        fichier = os.path.abspath(fichier) if fichier else None
+        sortie = os.path.abspath(sortie) if sortie else None
+        return {
+            "cle": sortie or fichier,
+            "fichier": fichier,
+            "sortie": sortie,
+            "doc_type": doc_type,
+            "nom": _valeur(info, "nom"),
+            "prenom": _valeur(info, "prenom"),
+            "numero_carte": normalize_card(_valeur(info, "numero_carte")),
+            "email": normalize_email(_valeur(info, "email")),
+            "telephone": normalize_phone(_valeur(info, "telephone")),
+            "info": json.dumps(info, ensure_ascii=False),
+            "date": time.time(),
+            "competences": _texte(info.get("competences")),
+            "experiences": _texte(info.get("experiences")),
+        }
+
+    def _ecrire(self, lignes):
+        for ligne in lignes:
+            ancien = self._conn.execute("SELECT id FROM documents WHERE cle = ?", (ligne["cle"],)).fetchone()
+            if ancien:
+                self._conn.execute("DELETE FROM recherche WHERE rowid = ?", ancien)
+                self._conn.execute("DELETE FROM documents WHERE id = ?", ancien)
+            cur = self._conn.execute(
+                "INSERT INTO documents (cle, fichier, sortie, doc_type, nom, prenom, numero_carte, email, "
+                "telephone, info, date) VALUES (:cle, :fichier, :sortie, :doc_type, :nom, :prenom, "
+                ":numero_carte, :email, :telephone, :info, :date)", ligne)
+            self._conn.execute("INSERT INTO recherche (rowid, competences, experiences) VALUES (?, ?, ?)",
+                               (cur.lastrowid, ligne["competences"], ligne["experiences"]))
+
+    def upsert(self, fichier, doc_type, info, sortie=None):
+        """
+        Ajoute ou remplace la fiche d'un document.
+        """
+        ligne = self._ligne(fichier, doc_type, info, sortie)
+        if not ligne["cle"]:
+            return
+        with self._lock, self._conn:
+            self._ecrire([ligne])
+
+    def upsert_many(self, fiches):
+        """
+        Import en masse : fiches = [(fichier, doc_type, info, sortie)], une seule transaction.
+        """
+        lignes = [self._ligne(*fiche) for fiche in fiches]
+        with self._lock, self._conn:
+            self._ecrire([ligne for ligne in lignes if ligne["cle"]])
+        return len(lignes)
+
+    # 🔎 Recherche exacte
+
+    def _chercher(self, colonne, valeur):
+        if not valeur:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, doc_type, fichier, sortie, info FROM documents WHERE {colonne} = ? "
+                f"ORDER BY date DESC", (valeur,)).fetchall()
+        return [_fiche(*row) for row in rows]
+
+    def find_card(self, numero):
+        return self._chercher("numero_carte", normalize_card(numero))
+
+    def find_email(self, email):
+        return self._chercher("email", normalize_email(email))
+
+    def find_phone(self, telephone):
+        return self._chercher("telephone", normalize_phone(telephone))
+
+    # 📚 Recherche plein texte
+
+    def search(self, requete, limite=20):
+        """
+        Recherche FTS5 sur les compétences et expériences, classée par pertinence
+        (bm25). La syntaxe FTS5 est acceptée (AND, OR, NOT, "phrase", competences:...) ;
+        une requête invalide est retentée mot par mot.
+        """
+        # Classement sur la seule table FTS, puis jointure et extraits pour les
+        # `limite` premiers : pas d'extrait ni de fiche décodée par correspondance
+        sql = ("SELECT d.id, d.doc_type, d.fichier, d.sortie, d.info, "
+               "snippet(recherche, -1, '[', ']', '…', 10) "
+               "FROM (SELECT rowid, rank FROM recherche WHERE recherche MATCH ?1 "
+               "      ORDER BY rank LIMIT ?2) AS meilleurs "
+               "JOIN recherche ON recherche.rowid = meilleurs.rowid AND recherche MATCH ?1 "
+               "JOIN documents d ON d.id = meilleurs.rowid ORDER BY meilleurs.rank")
+        with self._lock:
+            try:
+                rows = self._conn.execute(sql, (requete, limite)).fetchall()
+            except sqlite3.OperationalError:
+                # « C++ », « node.js »... : chaque mot cherché tel quel
+                termes = " ".join('"' + mot.replace('"', '""') + '"' for mot in requete.split())
+                rows = self._conn.execute(sql, (termes, limite)).fetchall() if termes else []
+        return [dict(_fiche(*row[:5]), extrait=row[5]) for row in rows]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM recherche")
+            self._conn.execute("DELETE FROM documents")
+
+    def stats(self):
+        with self._lock:
+            nb = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            par_type = dict(self._conn.execute(
+                "SELECT doc_type, COUNT(*) FROM documents GROUP BY doc_type").fetchall())
+        return {"documents": nb, **par_type}
+
+
+def _fiche(doc_id, doc_type, fichier, sortie, info):
+    return {"id": doc_id, "type": doc_type, "fichier": fichier, "sortie": sortie, "info": json.loads(info)}
+
+
+_index = None
+
+def get_record_index():
+    """
+    Index partagé du processus (None si désactivé).
+    """
+    global _index
+    if not INDEX_ENABLED:
+        return None
+    if _index is None:
+        os.makedirs(os.path.dirname(INDEX_PATH) or '.', exist_ok=True)
+        _index = RecordIndex()
+    return _index
+
+
+def index_record(fichier, doc_type, info, sortie=None):
+    """
+    Mise à jour incrémentale après chaque document ; une erreur d'index
+    n'interrompt jamais le traitement.
+    """
+    index = get_record_index()
+    if index is None or not doc_type or not info:
+        return
+    try:
+        index.upsert(fichier, doc_type, info, sortie)
+    except sqlite3.Error as e:
+        print(f"[index] Mise à jour impossible pour {fichier} : {e}")
+
+
+# 📥 Import des sorties existantes
+
+def _texte_xml(element, chemin):
+    valeur = element.findtext(chemin)
+    return valeur if valeur is not None else INCONNU
+
+
+# Suffixe des XML d'un document (main, surveillance) : le type, même pour les
+# sorties antérieures à l'attribut type et au bloc <Carte>
+SUFFIXES_TYPE = {"_carte": "carte_identite", "_cv": "cv"}
+
+
+def _type_depuis_nom(chemin):
+    if not chemin:
+        return None
+    base = os.path.splitext(os.path.basename(chemin))[0]
+    return next((doc_type for suffixe, doc_type in SUFFIXES_TYPE.items() if base.endswith(suffixe)), None)
+
+
+def record_from_xml(cv, chemin=None):
+    """
+    Reconstruit (doc_type, fiche) depuis un élément <CV> produit par xml_utils.
+    Type : attribut type, sinon suffixe du fichier `chemin`, sinon présence
+    du bloc <Carte>, sinon "cv".
+    """
+    info = {
+        "nom": _texte_xml(cv, "Identite/Nom"),
+        "prenom": _texte_xml(cv, "Identite/Prenom"),
+        "email": _texte_xml(cv, "Identite/Email"),
+        "telephone": _texte_xml(cv, "Identite/Telephone"),
+        "adresse": _texte_xml(cv, "Identite/Adresse"),
+        "date_naissance": _texte_xml(cv, "Identite/DateNaissance"),
+    }
+    carte = cv.find("Carte")
+    if carte is not None:
+        info.update({
+            "numero_carte": _texte_xml(carte, "NumeroCarte"),
+            "lieu_naissance": _texte_xml(carte, "LieuNaissance"),
+            "sexe": _texte_xml(carte, "Sexe"),
+            "date_expiration": _texte_xml(carte, "DateExpiration"),
+        })
+    info["competences"] = [c.text or "" for c in cv.iterfind("Competences/Competence")]
+    info["langues"] = [(l.text or "", l.get("niveau", "")) for l in cv.iterfind("Langues/Langue")]
+    info["experiences"] = [{champ.lower(): e.findtext(champ) or "" for champ in
+                            ("Poste", "Entreprise", "Debut", "Fin", "Description")}
+                           for e in cv.iterfind("Experiences/Experience")]
+    info["formations"] = [{champ.lower(): f.findtext(champ) or "" for champ in
+                           ("Diplome", "Etablissement", "Annee")}
+                          for f in cv.iterfind("Formations/Formation")]
+    doc_type = (cv.get("type") or _type_depuis_nom(chemin)
+                or ("carte_identite" if carte is not None else "cv"))
+    return doc_type, info
+
+
+def iter_output_records(chemin):
+    """
+    Fiches d'un fichier de sortie : (fichier, doc_type, info, sortie).
+    XML d'un document, XML par lot (<Documents>) ou JSON Lines par lot.
+    """
+    if chemin.endswith(".jsonl"):
+        with open(chemin, encoding="utf-8") as f:
+            for numero, ligne in enumerate(f, 1):
+                if not ligne.strip():
+                    continue
+                record = json.loads(ligne)
+                doc_type = record.pop("type", None) or "cv"
+                source = record.pop("source", None)
+                record.pop("date_creation", None)
+                yield source or f"{chemin}#{numero}", doc_type, record, None
+        return
+
+    from lxml import etree
+    # recover : un XML par lot interrompu n'a pas sa balise fermante
+    racine = etree.parse(chemin, etree.XMLParser(recover=True, huge_tree=True)).getroot()
+    if racine is None:
+        return
+    if racine.tag == "CV":
+        doc_type, info = record_from_xml(racine, chemin)
+        yield None, doc_type, info, chemin
+        return
+    for numero, cv in enumerate(racine.iterfind("CV"), 1):
+        doc_type, info = record_from_xml(cv)
+        yield cv.get("source") or f"{chemin}#{numero}", doc_type, info, None
+
+
+def import_outputs(dossier=OUTPUT_FOLDER, index=None, taille_lot=1000):
+    """
+    Import en masse des sorties déjà produites (XML et JSON Lines du dossier,
+    récursivement). Retourne (fiches importées, fichiers en erreur).
+    """
+    index = index or get_record_index()
+    importees, erreurs = 0, 0
+    lot = []
+    for racine, dossiers, fichiers in os.walk(dossier):
+        dossiers.sort()
+        for nom in sorted(fichiers):
+            if not nom.endswith((".xml", ".jsonl")):
+                continue
+            chemin = os.path.join(racine, nom)
+            try:
+                lot.extend(iter_output_records(chemin))
+            except Exception as e:
+                erreurs += 1
+                print(f"❌ {chemin} : {e}")
+                continue
+            if len(lot) >= taille_lot:
+                importees += index.upsert_many(lot)
+                lot = []
+    if lot:
+        importees += index.upsert_many(lot)
+    return importees, erreurs
+
+
+def _afficher(fiches):
+    for fiche in fiches:
+        info = fiche["info"]
+        identite = f"{info.get('prenom', INCONNU)} {info.get('nom', INCONNU)}"
+        print(f"• [{fiche['type']}] {identite} — {fiche['sortie'] or fiche['fichier']}")
+        if fiche.get("extrait"):
+            print(f"    {' '.join(fiche['extrait'].split())}")
+    print(f"{len(fiches)} résultat(s)")
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    groupe = parser.add_mutually_exclusive_group(required=True)
+    groupe.add_argument("--carte", help="Numéro de carte d'identité")
+    groupe.add_argument("--email")
+    groupe.add_argument("--telephone")
+    groupe.add_argument("--recherche", help="Requête plein texte (syntaxe FTS5)")
+    groupe.add_argument("--importer", nargs="?", const=OUTPUT_FOLDER, metavar="DOSSIER",
+                        help="Importe les sorties XML / JSON Lines existantes")
+    groupe.add_argument("--stats", action="store_true")
+    groupe.add_argument("--vider", action="store_true")
+    parser.add_argument("--index", default=INDEX_PATH, help="Fichier SQLite de l'index")
+    parser.add_argument("--limite", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="Résultats bruts en JSON")
+    args = parser.parse_args(argv)
+
+    os.makedirs(os.path.dirname(args.index) or '.', exist_ok=True)
+    index = RecordIndex(args.index)
+    if args.importer:
+        debut = time.perf_counter()
+        importees, erreurs = import_outputs(args.importer, index)
+        print(f"📥 {importees} fiches importées depuis {args.importer} en "
+              f"{time.perf_counter() - debut:.1f} s ({erreurs} fichiers en erreur)")
+        return
+    if args.stats:
+        for nom, valeur in sorted(index.stats().items()):
+            print(f"{nom} : {valeur}")
+        return
+    if args.vider:
+        index.clear()
+        print("Index des fiches vidé.")
+        return
+
+    debut = time.perf_counter()
+    if args.carte:
+        fiches = index.find_card(args.carte)
+    elif args.email:
+        fiches = index.find_email(args.email)
+    elif args.telephone:
+        fiches = index.find_phone(args.telephone)
+    else:
+        fiches = index.search(args.recherche, args.limite)
+    duree_ms = (time.perf_counter() - debut) * 1000
+    if args.json:
+        print(json.dumps(fiches, ensure_ascii=False, indent=2))
+    else:
+        _afficher(fiches)
+        print(f"⏱️ {duree_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
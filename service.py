@@ -0,0 +1,254 @@
+"""
+Service HTTP local d'ingestion : on envoie un document, on reçoit la fiche extraite.
+
+    POST /extraire?format=json|xml&type=cv|carte_identite&nom=scan.pdf   (corps = le fichier)
+    GET  /sante      état du service (charge, capacité)
+    GET  /metrics    métriques au format Prometheus
+
+L'OCR et spaCy tournent dans un pool de processus (modèles chargés une fois par
+processus). Au-delà de SERVICE_MAX_PENDING documents en cours, la requête est
+refusée immédiatement (429) plutôt que mise en attente sans limite.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+import metrics
+from metrics import METRICS
+from main import init_worker, executer_mesure, trier, analyser_texte, valid_extensions
+from ocr_utils import ocr_pages, join_pages
+from dedup import find_duplicate, remember
+from xml_utils import xml_bytes
+from config import (SERVICE_HOST, SERVICE_PORT, SERVICE_WORKERS, SERVICE_MAX_PENDING,
+                    SERVICE_TIMEOUT, SERVICE_MAX_BYTES)
+
+STATUTS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           408: "Request Timeout", 413: "Payload Too Large", 422: "Unprocessable Entity", 429: "Too Many Requests",
+           500: "Internal Server Error", 504: "Gateway Timeout"}
+
+SIGNATURES = ((b"%PDF", ".pdf"), (b"\x89PNG", ".png"), (b"\xff\xd8", ".jpg"))
+
+TEXTE = "text/plain; charset=utf-8"
+JSON = "application/json; charset=utf-8"
+
+
+def extraire_document(contenu, extension, type_force=None):
+    """
+    Exécuté dans un processus du pool : tri, OCR, détection et extraction d'un
+    document reçu en mémoire. Retourne (doc_type, info) ; doc_type vaut None
+    si le document n'est pas reconnu.
+    """
+    fd, chemin = tempfile.mkstemp(suffix=extension, prefix="carteid_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(contenu)
+        apercu = trier(chemin, type_force)
+        type_triage = apercu.type
+        if type_triage is None:
+            return None, None
+        empreintes, doublon = find_duplicate(chemin, type_force, apercu)
+        if doublon:
+            return doublon
+        text = join_pages(chemin, ocr_pages(chemin))
+        _, doc_type, _, info = analyser_texte(chemin, text, type_force, type_triage or None, ecrire_xml=False)
+        remember(chemin, empreintes, doc_type, info)
+        return doc_type, info
+    finally:
+        os.remove(chemin)
+
+
+def deviner_extension(nom, contenu):
+    if nom and nom.lower().endswith(valid_extensions):
+        return os.path.splitext(nom)[1].lower()
+    for signature, extension in SIGNATURES:
+        if contenu.startswith(signature):
+            return extension
+    return None
+
+
+class IngestionService:
+    def __init__(self, workers=SERVICE_WORKERS, max_pending=SERVICE_MAX_PENDING,
+                 timeout=SERVICE_TIMEOUT, max_bytes=SERVICE_MAX_BYTES):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.pool = None
+        self.en_cours = 0
+        self.refuses = 0
+
+    def start_pool(self):
+        """
+        Processus lancés en "spawn" (un fork hériterait des sockets clientes
+        ouvertes) et démarrés avant d'accepter les connexions : la première
+        requête ne paie pas le chargement des modèles.
+        """
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        for future in [self.pool.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    # --- HTTP ---------------------------------------------------------------
+
+    async def handle(self, reader, writer):
+        debut = time.perf_counter()
+        statut = 500
+        try:
+            statut, type_contenu, corps = await self.route(reader)
+        except asyncio.IncompleteReadError:
+            statut, type_contenu, corps = 400, TEXTE, "Requête incomplète"
+        except asyncio.TimeoutError:
+            # Client trop lent (ou muet) : la connexion n'est pas gardée indéfiniment
+            metrics.inc("carteid_erreurs_total", etape="service_lecture")
+            statut, type_contenu, corps = 408, TEXTE, f"Requête non reçue en {self.timeout} s"
+        except ValueError as e:
+            statut, type_contenu, corps = 400, TEXTE, str(e)
+        except Exception as e:
+            print(f"❌ Erreur du service : {e}")
+            metrics.inc("carteid_erreurs_total", etape="service")
+            statut, type_contenu, corps = 500, TEXTE, str(e)
+        try:
+            await self.repondre(writer, statut, type_contenu, corps)
+        finally:
+            metrics.inc("carteid_http_requetes_total", statut=statut)
+            metrics.observe("carteid_stage_seconds", time.perf_counter() - debut, stage="http")
+            writer.close()
+
+    @staticmethod
+    async def lire_entetes(reader):
+        ligne = (await reader.readline()).decode("latin-1").strip()
+        if not ligne:
+            raise ValueError("Ligne de requête vide")
+        entetes = {}
+        while True:
+            ligne_entete = (await reader.readline()).decode("latin-1").strip()
+            if not ligne_entete:
+                break
+            nom, _, valeur = ligne_entete.partition(":")
+            entetes[nom.strip().lower()] = valeur.strip()
+        return ligne, entetes
+
+    async def route(self, reader):
+        # En-têtes puis corps lus chacun en self.timeout secondes au plus
+        # (asyncio.TimeoutError -> 408) : un client qui s'arrête en cours de
+        # requête ne garde pas la connexion ouverte
+        ligne, entetes = await asyncio.wait_for(self.lire_entetes(reader), self.timeout)
+        methode, cible, _ = ligne.split(" ", 2)
+
+        url = urlsplit(cible)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if url.path == "/sante" and methode == "GET":
+            etat = {"en_cours": self.en_cours, "capacite": self.max_pending,
+                    "workers": self.workers, "refuses": self.refuses}
+            return 200, JSON, json.dumps(etat)
+        if url.path == "/metrics" and methode == "GET":
+            return 200, "text/plain; version=0.0.4; charset=utf-8", METRICS.render_prometheus()
+        if url.path != "/extraire":
+            return 404, TEXTE, "Route inconnue"
+        if methode != "POST":
+            return 405, TEXTE, "POST attendu"
+
+        taille = int(entetes.get("content-length", "0"))
+        if taille <= 0:
+            return 400, TEXTE, "Corps vide (Content-Length requis)"
+        if taille > self.max_bytes:
+            return 413, TEXTE, f"Document trop volumineux (max {self.max_bytes} octets)"
+        format_sortie = params.get("format", "json")
+        if format_sortie not in ("json", "xml"):
+            return 400, TEXTE, "format doit valoir json ou xml"
+        type_force = params.get("type")
+        if type_force not in (None, "cv", "carte_identite"):
+            return 400, TEXTE, "type doit valoir cv ou carte_identite"
+
+        # Le corps est lu même en cas de refus, sinon la fermeture de la
+        # connexion avec des données non lues empêche le client de lire le 429
+        contenu = await asyncio.wait_for(reader.readexactly(taille), self.timeout)
+        extension = deviner_extension(params.get("nom"), contenu)
+        if extension is None:
+            return 400, TEXTE, "Format de fichier non pris en charge"
+        if self.en_cours >= self.max_pending:
+            self.refuses += 1
+            return 429, TEXTE, "Service saturé, réessayer plus tard"
+        return await self.extraire(contenu, extension, type_force, format_sortie)
+
+    async def extraire(self, contenu, extension, type_force, format_sortie):
+        loop = asyncio.get_running_loop()
+        self.en_cours += 1
+        future = loop.run_in_executor(self.pool, executer_mesure, extraire_document,
+                                      contenu, extension, type_force)
+
+        # La place n'est libérée qu'à la fin réelle du calcul, même après un
+        # délai dépassé : le processus reste occupé tant qu'il n'a pas fini
+        def liberer(f):
+            self.en_cours -= 1
+            if not f.cancelled() and f.exception() is None:
+                METRICS.merge(f.result()[1])
+        future.add_done_callback(liberer)
+
+        try:
+            (doc_type, info), _ = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            metrics.inc("carteid_erreurs_total", etape="service_delai")
+            return 504, TEXTE, f"Délai de {self.timeout} s dépassé"
+
+        metrics.inc("carteid_documents_total", type=doc_type or "inconnu")
+        if doc_type is None:
+            return 422, TEXTE, "Type de document non reconnu"
+        if format_sortie == "xml":
+            return 200, "application/xml; charset=utf-8", xml_bytes(info, doc_type)
+        return 200, JSON, json.dumps({"type": doc_type, **info}, ensure_ascii=False)
+
+    async def repondre(self, writer, statut, type_contenu, corps):
+        if isinstance(corps, str):
+            corps = corps.encode("utf-8")
+        entetes = [f"HTTP/1.1 {statut} {STATUTS.get(statut, '')}",
+                   f"Content-Type: {type_contenu}",
+                   f"Content-Length: {len(corps)}",
+                   "Connection: close"]
+        if statut == 429:
+            entetes.append("Retry-After: 1")
+        writer.write(("\r\n".join(entetes) + "\r\n\r\n").encode("latin-1") + corps)
+        await writer.drain()
+
+    async def serve(self, host=SERVICE_HOST, port=SERVICE_PORT):
+        self.start_pool()
+        serveur = await asyncio.start_server(self.handle, host, port)
+        print(f"🌐 Service d'ingestion sur http://{host}:{port}/extraire "
+              f"({self.workers} processus, {self.max_pending} documents en cours max)")
+        try:
+            async with serveur:
+                await serveur.serve_forever()
+        finally:
+            self.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service HTTP local d'extraction (cartes d'identité et CV).")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    parser.add_argument("--max-en-cours", type=int, default=SERVICE_MAX_PENDING,
+                        help="Documents acceptés simultanément (au-delà : 429)")
+    parser.add_argument("--delai", type=float, default=SERVICE_TIMEOUT, help="Délai par requête (s)")
+    args = parser.parse_args()
+
+    service = IngestionService(args.workers, args.max_en_cours, args.delai)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("🛑 Service arrêté.")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,19 @@ import time
 from ocr_utils import ocr_file
 from detect_type import detect_document_type
 from extract_cv import extract_info_cv
-from extract_id import extract_info_id
-from xml_utils import save_to_xml 
-from config import INPUT_DIR_ID, INPUT_DIR_CV, OUTPUT_DIR  
+from extract_id import extract_info_id_file
+from xml_utils import write_xml
+from triage import preview_document
+from dedup import find_duplicate, remember
+import metrics
+from journal import ProcessedJournal, scan_folder
+from claims import ClaimManager
+from archive import archive_document
+from scheduler import Scheduler
+from search_index import index_record
+from config import (INPUT_DIR_ID, INPUT_DIR_CV, OUTPUT_DIR, TRIAGE_ENABLED,
+                    SURVEILLANCE_INTERVAL, SURVEILLANCE_FULL_SCAN_EVERY, CLAIMS_ENABLED,
+                    SCHEDULER_ENABLED)
 
 # 📂 Chemins vers les dossiers à surveiller
 input_folders = [INPUT_DIR_ID, INPUT_DIR_CV]
@@ -13,46 +23,140 @@ input_folders = [INPUT_DIR_ID, INPUT_DIR_CV]
 # 📁 Dossier de sortie des fichiers XML
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-# 🧠 Mémoriser les fichiers déjà traités
-fichiers_deja_traite = set()
+extensions = ('.pdf', '.png', '.jpg', '.jpeg')
 
 def traitement_fichier(filepath):
+    """
+    Retourne le statut à inscrire au journal : "traite", "ignore" ou "erreur".
+    """
     print(f"📄 Traitement du fichier : {filepath}")
+    debut = time.time()
 
     try:
-        text = ocr_file(filepath)
-        doc_type = detect_document_type(text)
-
-        if doc_type == "carte_identite":
-            info = extract_info_id(text)
-            suffix = '_carte'
-        elif doc_type == "cv":
-            info = extract_info_cv(text)
-            suffix = '_cv'
+        # 🔎 Tri rapide sur la première page avant l'OCR complet
+        type_triage = apercu = None
+        if TRIAGE_ENABLED:
+            apercu = preview_document(filepath)
+            type_triage = apercu.type
+            if type_triage is None:
+                print("❓ Type de document non reconnu (tri rapide).")
+                metrics.inc("carteid_documents_total", type="inconnu")
+                return "ignore"
+
+        empreintes, doublon = find_duplicate(filepath, apercu=apercu)
+        if doublon:
+            doc_type, info = doublon
         else:
-            print("❓ Type de document non reconnu.")
-            return
+            text = ocr_file(filepath)
+            doc_type = detect_document_type(text) or type_triage
+
+            if doc_type == "carte_identite":
+                info = extract_info_id_file(filepath, text)
+            elif doc_type == "cv":
+                info = extract_info_cv(text)
+            else:
+                print("❓ Type de document non reconnu.")
+                metrics.inc("carteid_documents_total", type="inconnu")
+                return "ignore"
+            remember(filepath, empreintes, doc_type, info)
+        suffix = '_carte' if doc_type == "carte_identite" else '_cv'
 
         nom_fichier = os.path.splitext(os.path.basename(filepath))[0]
         out_xml = os.path.join(OUTPUT_DIR, nom_fichier + suffix + '.xml')
-        save_to_xml(info, out_xml)
+        write_xml(info, out_xml, doc_type)
+        index_record(filepath, doc_type, info, out_xml)
         print(f"✅ XML créé : {out_xml}")
+        if not doublon:
+            archive_document(filepath, doc_type, text, info, out_xml)
+        metrics.inc("carteid_documents_total", type=doc_type)
+        metrics.trace(fichier=filepath, type=doc_type, sortie=out_xml,
+                      methode=info.get("methode", "nlp"), duree_s=round(time.time() - debut, 3))
+        return "traite"
 
     except (IOError, OSError) as file_error:
         print(f"🛑 Erreur fichier {filepath} : {file_error}")
+        metrics.inc("carteid_erreurs_total", etape="fichier")
     except Exception as e:
         print(f"❌ Erreur inattendue : {e}")
+        metrics.inc("carteid_erreurs_total", etape="traitement")
+    return "erreur"
+
+def traiter_si_necessaire(journal, chemin, taille, mtime_ns, claims=None):
+    if not journal.needs_processing(chemin, taille, mtime_ns):
+        return
+    if claims is not None:
+        # Le fichier quitte la boîte : s'il n'est plus là, un autre worker l'a pris
+        reserve = claims.claim(chemin)
+        if reserve is None:
+            return
+        statut = traitement_fichier(reserve)
+        claims.release(reserve, statut)
+        journal.mark(chemin, taille, mtime_ns, statut)
+        return
+    # "en_cours" d'abord : un arrêt brutal pendant l'OCR sera repris au redémarrage
+    journal.mark(chemin, taille, mtime_ns, "en_cours")
+    statut = traitement_fichier(chemin)
+    journal.mark(chemin, taille, mtime_ns, statut)
 
-# 🔁 Boucle de surveillance
-while True:
-    for folder in input_folders:
+def reprendre_interrompus(journal):
+    for chemin in journal.interrupted():
         try:
-            fichiers = [f for f in os.listdir(folder) if f.lower().endswith(('.pdf', '.png', '.jpg', '.jpeg'))]
-            for f in fichiers:
-                chemin = os.path.join(folder, f)
-                if chemin not in fichiers_deja_traite:
-                    traitement_fichier(chemin)
-                    fichiers_deja_traite.add(chemin)
-        except FileNotFoundError as e:
-            print(f"📁 Dossier introuvable : {folder} - {e}")
-    time.sleep(5)
+            st = os.stat(chemin)
+        except OSError:
+            continue
+        if not journal.needs_processing(chemin, st.st_size, st.st_mtime_ns):
+            print(f"⛔ Abandon après {journal.max_attempts} essais interrompus : {chemin}")
+            continue
+        print(f"🔁 Reprise après interruption : {chemin}")
+        traiter_si_necessaire(journal, chemin, st.st_size, st.st_mtime_ns)
+
+# 🔁 Boucle de surveillance : seuls les dossiers modifiés depuis le dernier passage sont relistés
+def surveiller():
+    metrics.start_exporters()
+    journal = ProcessedJournal()
+    reprendre_interrompus(journal)
+    claims = None
+    if CLAIMS_ENABLED:
+        claims = ClaimManager()
+        claims.start()
+    planning = Scheduler() if SCHEDULER_ENABLED else None
+    passage = 0
+    try:
+        while True:
+            complet = passage % SURVEILLANCE_FULL_SCAN_EVERY == 0
+            # Tous les dossiers sont listés avant de traiter quoi que ce soit :
+            # l'ordonnanceur fait passer les cartes avant les CV du même passage
+            scans = []
+            a_traiter = {}
+            for folder in input_folders:
+                try:
+                    if claims is not None:
+                        claims.recover_stale(folder)
+                    mtime_dossier = os.stat(folder).st_mtime_ns
+                    if (not complet and not journal.folder_changed(folder, mtime_dossier)
+                            and not journal.has_retryable(folder)):
+                        continue
+                    entrees = scan_folder(folder, extensions)
+                    scans.append((folder, entrees, mtime_dossier))
+                    a_traiter.update((chemin, infos) for chemin, infos in entrees.items()
+                                     if journal.needs_processing(chemin, *infos))
+                except FileNotFoundError as e:
+                    print(f"📁 Dossier introuvable : {folder} - {e}")
+            ordre = planning.plan(a_traiter) if planning and a_traiter else sorted(a_traiter)
+            for chemin in ordre:
+                traiter_si_necessaire(journal, chemin, *a_traiter[chemin], claims)
+                if planning:
+                    planning.done(chemin)
+            if planning and a_traiter:
+                planning.print_report()
+            for folder, entrees, mtime_dossier in scans:
+                journal.prune(folder, entrees)
+                journal.set_folder(folder, mtime_dossier)
+            passage += 1
+            time.sleep(SURVEILLANCE_INTERVAL)
+    finally:
+        if claims is not None:
+            claims.stop()
+
+if __name__ == "__main__":
+    surveiller()
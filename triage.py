@@ -0,0 +1,71 @@
+import os
+from collections import namedtuple
+
+from PIL import Image
+
+from detect_type import detect_document_type
+from ocr_utils import (get_tesseract, render_page, extract_text_layer, has_usable_text,
+                       cached_pages, join_pages)
+from dedup import dhash, get_index
+from metrics import timed
+from config import TRIAGE_DPI, TRIAGE_MAX_SIDE, TRIAGE_TYPES, TEXT_LAYER_ENABLED
+
+
+# Résultat du tri : type retenu (ou None), texte lu (première page, ou texte
+# complet si le document est déjà dans le cache OCR), empreinte dHash du rendu
+# de la première page (None sans rendu : couche texte, cache, ou sans déduplication)
+Apercu = namedtuple("Apercu", ["type", "texte", "empreinte"], defaults=[None])
+
+
+def _premiere_page(filepath, empreinte=False):
+    """
+    Texte de la première page à moindre coût : couche texte si elle existe,
+    sinon OCR d'un rendu basse résolution (ou d'une miniature pour les images).
+    Retourne (texte, empreinte du rendu si demandée et s'il y a eu rendu).
+    """
+    if os.path.splitext(filepath)[1].lower() == '.pdf':
+        if TEXT_LAYER_ENABLED:
+            couche_texte = extract_text_layer(filepath, 1, 1)
+            if couche_texte and has_usable_text(couche_texte[0]):
+                return couche_texte[0], None
+        image = render_page(filepath, 1, dpi=TRIAGE_DPI)
+    else:
+        image = Image.open(filepath)
+        image.thumbnail((TRIAGE_MAX_SIDE, TRIAGE_MAX_SIDE))
+    texte = get_tesseract().image_to_string(image, lang='fra')
+    # Le rendu du tri sert aussi d'empreinte pour la déduplication : pas de second rendu
+    valeur = dhash(image) if empreinte else None
+    image.close()
+    return texte, valeur
+
+
+def ocr_first_page_fast(filepath):
+    return _premiere_page(filepath)[0]
+
+
+@timed("triage")
+def preview_document(filepath, types=TRIAGE_TYPES):
+    """
+    Décide si un document mérite l'OCR complet. Retourne un Apercu : le type
+    détecté sur la première page s'il fait partie de `types` (sinon None) et le
+    texte lu, qui sert ensuite à confirmer un quasi-doublon.
+    Un document déjà présent dans le cache OCR est classé sur son texte complet.
+    """
+    # Consultation hors statistiques : l'OCR complet consulte le cache juste
+    # après, un document neuf ne compte qu'un seul miss
+    pages = cached_pages(filepath, compter=False)
+    empreinte = None
+    if pages is not None:
+        texte = join_pages(filepath, pages)
+    else:
+        texte, empreinte = _premiere_page(filepath, empreinte=get_index() is not None)
+
+    doc_type = detect_document_type(texte.replace('\n', ' ').replace('\r', ' '))
+    return Apercu(doc_type if doc_type in types else None, texte, empreinte)
+
+
+def triage_document(filepath, types=TRIAGE_TYPES):
+    """
+    Type détecté par le tri rapide s'il fait partie de `types`, sinon None.
+    """
+    return preview_document(filepath, types).type
@@ -1,4 +1,6 @@
 import time
+import queue
+import threading
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import os
@@ -6,67 +8,294 @@ import os
 from ocr_utils import ocr_file
 from detect_type import detect_document_type
 from extract_cv import extract_info_cv
-from extract_id import extract_info_id
-from xml_utils import create_xml
+from extract_id import extract_info_id_file
+from xml_utils import write_xml
+from triage import preview_document
+from dedup import find_duplicate, remember
+from claims import ClaimManager, is_claim_path
+from archive import archive_document
+from scheduler import Scheduler
+from search_index import index_record
+import metrics
+from config import (TRIAGE_ENABLED, WATCHER_WORKERS, WATCHER_QUEUE_SIZE, WATCHER_DEBOUNCE,
+                    WATCHER_STATS_INTERVAL, CLAIMS_ENABLED, SCHEDULER_ENABLED)
 
-# ✅ Attente que le fichier soit complètement disponible
-def wait_until_ready(filepath, timeout=10):
+# ✅ Attente que le fichier soit complètement disponible :
+# taille et date de modification stables entre deux contrôles (aucune lecture du contenu)
+def wait_until_ready(filepath, timeout=10, interval=0.5):
     start = time.time()
+    previous = None
     while time.time() - start < timeout:
         try:
-            with open(filepath, 'rb') as f:
-                f.read()
-            return True
-        except Exception:
-            time.sleep(0.5)
+            st = os.stat(filepath)
+            current = (st.st_size, st.st_mtime_ns)
+            if current == previous and st.st_size > 0:
+                return True
+            previous = current
+        except OSError:
+            previous = None
+        time.sleep(interval)
     return False
 
-class NewFileHandler(FileSystemEventHandler):
-    def on_created(self, event):
-        if event.is_directory:
-            return
-        filepath = event.src_path
-        print(f"Nouveau fichier détecté : {filepath}")
-
-        # ✅ Attente que le fichier soit prêt
-        if not wait_until_ready(filepath):
-            print(f"Erreur : Le fichier {filepath} n'est pas prêt après 10 secondes.")
-            return
+def process_file(filepath):
+    """
+    Traitement complet d'un fichier : tri, OCR, extraction et XML.
+    Retourne "traite" ou "ignore".
+    """
+    debut = time.time()
+    # 🔎 Tri rapide sur la première page : pas d'OCR complet pour les fichiers non reconnus
+    type_triage = apercu = None
+    if TRIAGE_ENABLED:
+        apercu = preview_document(filepath)
+        type_triage = apercu.type
+        if type_triage is None:
+            print(f"[IGNORÉ] Tri rapide : type de document non reconnu pour : {filepath}")
+            metrics.inc("carteid_documents_total", type="inconnu")
+            return "ignore"
 
-        # OCR
-        text = ocr_file(filepath)
+    # ♻️ Document déjà vu (nouveau scan) : extraction réutilisée, pas d'OCR
+    empreintes, doublon = find_duplicate(filepath, apercu=apercu)
+    if doublon:
+        doc_type, info = doublon
+    else:
+        # OCR (le texte brut garde les lignes de la MRZ)
+        raw_text = ocr_file(filepath)
+        text = raw_text
 
         # Nettoyage simple du texte
         text = text.replace('\n', ' ').replace('\r', ' ').strip()
 
         # ✅ Détection homogène du type de document
-        doc_type = detect_document_type(text)
+        doc_type = detect_document_type(text) or type_triage
         print(f"Type détecté : {doc_type}")
 
         if doc_type not in ['cv', 'carte_identite']:
             print(f"[IGNORÉ] Type de document non reconnu pour : {filepath}")
-            return
+            metrics.inc("carteid_documents_total", type="inconnu")
+            return "ignore"
 
         # Extraction des infos selon le type détecté
         if doc_type == 'cv':
+            texte_extraction = text
             info = extract_info_cv(text)
         elif doc_type == 'carte_identite':
-            info = extract_info_id(text)
+            texte_extraction = raw_text
+            info = extract_info_id_file(filepath, raw_text)
+        remember(filepath, empreintes, doc_type, info)
+
+    # Préparation nom fichier XML
+    base_name = os.path.splitext(os.path.basename(filepath))[0]
+    output_dir = 'xml'
+    os.makedirs(output_dir, exist_ok=True)
+    xml_filename = os.path.join(output_dir, f"{base_name}.xml")
+
+    # Création fichier XML
+    write_xml(info, xml_filename, doc_type)
+    index_record(filepath, doc_type, info, xml_filename)
+    print(f"Fichier XML créé : {xml_filename}")
+    if not doublon:
+        archive_document(filepath, doc_type, texte_extraction, info, xml_filename)
+    metrics.inc("carteid_documents_total", type=doc_type)
+    metrics.trace(fichier=filepath, type=doc_type, sortie=xml_filename,
+                  methode=info.get("methode", "nlp"), duree_s=round(time.time() - debut, 3))
+    return "traite"
+
+class FileWorkQueue:
+    """
+    File de travail du watcher :
+    - les évènements sont regroupés par chemin pendant `debounce` secondes,
+    - un thread répartiteur pousse les chemins dans une file bornée,
+    - `workers` threads font l'OCR (tesseract tourne dans son propre processus).
+    Le thread de watchdog ne fait jamais que noter un chemin.
+    Avec un ClaimManager, chaque fichier est réservé avant traitement : plusieurs
+    watchers peuvent alors partager la même boîte de dépôt.
+    Avec un ordonnancement (scheduler=True), la file bornée est un Scheduler :
+    les workers prennent les fichiers par priorité de classe plutôt qu'à l'arrivée.
+    """
+
+    def __init__(self, workers=WATCHER_WORKERS, max_queue=WATCHER_QUEUE_SIZE,
+                 debounce=WATCHER_DEBOUNCE, ready_timeout=10, claims=None, scheduler=False):
+        self.workers = workers
+        self.claims = claims
+        self.debounce = debounce
+        self.ready_timeout = ready_timeout
+        self.scheduler = Scheduler(maxsize=max_queue) if scheduler else None
+        self.queue = self.scheduler or queue.Queue(maxsize=max_queue)
+        self._pending = {}        # chemin -> dernier évènement
+        self._in_progress = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._busy = 0
+        self._busy_time = 0.0
+        self._processed = 0
+        self._errors = 0
+        self._started = time.time()
+
+    def submit(self, filepath):
+        with self._lock:
+            self._pending[filepath] = time.time()
+
+    def touch(self, filepath):
+        """
+        Repousse le debounce d'un chemin déjà en attente (copie encore en cours).
+        """
+        with self._lock:
+            if filepath in self._pending:
+                self._pending[filepath] = time.time()
+
+    def start(self):
+        self._started = time.time()
+        self._threads.append(threading.Thread(target=self._dispatch, name="dispatch", daemon=True))
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._work, name=f"worker-{i}", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=1)
 
-        # Préparation nom fichier XML
-        base_name = os.path.splitext(os.path.basename(filepath))[0]
-        output_dir = 'xml'
-        os.makedirs(output_dir, exist_ok=True)
-        xml_filename = os.path.join(output_dir, f"{base_name}.xml")
+    def _dispatch(self):
+        while not self._stop.is_set():
+            now = time.time()
+            with self._lock:
+                ready = [p for p, t in self._pending.items()
+                         if now - t >= self.debounce and p not in self._in_progress]
+                for filepath in ready:
+                    del self._pending[filepath]
+                    self._in_progress.add(filepath)
+            for filepath in ready:
+                # Bloque si la file est pleine : la contre-pression s'arrête ici
+                self.queue.put(filepath)
+            self._stop.wait(0.2)
 
-        # Création fichier XML
-        create_xml(info, xml_filename)
-        print(f"Fichier XML créé : {xml_filename}")
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                filepath = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self._busy += 1
+            debut = time.time()
+            try:
+                if not wait_until_ready(filepath, timeout=self.ready_timeout):
+                    print(f"Erreur : Le fichier {filepath} n'est pas prêt après {self.ready_timeout} secondes.")
+                elif self.claims is None:
+                    process_file(filepath)
+                    with self._lock:
+                        self._processed += 1
+                else:
+                    self._process_claimed(filepath)
+            except Exception as e:
+                print(f"❌ Erreur pendant le traitement de {filepath} : {e}")
+                metrics.inc("carteid_erreurs_total", etape="watcher")
+                with self._lock:
+                    self._errors += 1
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                    self._busy_time += time.time() - debut
+                    self._in_progress.discard(filepath)
+                if self.scheduler is not None:
+                    self.scheduler.done(filepath)
+                else:
+                    self.queue.task_done()
+
+    def _process_claimed(self, filepath):
+        reserve = self.claims.claim(filepath)
+        if reserve is None:
+            return    # pris par un autre worker
+        try:
+            statut = process_file(reserve)
+        except Exception:
+            self.claims.release(reserve, "erreur")
+            raise
+        self.claims.release(reserve, statut)
+        with self._lock:
+            self._processed += 1
+
+    def stats(self):
+        with self._lock:
+            elapsed = max(time.time() - self._started, 1e-9)
+            return {
+                "file_attente": self.queue.qsize(),
+                "en_debounce": len(self._pending),
+                "workers_occupes": self._busy,
+                "workers": self.workers,
+                "utilisation": round(self._busy_time / (elapsed * self.workers), 3),
+                "traites": self._processed,
+                "erreurs": self._errors,
+            }
+
+    def print_stats(self):
+        st = self.stats()
+        print(f"📊 File : {st['file_attente']} | en attente : {st['en_debounce']} | "
+              f"workers occupés : {st['workers_occupes']}/{st['workers']} | "
+              f"utilisation : {st['utilisation']:.0%} | traités : {st['traites']} | erreurs : {st['erreurs']}")
+        if self.scheduler is not None:
+            self.scheduler.print_report()
+
+class NewFileHandler(FileSystemEventHandler):
+    def __init__(self, work_queue):
+        super().__init__()
+        self.work_queue = work_queue
+
+    def on_created(self, event):
+        if event.is_directory or is_claim_path(event.src_path):
+            return
+        print(f"Nouveau fichier détecté : {event.src_path}")
+        self.work_queue.submit(event.src_path)
+
+    def on_modified(self, event):
+        # Une copie en cours génère des évènements : ils repoussent simplement le debounce
+        if not event.is_directory:
+            self.work_queue.touch(event.src_path)
+
+    def on_moved(self, event):
+        # Fichier renommé dans le dossier surveillé (ex. copie via un .tmp, ou
+        # fichier d'un worker arrêté remis dans la boîte)
+        if not event.is_directory and not is_claim_path(event.dest_path):
+            self.work_queue.submit(event.dest_path)
+
+def warm_up():
+    """
+    Précharge spaCy et tesseract pour que le premier fichier ne paie pas leur chargement.
+    """
+    import ocr_utils
+    import nlp_model
+    debut = time.time()
+    ocr_utils.warm_up()
+    nlp_model.warm_up()
+    print(f"Modèles préchargés en {time.time() - debut:.1f} s")
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Surveillance des dossiers CV et carte identité.")
+    parser.add_argument("--prechauffer", action="store_true",
+                        help="Charge spaCy et tesseract au démarrage plutôt qu'au premier fichier")
+    parser.add_argument("--workers", type=int, default=WATCHER_WORKERS, help="Threads de traitement")
+    parser.add_argument("--file-max", type=int, default=WATCHER_QUEUE_SIZE, help="Taille max de la file")
+    parser.add_argument("--debounce", type=float, default=WATCHER_DEBOUNCE,
+                        help="Secondes sans nouvel évènement avant traitement")
+    args = parser.parse_args()
+
+    if args.prechauffer:
+        warm_up()
+
     paths_to_watch = ["CV", "carte identité"]
 
-    event_handler = NewFileHandler()
+    metrics.start_exporters()
+    claims = None
+    if CLAIMS_ENABLED:
+        claims = ClaimManager()
+        claims.start()
+    work_queue = FileWorkQueue(workers=args.workers, max_queue=args.file_max, debounce=args.debounce,
+                               claims=claims, scheduler=SCHEDULER_ENABLED)
+    work_queue.start()
+    event_handler = NewFileHandler(work_queue)
     observer = Observer()
 
     for path in paths_to_watch:
@@ -77,8 +306,15 @@ if __name__ == "__main__":
 
     try:
         while True:
-            time.sleep(1)
+            time.sleep(WATCHER_STATS_INTERVAL)
+            work_queue.print_stats()
+            if claims is not None:
+                for path in paths_to_watch:
+                    claims.recover_stale(path)
     except KeyboardInterrupt:
         print("Arrêt de la surveillance.")
         observer.stop()
+        work_queue.stop()
+        if claims is not None:
+            claims.stop()
     observer.join()
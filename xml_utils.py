@@ -1,6 +1,13 @@
+import io
+import json
+import os
 import xml.etree.ElementTree as ET
 from datetime import datetime
 import xml.dom.minidom
+from lxml import etree
+
+from metrics import timed
+from config import XML_BATCH_MAX_RECORDS, XML_BATCH_FSYNC_EVERY
 
 def create_xml(data_dict, filename):
     root = ET.Element('CV')
@@ -54,3 +61,242 @@ def create_xml(data_dict, filename):
 
     with open(filename, 'w', encoding='utf-8') as f:
         f.write(pretty_xml)
+
+
+# ✍️ Écriture en flux (lxml.etree.xmlfile) : chaque section est construite puis
+# écrite directement dans le fichier, sans arbre complet ni re-parsing minidom.
+
+def _sub(parent, tag, value, **attrib):
+    elem = etree.SubElement(parent, tag, **attrib)
+    elem.text = str(value) or None   # <Description/> comme create_xml
+    return elem
+
+def _identite(data_dict):
+    identite = etree.Element('Identite')
+    _sub(identite, 'Nom', data_dict.get('nom', 'Inconnu'))
+    _sub(identite, 'Prenom', data_dict.get('prenom', 'Inconnu'))
+    _sub(identite, 'Email', data_dict.get('email', 'Inconnu'))
+    _sub(identite, 'Telephone', data_dict.get('telephone', 'Inconnu'))
+    _sub(identite, 'Adresse', data_dict.get('adresse', 'Inconnu'))
+    _sub(identite, 'DateNaissance', data_dict.get('date_naissance', 'Inconnu'))
+    return identite
+
+def _carte(data_dict):
+    carte = etree.Element('Carte')
+    _sub(carte, 'NumeroCarte', data_dict.get('numero_carte', 'Inconnu'))
+    _sub(carte, 'LieuNaissance', data_dict.get('lieu_naissance', 'Inconnu'))
+    _sub(carte, 'Sexe', data_dict.get('sexe', 'Inconnu'))
+    _sub(carte, 'DateExpiration', data_dict.get('date_expiration', 'Inconnu'))
+    return carte
+
+def _competences(data_dict):
+    competences = etree.Element('Competences')
+    for comp in data_dict.get('competences', []):
+        _sub(competences, 'Competence', comp)
+    return competences
+
+def _langues(data_dict):
+    langues = etree.Element('Langues')
+    for langue in data_dict.get('langues', []):
+        if isinstance(langue, (tuple, list)) and len(langue) == 2:
+            nom = str(langue[0])
+            niveau = str(langue[1])
+        elif isinstance(langue, dict):
+            nom = str(langue.get('langue', 'Inconnu'))
+            niveau = str(langue.get('niveau', 'Inconnu'))
+        else:
+            nom = str(langue)
+            niveau = ''
+        _sub(langues, 'Langue', nom, niveau=niveau)
+    return langues
+
+def _experiences(data_dict):
+    experiences = etree.Element('Experiences')
+    for exp in data_dict.get('experiences', []):
+        # extract_info_cv produit des blocs de texte, d'autres sources des dictionnaires
+        if not isinstance(exp, dict):
+            exp = {'description': exp}
+        experience = etree.SubElement(experiences, 'Experience')
+        _sub(experience, 'Poste', exp.get('poste', 'Inconnu'))
+        _sub(experience, 'Entreprise', exp.get('entreprise', 'Inconnu'))
+        _sub(experience, 'Debut', exp.get('debut', 'Inconnu'))
+        _sub(experience, 'Fin', exp.get('fin', 'Inconnu'))
+        _sub(experience, 'Description', exp.get('description', ''))
+    return experiences
+
+def _formations(data_dict):
+    formations = etree.Element('Formations')
+    for form in data_dict.get('formations', []):
+        if not isinstance(form, dict):
+            form = {'diplome': form}
+        formation = etree.SubElement(formations, 'Formation')
+        _sub(formation, 'Diplome', form.get('diplome', 'Inconnu'))
+        _sub(formation, 'Etablissement', form.get('etablissement', 'Inconnu'))
+        _sub(formation, 'Annee', form.get('annee', 'Inconnu'))
+    return formations
+
+def _sections(data_dict, doc_type=None):
+    """
+    Sections du schéma, dans l'ordre de create_xml. Les cartes d'identité
+    ajoutent un bloc <Carte> avec les champs propres à la CNI.
+    """
+    date_elem = etree.Element('date_creation')
+    date_elem.text = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    yield date_elem
+    yield _identite(data_dict)
+    if doc_type == 'carte_identite' or (doc_type is None and 'numero_carte' in data_dict):
+        yield _carte(data_dict)
+    yield _competences(data_dict)
+    yield _langues(data_dict)
+    yield _experiences(data_dict)
+    yield _formations(data_dict)
+
+@timed("xml")
+def write_xml(data_dict, filename, doc_type=None):
+    """
+    Équivalent en flux de create_xml (même mise en forme, indentation de 2 espaces).
+    """
+    with open(filename, 'wb') as f:
+        _stream_xml(f, data_dict, doc_type)
+
+
+def _stream_xml(f, data_dict, doc_type=None):
+    f.write(b'<?xml version="1.0" encoding="utf-8"?>\n')
+    with etree.xmlfile(f, encoding='utf-8') as xf:
+        with xf.element('CV'):
+            for section in _sections(data_dict, doc_type):
+                etree.indent(section, space="  ", level=1)
+                xf.write("\n  ", section)
+            xf.write("\n")
+    f.write(b'\n')
+
+
+def xml_bytes(data_dict, doc_type=None):
+    """
+    Même document que write_xml, en mémoire (réponses du service HTTP).
+    """
+    buffer = io.BytesIO()
+    _stream_xml(buffer, data_dict, doc_type)
+    return buffer.getvalue()
+
+
+def record_element(data_dict, doc_type=None, source=None):
+    """
+    Élément <CV> complet d'un enregistrement (utilisé par les sorties par lot).
+    """
+    attrib = {}
+    if doc_type:
+        attrib['type'] = doc_type
+    if source:
+        attrib['source'] = source
+    root = etree.Element('CV', **attrib)
+    for section in _sections(data_dict, doc_type):
+        root.append(section)
+    return root
+
+
+class BatchSink:
+    """
+    Sortie par lot : les enregistrements sont ajoutés à un fichier tournant
+    (nouveau fichier tous les `max_records`), avec fsync tous les `fsync_every`.
+    """
+    extension = ''
+
+    def __init__(self, dossier, prefixe='lot', max_records=XML_BATCH_MAX_RECORDS,
+                 fsync_every=XML_BATCH_FSYNC_EVERY):
+        self.dossier = dossier
+        self.prefixe = prefixe
+        self.max_records = max_records
+        self.fsync_every = fsync_every
+        self.fichiers = []
+        self._f = None
+        self._count = 0
+        self._numero = 0
+        os.makedirs(dossier, exist_ok=True)
+
+    def _open(self):
+        self._numero += 1
+        horodatage = datetime.now().strftime('%Y%m%d_%H%M%S')
+        chemin = os.path.join(self.dossier, f"{self.prefixe}_{horodatage}_{self._numero:04d}{self.extension}")
+        self._f = open(chemin, 'w', encoding='utf-8')
+        self._count = 0
+        self.fichiers.append(chemin)
+        self._write_header()
+
+    def _write_header(self):
+        pass
+
+    def _write_footer(self):
+        pass
+
+    def _serialize(self, data_dict, doc_type, source):
+        raise NotImplementedError
+
+    def append(self, data_dict, doc_type=None, source=None):
+        if self._f is None or self._count >= self.max_records:
+            self._close_file()
+            self._open()
+        self._f.write(self._serialize(data_dict, doc_type, source))
+        self._count += 1
+        if self._count % self.fsync_every == 0:
+            self.flush()
+
+    def flush(self):
+        if self._f is not None:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+
+    def _close_file(self):
+        if self._f is not None:
+            self._write_footer()
+            self.flush()
+            self._f.close()
+            self._f = None
+
+    def close(self):
+        self._close_file()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class XmlBatchSink(BatchSink):
+    """
+    Fichier XML tournant : <Documents> contenant un <CV> par enregistrement.
+    Après un arrêt brutal, seule la balise fermante </Documents> peut manquer.
+    """
+    extension = '.xml'
+
+    def _write_header(self):
+        self._f.write("<?xml version='1.0' encoding='utf-8'?>\n<Documents>\n")
+
+    def _write_footer(self):
+        self._f.write("</Documents>\n")
+
+    def _serialize(self, data_dict, doc_type, source):
+        elem = record_element(data_dict, doc_type, source)
+        etree.indent(elem, space="  ", level=1)
+        return "  " + etree.tostring(elem, encoding='unicode') + "\n"
+
+
+class JsonlBatchSink(BatchSink):
+    """
+    Fichier JSON Lines tournant : un objet par ligne.
+    """
+    extension = '.jsonl'
+
+    def _serialize(self, data_dict, doc_type, source):
+        record = {"type": doc_type, "source": source,
+                  "date_creation": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), **data_dict}
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def open_batch_sink(format_sortie, dossier, prefixe='lot'):
+    if format_sortie == 'xml':
+        return XmlBatchSink(dossier, prefixe)
+    if format_sortie == 'jsonl':
+        return JsonlBatchSink(dossier, prefixe)
+    raise ValueError(f"Format de sortie par lot inconnu : {format_sortie}")